@@ -3,7 +3,10 @@ import time
 import sys
 import argparse
 import signal
+from supervisor import Supervisor
+import numeric_mode
 import shlex
+import yaml
 
 class NodeControl():
 
@@ -24,20 +27,12 @@ class NodeControl():
         print "Stopping Tcp dump process on PLC..."
         #self.process_tcp_dump.kill()
 
-        self.process_tcp_dump.send_signal(signal.SIGINT)
-        self.process_tcp_dump.wait()
-        if self.process_tcp_dump.poll() is None:
-            self.process_tcp_dump.terminate()
-        if self.process_tcp_dump.poll() is None:
-            self.process_tcp_dump.kill()
+        self.supervisor.stop([self.process_tcp_dump])
 
         print "Stopping PLC..."
-        self.plc_process.send_signal(signal.SIGINT)
-        self.plc_process.wait()
-        if self.plc_process.poll() is None:
-            self.plc_process.terminate()
-        if self.plc_process.poll() is None:
-            self.plc_process.kill()
+        self.supervisor.stop([self.plc_process])
+        for line in self.supervisor.report():
+            print line
 
     def main(self):
         """
@@ -55,18 +50,27 @@ class NodeControl():
         self.interface_name = self.name + '-eth0'
         self.delete_log()
 
+        self.supervisor = Supervisor()
+
         # Starts a linux tcpdump process
-        self.process_tcp_dump = self.start_tcpdump_capture()
+        self.process_tcp_dump = self.supervisor.add('tcpdump', self.start_tcpdump_capture())
 
         # Starts the process running the specific PLC code
-        self.plc_process = self.start_plc()
+        self.plc_process = self.supervisor.add(self.name, self.start_plc())
 
-        while self.plc_process.poll() is None:
-            pass
+        self.supervisor.wait(self.plc_process)
 
         self.terminate()
 
     def process_arguments(self,arg_parser):
+        if arg_parser.config:
+            self.config_path = arg_parser.config
+        else:
+            self.config_path = 'c_town_config.yaml'
+
+        with open(self.config_path, 'r') as config_file:
+            self.numeric_mode = numeric_mode.get_numeric_mode(yaml.full_load(config_file))
+
         if arg_parser.name:
             self.name = arg_parser.name
             print self.name
@@ -120,12 +124,16 @@ class NodeControl():
             cmd_string = 'python ' + self.name + '.py' + ' -w ' + str(self.week_index) + ' -f True -p ' + \
                          str(self.attack_path) + ' -a ' + str(self.attack_name)
 
+        # The PLC scripts read their arguments by position, so the numeric mode goes last
+        cmd_string += ' -m ' + self.numeric_mode
+
         cmd = shlex.split(cmd_string)
         plc_process = subprocess.Popen(cmd, shell=False)
         return plc_process
 
     def get_arguments(self):
         parser = argparse.ArgumentParser(description='Master Script of a node in Minicps')
+        parser.add_argument("--config", "-c", help="YAML experiment configuration file")
         parser.add_argument("--name", "-n", help="Name of the Mininet node and script to run")
         parser.add_argument("--week", "-w", help="Week index of the simulation")
         parser.add_argument("--dict", "-d", help="Dictionary of the PLCs logic")
@@ -10,6 +10,7 @@ import subprocess
 import signal
 from mininet.link import TCLink
 import glob
+from supervisor import Supervisor
 import yaml
 
 automatic = 1
@@ -101,6 +102,10 @@ class CTown(MiniCPS):
         self.mitm_process = None
         self.iperf_server_process = None
         self.iperf_client_process = None
+        self.scada_process = None
+        self.simulation = None
+
+        self.supervisor = Supervisor()
 
         self.attack_flag = attack_flag
         self.attack_path = attack_path
@@ -155,8 +160,9 @@ class CTown(MiniCPS):
 
             print "Launching PLC with command: " + cmd_string
             cmd = shlex.split(cmd_string)
-            self.sender_plcs_processes.append(self.sender_plcs_nodes[index].popen(cmd,stderr=sys.stdout,
-                                                                                  stdout=self.sender_plcs_files[index]))
+            self.sender_plcs_processes.append(self.supervisor.add(
+                "plc" + str(self.sender_plcs[index]),
+                self.sender_plcs_nodes[index].popen(cmd, stderr=sys.stdout, stdout=self.sender_plcs_files[index])))
             print("Launched plc" + str(self.sender_plcs[index]))
             index += 1
             time.sleep(0.1)
@@ -178,8 +184,9 @@ class CTown(MiniCPS):
 
             print "Launching PLC with command: " + cmd_string
             cmd = shlex.split(cmd_string)
-            self.receiver_plcs_processes.append(self.receiver_plcs_nodes[index].popen(cmd,stderr=sys.stdout,
-                                                                                      stdout=self.receiver_plcs_files[index]))
+            self.receiver_plcs_processes.append(self.supervisor.add(
+                "plc" + str(self.receiver_plcs[index]),
+                self.receiver_plcs_nodes[index].popen(cmd, stderr=sys.stdout, stdout=self.receiver_plcs_files[index])))
             print("Launched plc" + str(self.receiver_plcs[index]))
             index += 1
             time.sleep(0.1)
@@ -189,7 +196,8 @@ class CTown(MiniCPS):
         self.scada_file = open("output/scada.log", "r+")
         cmd_string = "python automatic_plc.py -n scada -w " + str(self.week_index)
         cmd = shlex.split(cmd_string)
-        self.scada_process = self.scada_node.popen(cmd, stderr=sys.stdout, stdout=self.scada_file)
+        self.scada_process = self.supervisor.add('scada', self.scada_node.popen(cmd, stderr=sys.stdout,
+                                                                                stdout=self.scada_file))
         print "[*] SCADA Successfully launched"
         print "[*] Launched the PLCs and SCADA process, launching simulation..."
 
@@ -204,7 +212,8 @@ class CTown(MiniCPS):
                          + str(self.attack_options['values'][0])
             mitm_cmd = shlex.split(cmd_string)
             print 'Running MiTM attack with command ' + str(mitm_cmd)
-            self.mitm_process = attacker.popen(mitm_cmd, stderr=sys.stdout, stdout=attacker_file)
+            self.mitm_process = self.supervisor.add('mitm', attacker.popen(mitm_cmd, stderr=sys.stdout,
+                                                                           stdout=attacker_file))
             print "[] Attacking"
 
         # Physical process - WNTR Simulation
@@ -218,27 +227,19 @@ class CTown(MiniCPS):
                          str(self.attack_path)
 
         simulation_cmd = shlex.split(cmd_string)
-        self.simulation = plant.popen(simulation_cmd, stderr=sys.stdout, stdout=physical_output)
+        self.simulation = self.supervisor.add('simulation', plant.popen(simulation_cmd, stderr=sys.stdout,
+                                                                        stdout=physical_output))
 
         print "[] Simulating..."
 
         # We wait until the simulation ends
-        while self.simulation.poll() is None:
-            pass
+        self.supervisor.wait(self.simulation)
         self.finish()
 
     def create_log_files(self):
         cmd = shlex.split("bash ./create_log_files.sh")
         subprocess.call(cmd)
 
-    def end_process(self, process):
-        process.send_signal(signal.SIGINT)
-        process.wait()
-        if process.poll() is None:
-            process.terminate()
-        if process.poll() is None:
-            process.kill()
-
     def move_output_files(self, week_index):
         cmd = shlex.split("./copy_output.sh " + str(week_index))
         subprocess.call(cmd)
@@ -261,32 +262,27 @@ class CTown(MiniCPS):
 
     def finish(self):
         print "[*] Simulation finished"
-        self.end_process(self.scada_process)
-
-        index = 0
-        for plc in self.receiver_plcs_processes:
-            print "[] Terminating PLC" + str(self.receiver_plcs[index])
-            if plc:
-                self.end_process(plc)
-                print "[*] PLC" + str(self.receiver_plcs[index]) + " terminated"
-            index += 1
+        if self.scada_process:
+            self.supervisor.stop([self.scada_process])
 
-        index = 0
-        for plc in self.sender_plcs_processes:
-            print "[] Terminating PLC" + str(self.sender_plcs[index])
-            if plc:
-                self.end_process(plc)
-                print "[*] PLC" + str(self.sender_plcs[index]) + " terminated"
-            index += 1
+        # The clients are stopped before the ENIP servers they read from, each group all at once
+        print "[] Terminating the receiver PLCs"
+        self.supervisor.stop(self.receiver_plcs_processes)
+        print "[] Terminating the sender PLCs"
+        self.supervisor.stop(self.sender_plcs_processes)
+        print "[*] PLCs terminated"
 
         if self.mitm_process:
-            self.end_process(self.mitm_process)
+            self.supervisor.stop([self.mitm_process])
         print "[*] All processes terminated"
 
-        if self.simulation.poll() is None:  
-            self.end_process(self.simulation)
+        if self.simulation:
+            self.supervisor.stop([self.simulation])
             print "Physical Simulation process terminated"
 
+        for line in self.supervisor.report():
+            print line
+
         # toDo: This method is not working
         #self.parse_pcap_files()
         self.merge_pcap_files()
@@ -1,4 +1,5 @@
 from minicps.devices import PLC
+import state_db
 import csv
 import signal
 import sys
@@ -10,12 +11,34 @@ import time
 
 class BasePLC(PLC):
 
-    def send_system_state(self):
+    def get(self, what):
         """
-        This method sends the values to the SCADA server or any other client requesting the values
-        :return:
+        Reads a tag from the state database using the long-lived connection of this process, instead of opening a
+        new sqlite connection for every read as MiniCPS does
+        :param what: tuple identifying the tag
+        :return: the stored value
         """
-        while self.reader:
+        if type(what) is not tuple:
+            raise TypeError('Parameter must be a tuple.')
+        return state_db.get_state(self.state).get(what)
+
+    def set(self, what, value):
+        """
+        Writes a tag into the state database using the long-lived connection of this process
+        :param what: tuple identifying the tag
+        :param value: value to store
+        :return: the stored value
+        """
+        if type(what) is not tuple:
+            raise TypeError('Parameter must be a tuple.')
+        return state_db.get_state(self.state).set(what, value)
+
+    def publish_system_state(self):
+        """
+        Sends the values of the tags to the ENIP server of the PLC. It is called by the sender thread every cycle, and
+        by the PLCs in the step barrier before they acknowledge a hydraulic step
+        """
+        with self.publish_lock:
             values = []
             for tag in self.tags:
                 with self.lock:
@@ -24,12 +47,20 @@ class BasePLC(PLC):
                         values.append(self.get(tag))
                     except Exception:
                         print "Exception trying to get the tag"
-                        time.sleep(0.05)
-                        continue
+                        return
             self.send_multiple(self.tags, values, self.send_adddress)
+
+    def send_system_state(self):
+        """
+        This method sends the values to the SCADA server or any other client requesting the values
+        :return:
+        """
+        while self.reader:
+            self.publish_system_state()
             time.sleep(0.05)
 
     def set_parameters(self, tags, values, reader, lock, send_address, week_index=0):
+        self.publish_lock = threading.Lock()
         self.tags = tags
         self.values = values
         self.reader = reader
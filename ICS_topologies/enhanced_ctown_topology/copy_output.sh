@@ -4,4 +4,4 @@ if [ ! -d week_$1 ]; then
 fi
 echo "Copying to " week_$1
 
-cp output/* week_$1
+cp -r output/* week_$1
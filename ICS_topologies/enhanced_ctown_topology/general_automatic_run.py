@@ -12,6 +12,7 @@ import argparse
 import yaml
 from mininet.link import TCLink
 import subprocess
+from supervisor import Supervisor
 
 automatic = 1
 mitm_attack = 0
@@ -224,12 +225,13 @@ class DHALSIM(MiniCPS):
         plant = net.get('plant')
 
         simulation_cmd = shlex.split("python automatic_plant.py c_town_config.yaml")
-        self.simulation = plant.popen(simulation_cmd, stderr=sys.stdout, stdout=physical_output)
+        self.supervisor = Supervisor()
+        self.simulation = self.supervisor.add('simulation', plant.popen(simulation_cmd, stderr=sys.stdout,
+                                                                        stdout=physical_output))
         print "[] Simulating..."
 
         print "[] Simulating..."
-        while self.simulation.poll() is None:
-            pass
+        self.supervisor.wait(self.simulation)
         self.finish()
 
     def create_log_files(self):
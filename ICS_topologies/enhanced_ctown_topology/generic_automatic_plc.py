@@ -3,6 +3,8 @@ import time
 import sys
 import argparse
 import signal
+from supervisor import Supervisor
+import numeric_mode
 import yaml
 
 class NodeControl():
@@ -25,12 +27,9 @@ class NodeControl():
         self.process_tcp_dump.kill()
 
         print "Stopping PLC..."
-        self.plc_process.send_signal(signal.SIGINT)
-        self.plc_process.wait()
-        if self.plc_process.poll() is None:
-            self.plc_process.terminate()
-        if self.plc_process.poll() is None:
-            self.plc_process.kill()
+        self.supervisor.stop([self.plc_process])
+        for line in self.supervisor.report():
+            print line
 
     def get_plc_dict(self, plc_list):
         for plc in plc_list:
@@ -56,15 +55,16 @@ class NodeControl():
                     self.week_index = config_data['week_index']
                 else:
                     self.week_index = 0
+            self.numeric_mode = numeric_mode.get_numeric_mode(config_data)
 
         self.interface_name = self.name.lower() + '-eth0'
         self.delete_log()
 
-        self.process_tcp_dump = self.start_tcpdump_capture()
-        self.plc_process = self.start_plc()
+        self.supervisor = Supervisor()
+        self.process_tcp_dump = self.supervisor.add('tcpdump', self.start_tcpdump_capture())
+        self.plc_process = self.supervisor.add(self.name, self.start_plc())
 
-        while self.plc_process.poll() is None:
-            pass
+        self.supervisor.wait(self.plc_process)
 
         self.terminate()
 
@@ -82,7 +82,7 @@ class NodeControl():
 
     def start_plc(self):
         plc_process = subprocess.Popen(['python', 'plc.py', '-n', self.name, '-w', str(self.week_index), '-d',
-                                        self.dict_path, '-l', self.last], shell=False)
+                                        self.dict_path, '-l', self.last, '-m', self.numeric_mode], shell=False)
         return plc_process
 
     def process_arguments(self, arg_parser):
@@ -1,6 +1,7 @@
 import yaml
 import sys
 import subprocess
+import parse_cache
 from os.path import expanduser
 
 class ExperimentInitializer:
@@ -112,9 +113,20 @@ class ExperimentInitializer:
 
     def run_parser(self):
         """
-        Parse the files to build plc_dicts.yaml and utils.py
+        Parse the files to build plc_dicts.yaml and utils.py. The outputs are cached by the content of the .inp and .cpa
+        files and the parser, so experiments over the same network skip the parser
         :return:
         """
+        cache = None
+        if parse_cache.is_enabled(self.options):
+            cache = parse_cache.ParseCache(self.epanet_file_path, self.cpa_file_path, 'plc_dicts.yaml')
+            if cache.restore():
+                print "Parser outputs restored from " + cache.entry_path
+                return
+
         home_path = expanduser("~")
         wntr_environment_path = home_path + str("/wntr-experiments/bin/python")
-        parse_process = subprocess.call([wntr_environment_path, 'epanet_parser.py', '-i', self.epanet_file_path, '-a', self.cpa_file_path, '-o', 'plc_dicts.yaml'])
\ No newline at end of file
+        parse_process = subprocess.call([wntr_environment_path, 'epanet_parser.py', '-i', self.epanet_file_path, '-a', self.cpa_file_path, '-o', 'plc_dicts.yaml'])
+
+        if cache is not None and parse_process == 0:
+            cache.store()
\ No newline at end of file
@@ -2,6 +2,7 @@ import subprocess
 import argparse
 import signal
 import sys
+from supervisor import Supervisor
 
 class IperfClient():
 
@@ -9,6 +10,7 @@ class IperfClient():
         """
         This method is provided by the signal python library. We call the finish method that interrupts, terminates, or kills the simulation and exit
         """
+        self.supervisor.stop([self.iperf])
         sys.exit(0)
 
     def main(self):
@@ -17,10 +19,9 @@ class IperfClient():
         args = self.get_arguments()
         self.process_arguments(args)
 
-        self.iperf = self.start_iperf_client()
-
-        while self.iperf.poll() is None:
-            pass
+        self.supervisor = Supervisor()
+        self.iperf = self.supervisor.add('iperf3 client', self.start_iperf_client())
+        self.supervisor.wait(self.iperf)
 
     def process_arguments(self,arg_parser):
         if arg_parser.connect:
@@ -2,21 +2,22 @@ import subprocess
 import argparse
 import signal
 import sys
+from supervisor import Supervisor
 
 class IperfServer():
 
     def main(self):
         signal.signal(signal.SIGINT, self.interrupt)
         signal.signal(signal.SIGTERM, self.interrupt)
-        self.iperf = self.start_iperf_server()
-
-        while self.iperf.poll() is None:
-            pass
+        self.supervisor = Supervisor()
+        self.iperf = self.supervisor.add('iperf3 server', self.start_iperf_server())
+        self.supervisor.wait(self.iperf)
 
     def interrupt(self, sig, frame):
         """
         This method is provided by the signal python library. We call the finish method that interrupts, terminates, or kills the simulation and exit
         """
+        self.supervisor.stop([self.iperf])
         sys.exit(0)
 
     def start_iperf_server(self):
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+"""
+Number type of the values read by the PLCs and of the control rule limits. Values travel as strings through the state
+database and ENIP, and the control rules compare them with the limits of the EPANET controls. float is the default;
+decimal keeps the exact decimal comparisons of older experiments, at the cost of building a Decimal for every value
+"""
+
+# Supported values of the numeric_mode option of the experiment YAML, and the type values are converted to
+NUMERIC_MODES = {'float': float, 'decimal': Decimal}
+
+
+def get_numeric_mode(config_options):
+    """
+    :param config_options: options of the experiment YAML file
+    :return: the configured numeric mode, float by default
+    """
+    mode = config_options.get('numeric_mode', 'float')
+    if mode not in NUMERIC_MODES:
+        raise ValueError('Invalid numeric_mode ' + str(mode) + ', supported modes are ' +
+                         ', '.join(sorted(NUMERIC_MODES.keys())))
+    return mode
+
+
+def get_converter(mode):
+    """
+    :param mode: one of NUMERIC_MODES
+    :return: the function converting a value, or its string, to a number of that mode
+    """
+    return NUMERIC_MODES[mode]
+
+
+def get_argument_mode(argv):
+    """
+    The PLC scripts of this topology read their arguments by position, the launchers pass the numeric mode last with -m
+    :param argv: the arguments of the PLC script, sys.argv
+    :return: the numeric mode passed with -m, float when it is not passed
+    """
+    if '-m' in argv[:-1]:
+        return argv[argv.index('-m') + 1]
+    return 'float'
+
+
+def get_db_value(mode, value):
+    """
+    :param mode: one of NUMERIC_MODES
+    :param value: float computed by the simulator
+    :return: the value written into the state database. In decimal mode it is the exact decimal expansion of the float,
+    as older experiments wrote it
+    """
+    if mode == 'decimal':
+        return str(Decimal(value))
+    return value
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import shutil
+
+"""
+Cache of the outputs of epanet_parser.py. The parser runs in the WNTR interpreter and loads the whole water network
+model to write utils.py and plc_dicts.yaml, which only depend on the .inp file, the .cpa file and the parser itself.
+The outputs are stored in a folder named by the hash of the three files, so batch experiments over the same network
+copy them back instead of running the parser again
+"""
+
+# Folder of the cache, relative to the topology folder where the experiment runs
+CACHE_PATH = '.parser_cache'
+
+# Source of the parser, part of the key so a change of the parser invalidates the cache
+PARSER_PATH = 'epanet_parser.py'
+
+# Name of utils.py inside a cache entry, plc_dicts.yaml is stored with its own name
+UTILS_PATH = 'utils.py'
+
+
+def is_enabled(config_options):
+    """
+    :param config_options: options of the experiment YAML file
+    :return: False if the experiment disables the cache, it is enabled by default
+    """
+    return config_options.get('parser_cache', "True") != "False"
+
+
+def get_key(inp_file_path, cpa_file_path, parser_path=PARSER_PATH):
+    """
+    :return: hex digest of the content of the .inp file, the .cpa file and the parser
+    """
+    digest = hashlib.sha256()
+    for path in [inp_file_path, cpa_file_path, parser_path]:
+        with open(path, 'rb') as f:
+            content = f.read()
+        # The length separates the files, so moving bytes from one file to the next changes the key
+        digest.update(str(len(content)).encode() + b':')
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class ParseCache:
+
+    """
+    This class stores and restores the outputs of the parser for an .inp and .cpa file
+    """
+    def __init__(self, inp_file_path, cpa_file_path, plc_dict_path, cache_path=CACHE_PATH):
+        self.plc_dict_path = plc_dict_path
+        self.entry_path = os.path.join(cache_path, get_key(inp_file_path, cpa_file_path))
+
+    def get_outputs(self):
+        """
+        :return: list of (path written by the parser, path in the cache entry) tuples
+        """
+        return [(UTILS_PATH, os.path.join(self.entry_path, UTILS_PATH)),
+                (self.plc_dict_path, os.path.join(self.entry_path, os.path.basename(self.plc_dict_path)))]
+
+    def restore(self):
+        """
+        Copies the cached outputs over the ones of the topology folder
+        :return: True if the cache had them
+        """
+        outputs = self.get_outputs()
+        for _, cached_path in outputs:
+            if not os.path.exists(cached_path):
+                return False
+
+        for path, cached_path in outputs:
+            shutil.copyfile(cached_path, path)
+        return True
+
+    def store(self):
+        """
+        Stores the outputs just written by the parser. They are written to a temporary folder first, so an
+        interrupted store never leaves a partial entry
+        """
+        temporary_path = self.entry_path + '.tmp'
+        if os.path.exists(temporary_path):
+            shutil.rmtree(temporary_path)
+        os.makedirs(temporary_path)
+
+        for path, cached_path in self.get_outputs():
+            shutil.copyfile(path, os.path.join(temporary_path, os.path.basename(cached_path)))
+
+        if os.path.exists(self.entry_path):
+            shutil.rmtree(self.entry_path)
+        os.rename(temporary_path, self.entry_path)
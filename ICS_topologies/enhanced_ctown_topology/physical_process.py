@@ -1,11 +1,14 @@
 import wntr
 import wntr.network.controls as controls
-import sqlite3
 import csv
 import sys
 import pandas as pd
 import yaml
-from decimal import Decimal
+from state_db import StateDB
+from actuator_state import ActuatorState
+from step_barrier import StepServer
+from virtual_clock import Clock, is_virtual
+import numeric_mode
 
 class PhysicalPlant:
 
@@ -31,28 +34,23 @@ class PhysicalPlant:
         else:
             self.attack_flag = False
 
-        # Use of prepared statements
-        self._name = 'ctown'
-        self._path = config_options['db_path']
-        self._value = 'value'
-        self._what = ()
-
-        self._init_what()
-
-        if not self._what:
-            raise ValueError('Primary key not found.')
-        else:
-            self._init_get_query()
-            self._init_set_query()
-
         # connection to the database
         self.db_path = config_options['db_path']
+        if 'db_busy_timeout' in config_options:
+            busy_timeout = float(config_options['db_busy_timeout'])
+        else:
+            busy_timeout = None
+        self.state_db = StateDB(self.db_path, 'ctown', busy_timeout)
         #self.conn = sqlite3.connect(self.db_path)
         #self.c = self.conn.cursor()
 
         self.output_path = config_options['output_ground_truth_path']
         self.simulation_days = int(config_options['duration_days'])
 
+        # In decimal mode the flows and junction levels are written as the exact decimal expansion of the simulated
+        # values, as older experiments did
+        self.numeric_mode = numeric_mode.get_numeric_mode(config_options)
+
         # Create the network
         inp_file = config_options['inp_file']
         self.wn = wntr.network.WaterNetworkModel(inp_file)
@@ -86,24 +84,22 @@ class PhysicalPlant:
         self.results_list = []
         self.results_list.append(list_header)
 
+        # The PLCs running control logic acknowledge every hydraulic step before the plant simulates the next one
+        self.virtual_clock = is_virtual(config_options)
+        self.step_server = StepServer(['plc1', 'plc3', 'plc5'], ack_timeout=config_options.get('barrier_timeout'),
+                                      virtual=self.virtual_clock)
+
         # intialize the simulation with the random demand patterns and tank levels
         self.initialize_simulation(config_options)
 
         dummy_condition = controls.ValueCondition(self.wn.get_node(self.tank_list[0]), 'level', '>=', -1)
 
-        self.control_list = []
-        for valve in self.valve_list:
-            self.control_list.append(self.create_control_dict(valve, dummy_condition))
+        # The actuator state only touches the WNTR controls of the actuators changed by the PLCs
+        actuator_names = []
+        actuator_names.extend(self.valve_list)
+        actuator_names.extend(self.pump_list)
+        self.actuator_state = ActuatorState(self.wn, actuator_names, dummy_condition)
 
-        for pump in self.pump_list:
-            self.control_list.append(self.create_control_dict(pump, dummy_condition))
-
-        for control in self.control_list:
-            an_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-            a_control = controls.Control(control['condition'], an_action)
-            self.wn.add_control(control['name'], a_control)
-
-        print('controls: ' + str(self.control_list))
         simulator_string = config_options['simulator']
 
         if simulator_string == 'pdd':
@@ -126,77 +122,6 @@ class PhysicalPlant:
 
         print("Starting simulation for " + str(config_options['inp_file']) + " topology ")
 
-    def _init_what(self):
-        """Save a ordered tuple of pk field names in self._what."""
-
-        # https://sqlite.org/pragma.html#pragma_table_info
-        query = "PRAGMA table_info(%s)" % self._name
-        # print "DEBUG query: ", query
-
-        with sqlite3.connect(self._path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(query)
-                table_info = cursor.fetchall()
-                # print "DEBUG table_info: ", table_info
-
-                # last tuple element
-                pks = []
-                for field in table_info:
-                    if field[-1] > 0:
-                        # print 'DEBUG pk field: ', field
-                        pks.append(field)
-
-                if not pks:
-                    print "ERROR: please provide at least 1 primary key"
-                else:
-                    # sort by pk order
-                    pks.sort(key=lambda x: x[5])
-                    # print 'DEBUG sorted pks: ', pks
-
-                    what_list = []
-                    for pk in pks:
-                        what_list.append(pk[1])
-                    # print 'DEBUG what list: ', what_list
-
-                    self._what = tuple(what_list)
-                    # print 'DEBUG self._what: ', self._what
-
-            except sqlite3.Error, e:
-                print('ERROR: %s: ' % e.args[0])
-
-    def _init_set_query(self):
-        """Use prepared statements."""
-
-        set_query = 'UPDATE %s SET %s = ? WHERE %s = ?' % (
-            self._name,
-            self._value,
-            self._what[0])
-
-        # for composite pk
-        for pk in self._what[1:]:
-            set_query += ' AND %s = ?' % (
-                pk)
-
-        print 'DEBUG set_query:', set_query
-        self._set_query = set_query
-
-    def _init_get_query(self):
-        """Use prepared statement."""
-
-        get_query = 'SELECT %s FROM %s WHERE %s = ?' % (
-            self._value,
-            self._name,
-            self._what[0])
-
-        # for composite pk
-        for pk in self._what[1:]:
-            get_query += ' AND %s = ?' % (
-                pk)
-
-        print 'DEBUG get_query:', get_query
-        self._get_query = get_query
-
     def load_config(self, config_path):
         """
         Reads the YAML configuration file
@@ -263,18 +188,6 @@ class PhysicalPlant:
             result.append(self.wn.get_control(control))
         return result
 
-    def create_control_dict(self, actuator, dummy_condition):
-        act_dict = dict.fromkeys(['actuator', 'parameter', 'value', 'condition', 'name'])
-        act_dict['actuator'] = self.wn.get_link(actuator)
-        act_dict['parameter'] = 'status'
-        act_dict['condition'] = dummy_condition
-        act_dict['name'] = actuator
-        if type(self.wn.get_link(actuator).status) is int:
-            act_dict['value'] = act_dict['actuator'].status
-        else:
-            act_dict['value'] = act_dict['actuator'].status.value
-        return act_dict
-
     def register_epanet_results(self, pressure_results, flowrate_results, status_results, timestamp):
         some_values_list = []
         some_values_list.extend([timestamp])
@@ -335,8 +248,9 @@ class PhysicalPlant:
         attack2 = 0
 
         try:
-            attack1 = int(self.get_from_db('ATT_1'))
-            attack2 = int(self.get_from_db('ATT_2'))
+            attack_values = self.get_multiple_from_db(['ATT_1', 'ATT_2'])
+            attack1 = int(attack_values['ATT_1'])
+            attack2 = int(attack_values['ATT_2'])
         except Exception as e :
             print("Warning exception acessing DB " + str(e))
 
@@ -356,32 +270,22 @@ class PhysicalPlant:
         return actuator_list
 
     def update_controls(self):
-        for control in self.control_list:
-            self.update_control(control)
+        """
+        Reads the actuator status written by the PLCs and applies the ones that changed to the WNTR model
+        :return: the number of actuators that changed their status
+        """
+        new_status = self.get_multiple_from_db(self.actuator_state.get_names())
+        return self.actuator_state.update(new_status)
 
     def get_actuator_state(self, actuator):
 
         actuator_dict = {}
 
-        act_name = '\'' + actuator + '\''
         actuator_dict['name'] = actuator
-        actuator_dict['status'] = int(self.get_from_db(act_name))
+        actuator_dict['status'] = int(self.get_from_db(actuator))
 
         return actuator_dict
 
-    def update_control(self, control):
-        act_name = '\'' + control['name'] + '\''
-        new_status = int(self.get_from_db(act_name))
-
-        control['value'] = new_status
-
-        new_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-        #new_control = controls.Control(control['condition'], new_action, name=control['name'])
-        new_control = controls.Control(control['condition'], new_action)
-
-        self.wn.remove_control(control['name'])
-        self.wn.add_control(control['name'], new_control)
-
     def write_results(self, results):
         with open('output/' + self.output_path, 'w') as f:
             print("Saving output to: " + 'output/' + self.output_path)
@@ -398,43 +302,39 @@ class PhysicalPlant:
                 self.attack_end = int(attack['end'])
                 self.attack_type = attack['type']
 
+    def convert_to_tuple(self, what):
+        return what, 1
+
     def set_to_db(self, what, value):
-        """Returns setted value.
-        ``value``'s type is not checked, the client has to specify the correct
-        one.
-        what_list overwrites the given what tuple,
-        eg new what tuple: ``(value, what[0], what[1], ...)``
         """
-        what_list = [value]
-
-        for pk in what:
-            what_list.append(pk)
-
-        what = tuple(what_list)
-        # print 'DEBUG set what: ', what
-
-        with sqlite3.connect(self._path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(self._set_query, what)
-                conn.commit()
-                return value
-
-            except sqlite3.Error, e:
-                print('_set ERROR: %s: ' % e.args[0])
+        Writes a tag into the state database
+        :param what: name of the tag
+        :param value: value to store
+        :return: the stored value
+        """
+        return self.state_db.set(self.convert_to_tuple(what), value)
 
     def get_from_db(self, what):
-        """Returns the first element of the result tuple."""
+        """
+        :param what: name of the tag
+        :return: the value stored in the state database
+        """
+        return self.state_db.get(self.convert_to_tuple(what))
 
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(self._get_query, what)
-                record = cursor.fetchone()
-                return record[0]
+    def set_multiple_to_db(self, what_values):
+        """
+        Writes several tags using a single executemany inside one transaction
+        :param what_values: list of (name, value) tuples
+        """
+        self.state_db.set_multiple(what_values)
 
-            except sqlite3.Error, e:
-                print('_get ERROR: %s: ' % e.args[0])
+    def get_multiple_from_db(self, names):
+        """
+        Reads several tags using a single query
+        :param names: list with the name of the tags to read
+        :return: dictionary with the tag name as key and the stored value as value
+        """
+        return self.state_db.get_multiple(names)
 
     def main(self):
         # We want to simulate only 1 hydraulic timestep each time MiniCPS processes the simulation data
@@ -461,14 +361,28 @@ class PhysicalPlant:
 
         print("Output path will be: " + str(self.output_path))
 
+        try:
+            print("PLCs in the step barrier: " + str(self.step_server.wait_for_plcs()))
+        except RuntimeError as e:
+            print("Error: " + str(e) + ", aborting")
+            self.step_server.close()
+            sys.exit(1)
+
+        # The real-time factor counts from the first step, not from the PLC registration
+        self.clock = Clock(self.virtual_clock)
+
         while master_time <= iteration_limit:
-            self.update_controls()
+            changes = self.update_controls()
             #self.update_actuators()
 
             #actuators_state = self.get_actuators_state()
 
             print("ITERATION %d ------------- " % master_time)
+            print("Applied " + str(changes) + " actuator changes")
             results = self.sim.run_sim()
+
+            # The results of this step are timestamped with its simulation time
+            self.clock.advance(self.wn.sim_time)
             values_list = self.register_results(results)
             #results = self.sim.run_sim()
 
@@ -483,46 +397,48 @@ class PhysicalPlant:
 
             # EPANET simulator requires this to advance the simulation
             # self.wn.options.time.duration += self.wn.options.time.hydraulic_timestep
+            solved_step = master_time
             master_time += 1
-            try:
-                # Update tank pressure
-                for tank in self.tank_list:
-                    tank_name = '\'' + tank + '\''
-                    a_level = self.wn.get_node(tank).level
-                    self.set_to_db(tank_name, a_level)
-
-                # Update pump flow
-                for pump in self.pump_list:
-                    a_flowrate = Decimal(self.wn.get_link(pump).flow)
-                    pump_name ='\'' + pump + a_flowrate + '\''
-                    self.set_to_db(pump_name, a_flowrate)
-
-                # Update valve flow
-                for valve in self.valve_list:
-                    a_flowrate = Decimal(self.wn.get_link(valve).flow)
-                    valve_name ='\'' + valve + 'F' + '\''
-                    self.set_to_db(valve_name, a_flowrate)
-
-                # Update the SCADA junctions
-                for junction in self.scada_junction_list:
-                    junction_name = '\'' + junction + '\''
-                    a_level = Decimal(self.wn.get_node(junction).head - self.wn.get_node(junction).elevation)
-                    self.set_to_db(junction_name, a_level)
-
-                self.set_to_db('CONTROL', 0)
-
-                # For concealment attacks, we need more stages in the attack
-                if self.attack_flag and (self.attack_type == "device_attack" or self.attack_type == "network_attack"):
-                    if self.attack_start <= master_time < self.attack_end:
-                        self.set_to_db('ATT_2', 1)
-                    else:
-                        self.set_to_db('ATT_2', 0)
-
-            except Exception:
-                print("Warning, skipping an iteration")
-                continue
 
+            # All the sensor tags are written in one transaction
+            sensor_values = []
+
+            # Update tank pressure
+            for tank in self.tank_list:
+                sensor_values.append((tank, self.wn.get_node(tank).level))
+
+            # Update pump flow
+            for pump in self.pump_list:
+                sensor_values.append((pump + 'F', numeric_mode.get_db_value(self.numeric_mode,
+                                                                            self.wn.get_link(pump).flow)))
+
+            # Update valve flow
+            for valve in self.valve_list:
+                sensor_values.append((valve + 'F', numeric_mode.get_db_value(self.numeric_mode,
+                                                                             self.wn.get_link(valve).flow)))
+
+            # Update the SCADA junctions
+            for junction in self.scada_junction_list:
+                a_level = self.wn.get_node(junction).head - self.wn.get_node(junction).elevation
+                sensor_values.append((junction, numeric_mode.get_db_value(self.numeric_mode, a_level)))
+
+            # For concealment attacks, we need more stages in the attack
+            if self.attack_flag and (self.attack_type == "device_attack" or self.attack_type == "network_attack"):
+                if self.attack_start <= master_time < self.attack_end:
+                    sensor_values.append(('ATT_2', 1))
+                else:
+                    sensor_values.append(('ATT_2', 0))
+
+            self.set_multiple_to_db(sensor_values)
+
+            # The PLCs apply their control logic to the new sensor values before the next step reads the actuators
+            self.step_server.publish(solved_step, self.wn.sim_time)
+            self.step_server.wait_for_acks(solved_step)
+            print("Real-time factor: %.2f" % self.clock.real_time_factor())
+
+        self.step_server.close()
         self.write_results(self.results_list)
+        print("Achieved real-time factor: %.2f" % self.clock.real_time_factor())
 
 
 if __name__ == "__main__":
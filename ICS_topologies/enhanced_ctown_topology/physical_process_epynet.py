@@ -1,11 +1,12 @@
-import sqlite3
 import csv
 import sys
 import os
 import pandas as pd
 import yaml
+from state_db import StateDB
+from step_barrier import StepServer
+from virtual_clock import Clock, is_virtual
 from decimal import Decimal
-from datetime import datetime
 from utils import T1, T2, T3, T4, T5, T6, T7, PU1, PU2, PU1F, PU2F
 from utils import V2, PU3, PU4, PU5, PU6, PU7, PU8, PU9, PU10, PU11
 from utils import V2F, PU3F, PU4F, PU5F, PU6F, PU7F, PU8F, PU9F, PU10F, PU11F
@@ -42,22 +43,13 @@ class PhysicalPlant:
         else:
             self.attack_flag = False
 
-        # Use of prepared statements
-        self._name = 'ctown'
-        self._path = config_options['db_path']
-        self._value = 'value'
-        self._what = ()
-
-        self._init_what()
-
-        if not self._what:
-            raise ValueError('Primary key not found.')
-        else:
-            self._init_get_query()
-            self._init_set_query()
-
         # connection to the database
         self.db_path = config_options['db_path']
+        if 'db_busy_timeout' in config_options:
+            busy_timeout = float(config_options['db_busy_timeout'])
+        else:
+            busy_timeout = None
+        self.state_db = StateDB(self.db_path, 'ctown', busy_timeout)
         #self.conn = sqlite3.connect(self.db_path)
         #self.c = self.conn.cursor()
 
@@ -102,82 +94,16 @@ class PhysicalPlant:
 
         self.actuator_list = None
 
+        # The PLCs running control logic acknowledge every hydraulic step before the plant simulates the next one
+        self.virtual_clock = is_virtual(config_options)
+        self.step_server = StepServer(['plc1', 'plc3', 'plc5'], ack_timeout=config_options.get('barrier_timeout'),
+                                      virtual=self.virtual_clock)
+
         # intialize the simulation with the random demand patterns and tank levels
         self.initialize_simulation(config_options)
 
         print("Starting simulation for " + str(config_options['inp_file']) + " topology ")
 
-    def _init_what(self):
-        """Save a ordered tuple of pk field names in self._what."""
-
-        # https://sqlite.org/pragma.html#pragma_table_info
-        query = "PRAGMA table_info(%s)" % self._name
-        # print "DEBUG query: ", query
-
-        with sqlite3.connect(self._path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(query)
-                table_info = cursor.fetchall()
-                # print "DEBUG table_info: ", table_info
-
-                # last tuple element
-                pks = []
-                for field in table_info:
-                    if field[-1] > 0:
-                        # print 'DEBUG pk field: ', field
-                        pks.append(field)
-
-                if not pks:
-                    print("ERROR: please provide at least 1 primary key")
-                else:
-                    # sort by pk order
-                    pks.sort(key=lambda x: x[5])
-                    # print 'DEBUG sorted pks: ', pks
-
-                    what_list = []
-                    for pk in pks:
-                        what_list.append(pk[1])
-                    # print 'DEBUG what list: ', what_list
-
-                    self._what = tuple(what_list)
-                    print('DEBUG self._what: ', self._what)
-
-            except sqlite3.Error as e:
-                print('ERROR: %s: ' % e.args[0])
-
-    def _init_set_query(self):
-        """Use prepared statements."""
-
-        set_query = 'UPDATE %s SET %s = ? WHERE %s = ?' % (
-            self._name,
-            self._value,
-            self._what[0])
-
-        # for composite pk
-        for pk in self._what[1:]:
-            set_query += ' AND %s = ?' % (
-                pk)
-
-        print('DEBUG set_query:', set_query)
-        self._set_query = set_query
-
-    def _init_get_query(self):
-        """Use prepared statement."""
-
-        get_query = 'SELECT %s FROM %s WHERE %s = ?' % (
-            self._value,
-            self._name,
-            self._what[0])
-
-        # for composite pk
-        for pk in self._what[1:]:
-            get_query += ' AND %s = ?' % (
-                pk)
-
-        print('DEBUG get_query:', get_query)
-        self._get_query = get_query
-
     def load_config(self, config_path):
         """
         Reads the YAML configuration file
@@ -242,17 +168,15 @@ class PhysicalPlant:
             result.append(link + "_STATUS")
         return result
 
-    def get_actuator_status(self, actuator):
-        return int(self.get_from_db(actuator))
-
     def update_actuators(self):
+        actuator_status = self.get_multiple_from_db(list(self.actuator_list.keys()))
         for actuator in self.actuator_list:
-            self.actuator_list[actuator] = self.get_actuator_status(actuator)
+            self.actuator_list[actuator] = int(actuator_status[actuator])
 
     def register_results(self, results):
 
         values_list = []
-        values_list.extend([datetime.now()])
+        values_list.extend([self.clock.now()])
 
         for tank in self.tank_list:
             #print(str(tank) + " Tank Pressure: " + str(results[tank]['pressure']))
@@ -271,8 +195,9 @@ class PhysicalPlant:
         attack2 = 0
 
         try:
-            attack1 = int(self.get_from_db('ATT_1'))
-            attack2 = int(self.get_from_db('ATT_2'))
+            attack_values = self.get_multiple_from_db(['ATT_1', 'ATT_2'])
+            attack1 = int(attack_values['ATT_1'])
+            attack2 = int(attack_values['ATT_2'])
         except Exception:
             print("Warning DB locked")
 
@@ -299,41 +224,35 @@ class PhysicalPlant:
         return what, 1
 
     def set_to_db(self, what, value):
-        """Returns setted value.
-        ``value``'s type is not checked, the client has to specify the correct
-        one.
-        what_list overwrites the given what tuple,
-        eg new what tuple: ``(value, what[0], what[1], ...)``
         """
-        what_list = [value]
-
-        what_tuple = self.convert_to_tuple(what)
-        for pk in what_tuple:
-            what_list.append(pk)
-        what = tuple(what_list)
+        Writes a tag into the state database
+        :param what: name of the tag
+        :param value: value to store
+        :return: the stored value
+        """
+        return self.state_db.set(self.convert_to_tuple(what), value)
 
-        with sqlite3.connect(self._path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(self._set_query, what)
-                conn.commit()
-                return value
+    def get_from_db(self, what):
+        """
+        :param what: name of the tag
+        :return: the value stored in the state database
+        """
+        return self.state_db.get(self.convert_to_tuple(what))
 
-            except sqlite3.Error as e:
-                print('_set ERROR: %s: ' % e.args[0])
+    def set_multiple_to_db(self, what_values):
+        """
+        Writes several tags using a single executemany inside one transaction
+        :param what_values: list of (name, value) tuples
+        """
+        self.state_db.set_multiple(what_values)
 
-    def get_from_db(self, what):
-        """Returns the first element of the result tuple."""
-        what_tuple = self.convert_to_tuple(what)
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(self._get_query, what_tuple)
-                record = cursor.fetchone()
-                return record[0]
-
-            except sqlite3.Error as e:
-                print('_get ERROR: %s: ' % e.args[0])
+    def get_multiple_from_db(self, names):
+        """
+        Reads several tags using a single query
+        :param names: list with the name of the tags to read
+        :return: dictionary with the tag name as key and the stored value as value
+        """
+        return self.state_db.get_multiple(names)
 
     def main(self):
 
@@ -372,12 +291,25 @@ class PhysicalPlant:
         #status = [1.0, 0.0]
         #actuators_status_dict = {uid: status for uid in self.wn.pumps.uid.append(self.wn.valves.uid)}
 
+        try:
+            print("PLCs in the step barrier: " + str(self.step_server.wait_for_plcs()))
+        except RuntimeError as e:
+            print("Error: " + str(e) + ", aborting")
+            self.step_server.close()
+            sys.exit(1)
+
+        # The real-time factor counts from the first step, not from the PLC registration
+        self.clock = Clock(self.virtual_clock)
+
         while internal_epynet_step > 0:
 
             self.update_actuators()
             #print("Simulating with actuators: " + str(self.actuator_list))
             internal_epynet_step, network_state = self.wn.simulate_step(simulation_time, self.actuator_list)
 
+            # The results of this step are timestamped with its simulation time
+            self.clock.advance(simulation_time)
+
             if internal_epynet_step == simluation_step:
                 master_time += 1
 
@@ -394,50 +326,49 @@ class PhysicalPlant:
 
             self.results_list.append(step_results)
 
+            solved_time = simulation_time
             simulation_time = simulation_time + internal_epynet_step
             #continue
 
 
-            try:
-                # Update tank pressure
-                for tank in self.tank_list:
-                    a_level = network_state[tank]['pressure']
-                    self.set_to_db(tank, a_level)
-
-                # Update pump flow
-                for pump in self.pump_list:
-                    a_flowrate = network_state[pump]['flow']
-                    pump_name = pump + 'F'
-                    self.set_to_db(pump_name, a_flowrate)
-
-                # Update valve flow
-                for valve in self.valve_list:
-                    a_flowrate = network_state[valve]['flow']
-                    valve_name = valve + 'F'
-                    self.set_to_db(valve_name, a_flowrate)
-
-                # Update the SCADA junctions
-                #print(self.scada_junction_list)
-                for junction in self.scada_junction_list:
-                    junction_name = junction
-                    a_level = self.wn.junctions[junction].pressure.iloc[-1]
-                    self.set_to_db(junction_name, a_level)
-
-                self.set_to_db('CONTROL', 0)
-
-                # For concealment attacks, we need more stages in the attack
-                if self.attack_flag and (self.attack_type == "device_attack" or self.attack_type == "network_attack"):
-                    if self.attack_start <= master_time < self.attack_end:
-                        self.set_to_db('ATT_2', 1)
-                    else:
-                        self.set_to_db('ATT_2', 0)
-
-            except sqlite3 as ex:
-                print("Warning, DB error")
-                print(ex)
-                continue
+            # All the sensor tags are written in one transaction
+            sensor_values = []
+
+            # Update tank pressure
+            for tank in self.tank_list:
+                sensor_values.append((tank, network_state[tank]['pressure']))
+
+            # Update pump flow
+            for pump in self.pump_list:
+                sensor_values.append((pump + 'F', network_state[pump]['flow']))
+
+            # Update valve flow
+            for valve in self.valve_list:
+                sensor_values.append((valve + 'F', network_state[valve]['flow']))
+
+            # Update the SCADA junctions
+            for junction in self.scada_junction_list:
+                sensor_values.append((junction, self.wn.junctions[junction].pressure.iloc[-1]))
+
+            # For concealment attacks, we need more stages in the attack
+            if self.attack_flag and (self.attack_type == "device_attack" or self.attack_type == "network_attack"):
+                if self.attack_start <= master_time < self.attack_end:
+                    sensor_values.append(('ATT_2', 1))
+                else:
+                    sensor_values.append(('ATT_2', 0))
+
+            self.set_multiple_to_db(sensor_values)
+
+            # The PLCs apply their control logic to the new sensor values before the next step reads the actuators
+            self.step_server.publish(solved_time, solved_time)
+            self.step_server.wait_for_acks(solved_time)
+
+            self.clock.advance(simulation_time)
+            print("Real-time factor: %.2f" % self.clock.real_time_factor())
 
+        self.step_server.close()
         self.write_results(self.results_list)
+        print("Achieved real-time factor: %.2f" % self.clock.real_time_factor())
 
 if __name__ == "__main__":
     simulation = PhysicalPlant()
@@ -1,7 +1,7 @@
 from basePLC import BasePLC
 from utils import *
 from datetime import datetime
-from decimal import Decimal
+import numeric_mode
 import time
 import threading
 import yaml
@@ -18,6 +18,9 @@ class PLC(BasePLC):
         self.plc_dict_path = sys.argv[6]
         lastPLC = sys.argv[8]
 
+        # Converts the values read by the PLC and the rule limits to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
+
         # This is a list of dictionaries with keys 'tag' and 'value'
         self.tags_to_get = []
 
@@ -52,7 +55,7 @@ class PLC(BasePLC):
         for tag in self.tags_to_send:
             converted_tag = self.convert_tag_to_enip_tag(tag)
             self.converted_tags_to_send.append(converted_tag)
-            self.values_to_send.append(Decimal(self.get(converted_tag)))
+            self.values_to_send.append(self.to_number(self.get(converted_tag)))
 
         if self.name != "SCADA" or self.name != "scada":
             # If we are a SCADA we don't need a reader thread
@@ -79,7 +82,7 @@ class PLC(BasePLC):
         for tag in self.plc_dict[tag_type]:
             tag_dict = {}
             tag_dict['tag'] = tag
-            tag_dict['value'] = Decimal(self.get(eval(tag_dict['tag'])))
+            tag_dict['value'] = self.to_number(self.get(eval(tag_dict['tag'])))
             self.tags_to_get.append(tag_dict)
 
     def populate_dependencies(self):
@@ -177,10 +180,10 @@ class PLC(BasePLC):
         :return: True if the condition is met. False otherwise
         """
         if operator == '<=':
-            if current_value < Decimal(limit):
+            if current_value < self.to_number(limit):
                 return True
         elif operator == '>=':
-            if current_value > Decimal(limit):
+            if current_value > self.to_number(limit):
                 return True
         else:
             return False
@@ -216,10 +219,10 @@ class PLC(BasePLC):
 
                 # 1) Get inputs
                 for tag in self.tags_to_get:
-                    tag['value'] = Decimal(self.get(eval(tag['tag'])))
+                    tag['value'] = self.to_number(self.get(eval(tag['tag'])))
 
                 for tag in self.tags_to_receive:
-                    tag['value'] = Decimal(self.receive(eval(tag['tag']), CTOWN_IPS[tag['node']]))
+                    tag['value'] = self.to_number(self.receive(eval(tag['tag']), CTOWN_IPS[tag['node']]))
 
                 # 2) Apply control logic, using the current buffered system state
                 self.update_actuators()
@@ -240,6 +243,7 @@ if __name__ == "__main__":
     parser.add_argument("--dict", "-d", help="Path of the dictionaries configuration file")
     parser.add_argument("--last", "-l", help="Flag that indicates if this is the last PLC. The last PLC moves the"
                                              "output files into the right output folder")
+    parser.add_argument("--numeric", "-m", help="Number type of the values and rule limits: float or decimal")
 
     args = parser.parse_args()
 
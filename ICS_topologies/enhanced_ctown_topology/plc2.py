@@ -1,7 +1,8 @@
 from basePLC import BasePLC
 from utils import PLC2_DATA, STATE, PLC2_PROTOCOL
 from utils import T1, ENIP_LISTEN_PLC_ADDR
-from decimal import Decimal
+import numeric_mode
+import sys
 import time
 import threading
 
@@ -12,11 +13,14 @@ class PLC2(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc2 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
 
         # Flag used to stop the thread
         self.reader = True
-        self.t1 = Decimal(self.get(T1))
+        self.t1 = self.to_number(self.get(T1))
         self.lock = threading.Lock()
 
         # Used in handling of sigint and sigterm signals, also sets the parameters to save the system state variable
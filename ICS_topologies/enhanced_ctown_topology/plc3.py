@@ -1,9 +1,10 @@
 from basePLC import BasePLC
+from step_barrier import StepClient
 from utils import PLC3_DATA, STATE, PLC3_PROTOCOL
-from utils import T2, T3, T4, V2, V2F, PU4, PU5, PU6, PU7, PU4F, PU5F, PU6F, PU7F, ENIP_LISTEN_PLC_ADDR, CTOWN_IPS, CONTROL
+from utils import T2, T3, T4, V2, V2F, PU4, PU5, PU6, PU7, PU4F, PU5F, PU6F, PU7F, ENIP_LISTEN_PLC_ADDR, CTOWN_IPS
 from utils import J300, J256, J289, J415, J14, J422
 from utils import ATT_1, ATT_2
-from decimal import Decimal
+import numeric_mode
 import time
 import threading
 import sys
@@ -14,12 +15,15 @@ class PLC3(BasePLC):
     def pre_loop(self):
         print 'DEBUG: plc3 enters pre_loop'
 
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
+
         # We wish we could implement this as arg_parse, but we cannot overwrite the constructor
         self.week_index = sys.argv[2]
         self.attack_flag = False
         self.attack_dict = None
 
-        if len(sys.argv) >= 4:
+        if len(sys.argv) >= 4 and sys.argv[3] == '-f':
             self.attack_flag = sys.argv[4]
             self.attack_path = sys.argv[6]
             self.attack_name = sys.argv[8]
@@ -31,33 +35,33 @@ class PLC3(BasePLC):
         self.local_time = 0
 
         # Used to sync the actuators and the physical process
-        self.plc_mask = 2
+        self.step_client = StepClient('plc3')
 
 
         # Flag used to stop the thread
         self.reader = True
         self.saved_tank_levels = [["iteration", "timestamp", "T2", "T3", "T4"]]
 
-        self.t2 = Decimal(self.get(T2))
+        self.t2 = self.to_number(self.get(T2))
         self.v2 = int(self.get(V2))
-        self.v2f = Decimal(self.get(V2F))
+        self.v2f = self.to_number(self.get(V2F))
 
-        self.j300 = Decimal(self.get(J300))
-        self.j256 = Decimal(self.get(J256))
-        self.j289 = Decimal(self.get(J289))
-        self.j415 = Decimal(self.get(J415))
-        self.j14 = Decimal(self.get(J14))
-        self.j422 = Decimal(self.get(J422))
+        self.j300 = self.to_number(self.get(J300))
+        self.j256 = self.to_number(self.get(J256))
+        self.j289 = self.to_number(self.get(J289))
+        self.j415 = self.to_number(self.get(J415))
+        self.j14 = self.to_number(self.get(J14))
+        self.j422 = self.to_number(self.get(J422))
 
         self.pu4 = int(self.get(PU4))
         self.pu5 = int(self.get(PU5))
         self.pu6 = int(self.get(PU6))
         self.pu7 = int(self.get(PU7))
 
-        self.pu4f = Decimal(self.get(PU4F))
-        self.pu5f = Decimal(self.get(PU5F))
-        self.pu6f = Decimal(self.get(PU6F))
-        self.pu7f = Decimal(self.get(PU7F))
+        self.pu4f = self.to_number(self.get(PU4F))
+        self.pu5f = self.to_number(self.get(PU5F))
+        self.pu6f = self.to_number(self.get(PU6F))
+        self.pu7f = self.to_number(self.get(PU7F))
 
         self.lock = threading.Lock()
         path = 'plc3_saved_tank_levels_received.csv'
@@ -79,25 +83,20 @@ class PLC3(BasePLC):
             if name == attack['name']:
                 return attack
 
-    def check_control(self, mask):
-        control = int(self.get(CONTROL))
-        if not (mask & control):
-            return True
-        return False
-
     def main_loop(self):
         while True:
+            # Blocks until the physical process publishes the next hydraulic step
+            step = self.step_client.wait_step()
             try:
 
                 # Check if we need to launch an attack
                 attack_on = int(self.get(ATT_2))
                 self.set(ATT_1, attack_on)
 
-                #if self.check_control(self.plc_mask):
                 self.local_time += 1
-                self.t2 = Decimal( self.get( T2 ) )
-                self.t3 = Decimal(self.receive( T3, CTOWN_IPS['plc4'] ))
-                self.t4 = Decimal(self.receive( T4, CTOWN_IPS['plc6'] ))
+                self.t2 = self.to_number( self.get( T2 ) )
+                self.t3 = self.to_number(self.receive( T3, CTOWN_IPS['plc4'] ))
+                self.t4 = self.to_number(self.receive( T4, CTOWN_IPS['plc6'] ))
 
                 #self.saved_tank_levels.append([self.local_time, datetime.now(), self.t2, self.t3, self.t4])
                 with self.lock:
@@ -187,15 +186,19 @@ class PLC3(BasePLC):
                     self.set(PU6, self.pu6)
                     self.set(PU7, self.pu7)
 
-                control = int(self.get(CONTROL))
-                control += self.plc_mask
-                self.set(CONTROL, control)
-                time.sleep(0.05)
-                #else:
-                #    time.sleep(0.1)
-
             except Exception:
                 continue
+            finally:
+                # The values of this step are served before it is acknowledged, so the SCADA never reads an earlier one
+                if step is not None:
+                    self.publish_system_state()
+
+                # The step is acknowledged even if the scan failed, so the physical process does not wait for this PLC
+                self.step_client.ack(step)
+
+            # Without a barrier the PLC keeps a free running scan
+            if step is None:
+                time.sleep(0.05)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@ from basePLC import BasePLC
 from utils import PLC4_DATA, STATE, PLC4_PROTOCOL
 from utils import T3, ENIP_LISTEN_PLC_ADDR
 import logging
-from decimal import Decimal
+import numeric_mode
+import sys
 import threading
 
 logging.basicConfig(filename='plc4_debug.log', level=logging.DEBUG)
@@ -14,11 +15,14 @@ class PLC4(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc4 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
 
         # Flag used to stop the thread
         self.reader = True
-        self.t3 = Decimal(self.get(T3))
+        self.t3 = self.to_number(self.get(T3))
 
         self.lock = threading.Lock()
         tags = [T3]
@@ -37,7 +41,7 @@ class PLC4(BasePLC):
         while True:
             try:
                 with self.lock:
-                    self.t3 = Decimal(self.get(T3))
+                    self.t3 = self.to_number(self.get(T3))
             except Exception:
                 get_error_counter += 1
                 print("Exception!")
@@ -1,8 +1,9 @@
 from basePLC import BasePLC
-from utils import PLC5_DATA, STATE, PLC5_PROTOCOL, CONTROL
+from step_barrier import StepClient
+from utils import PLC5_DATA, STATE, PLC5_PROTOCOL
 from utils import T5, T7, PU8, PU10, PU11, PU8F, PU10F, PU11F, ENIP_LISTEN_PLC_ADDR, CTOWN_IPS
 from utils import J302, J306, J307, J317
-from decimal import Decimal
+import numeric_mode
 import time
 import threading
 import sys
@@ -13,11 +14,14 @@ class PLC5(BasePLC):
     def pre_loop(self):
         print 'DEBUG: plc5 enters pre_loop'
 
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
+
         self.week_index = sys.argv[2]
         self.local_time = 0
 
         # Used to sync the actuators and the physical process
-        self.plc_mask = 4
+        self.step_client = StepClient('plc5')
 
         # Flag used to stop the thread
         self.reader = True
@@ -25,14 +29,14 @@ class PLC5(BasePLC):
         self.pu10 = int(self.get(PU10))
         self.pu11 = int(self.get(PU11))
 
-        self.pu8f = Decimal(self.get(PU8F))
-        self.pu10f = Decimal(self.get(PU10F))
-        self.pu11f = Decimal(self.get(PU11F))
+        self.pu8f = self.to_number(self.get(PU8F))
+        self.pu10f = self.to_number(self.get(PU10F))
+        self.pu11f = self.to_number(self.get(PU11F))
 
-        self.j302 = Decimal(self.get(J302))
-        self.j306 = Decimal(self.get(J306))
-        self.j307 = Decimal(self.get(J307))
-        self.j317 = Decimal(self.get(J317))
+        self.j302 = self.to_number(self.get(J302))
+        self.j306 = self.to_number(self.get(J306))
+        self.j307 = self.to_number(self.get(J307))
+        self.j317 = self.to_number(self.get(J317))
 
         self.lock = threading.Lock()
         tags = [PU8, PU10, PU11, PU8F, PU10F, PU11F, J302, J306, J307, J317]
@@ -44,19 +48,15 @@ class PLC5(BasePLC):
         BasePLC.set_parameters(self, tags, values, self.reader, self.lock, ENIP_LISTEN_PLC_ADDR, self.week_index)
         self.startup()
 
-    def check_control(self, mask):
-        control = int(self.get(CONTROL))
-        if not (mask & control):
-            return True
-        return False
-
     def main_loop(self):
 
         while True:
+            # Blocks until the physical process publishes the next hydraulic step
+            step = self.step_client.wait_step()
             try:
                 self.local_time += 1
-                self.t5 = Decimal(self.receive(T5, CTOWN_IPS['plc7']))
-                self.t7 = Decimal(self.receive(T7, CTOWN_IPS['plc9']))
+                self.t5 = self.to_number(self.receive(T5, CTOWN_IPS['plc7']))
+                self.t7 = self.to_number(self.receive(T7, CTOWN_IPS['plc9']))
 
                 with self.lock:
                     if self.t5 < 1.5:
@@ -81,15 +81,20 @@ class PLC5(BasePLC):
                     self.set(PU10, self.pu10)
                     self.set(PU11, self.pu11)
 
-                control = int(self.get(CONTROL))
-                control += self.plc_mask
-                self.set(CONTROL, control)
-                time.sleep(0.05)
-                #else:
-                #    time.sleep(0.1)
             except Exception:
                 print("Connection interrupted at " + str(self.local_time))
                 continue
+            finally:
+                # The values of this step are served before it is acknowledged, so the SCADA never reads an earlier one
+                if step is not None:
+                    self.publish_system_state()
+
+                # The step is acknowledged even if the scan failed, so the physical process does not wait for this PLC
+                self.step_client.ack(step)
+
+            # Without a barrier the PLC keeps a free running scan
+            if step is None:
+                time.sleep(0.05)
 
 if __name__ == "__main__":
     plc5 = PLC5(
@@ -2,7 +2,8 @@ from basePLC import BasePLC
 from utils import PLC6_DATA, STATE, PLC6_PROTOCOL
 from utils import T4, ENIP_LISTEN_PLC_ADDR
 import logging
-from decimal import Decimal
+import numeric_mode
+import sys
 import threading
 
 logging.basicConfig(filename='plc6_debug.log', level=logging.DEBUG)
@@ -14,11 +15,14 @@ class PLC6(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc6 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
 
         # Flag used to stop the thread
         self.reader = True
-        self.t4 = Decimal(self.get(T4))
+        self.t4 = self.to_number(self.get(T4))
 
         self.lock = threading.Lock()
         tags = [T4]
@@ -36,7 +40,7 @@ class PLC6(BasePLC):
         while True:
             try:
                 with self.lock:
-                    self.t4 = Decimal(self.get(T4))
+                    self.t4 = self.to_number(self.get(T4))
             except Exception:
                 get_error_counter += 1
                 if get_error_counter < get_error_counter_limit:
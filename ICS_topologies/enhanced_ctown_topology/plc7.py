@@ -1,7 +1,8 @@
 from basePLC import BasePLC
 from utils import PLC7_DATA, STATE, PLC7_PROTOCOL
 from utils import T5, ENIP_LISTEN_PLC_ADDR
-from decimal import Decimal
+import numeric_mode
+import sys
 import threading
 
 
@@ -12,11 +13,14 @@ class PLC7(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc7 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
 
         # Flag used to stop the thread
         self.reader = True
-        self.t5 = Decimal(self.get(T5))
+        self.t5 = self.to_number(self.get(T5))
 
         self.lock = threading.Lock()
         tags = [T5]
@@ -34,7 +38,7 @@ class PLC7(BasePLC):
         while True:
             try:
                 with self.lock:
-                    self.t5 = Decimal(self.get(T5))
+                    self.t5 = self.to_number(self.get(T5))
             except Exception:
                 get_error_counter += 1
                 if get_error_counter < get_error_counter_limit:
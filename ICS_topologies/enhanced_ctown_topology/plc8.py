@@ -1,7 +1,7 @@
 from basePLC import BasePLC
 from utils import PLC8_DATA, STATE, PLC8_PROTOCOL
 from utils import T6, ENIP_LISTEN_PLC_ADDR, CTOWN_IPS
-from decimal import Decimal
+import numeric_mode
 import sys
 import threading
 
@@ -10,6 +10,9 @@ class PLC8(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc8 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
         self.week_index = sys.argv[2]
         self.week_index = 0
@@ -17,7 +20,7 @@ class PLC8(BasePLC):
 
         # Flag used to stop the thread
         self.reader = True
-        self.t6 = Decimal(self.get(T6))
+        self.t6 = self.to_number(self.get(T6))
 
         self.lock = threading.Lock()
         tags = [T6]
@@ -36,7 +39,7 @@ class PLC8(BasePLC):
         while True:
             try:
                 with self.lock:
-                    self.t6 = Decimal(self.get(T6))
+                    self.t6 = self.to_number(self.get(T6))
             except Exception:
                 get_error_counter += 1
                 if get_error_counter < get_error_counter_limit:
@@ -1,7 +1,7 @@
 from basePLC import BasePLC
 from utils import PLC9_DATA, STATE, PLC9_PROTOCOL
 from utils import T7, ENIP_LISTEN_PLC_ADDR, CTOWN_IPS
-from decimal import Decimal
+import numeric_mode
 import sys
 import threading
 
@@ -12,6 +12,9 @@ class PLC9(BasePLC):
 
     def pre_loop(self):
         print 'DEBUG: plc9 enters pre_loop'
+
+        # Converts the values read by the PLC to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(numeric_mode.get_argument_mode(sys.argv))
         self.local_time = 0
         self.week_index = sys.argv[2]
         self.week_index = 0
@@ -19,7 +22,7 @@ class PLC9(BasePLC):
 
         # Flag used to stop the thread
         self.reader = True
-        self.t7 = Decimal(self.get(T7))
+        self.t7 = self.to_number(self.get(T7))
 
         self.lock = threading.Lock()
         tags = [T7]
@@ -37,7 +40,7 @@ class PLC9(BasePLC):
         while True:
             try:
                 with self.lock:
-                    self.t7 = Decimal(self.get(T7))
+                    self.t7 = self.to_number(self.get(T7))
             except Exception:
                 get_error_counter += 1
                 if get_error_counter < get_error_counter_limit:
@@ -1,4 +1,8 @@
 from basePLC import BasePLC
+from step_barrier import StepClient
+from virtual_clock import Clock
+from scada_poller import ScadaPoller, DEFAULT_POLL_PERIOD, SAMPLE_OK
+from historian import Historian
 from utils import SCADA_PROTOCOL, STATE
 from utils import CTOWN_IPS
 from utils import T1, T2, T3, T4, T5, T6, T7, PU1, PU2, PU1F, PU2F, ENIP_LISTEN_PLC_ADDR
@@ -7,23 +11,47 @@ from utils import V2F, PU3F, PU4F, PU5F, PU6F, PU7F, PU8F, PU9F, PU10F, PU11F
 from utils import J280, J269, J300, J256, J289, J415, J14, J422, J302, J306, J307, J317, ATT_1, ATT_2
 
 import time
-from datetime import datetime
 from decimal import Decimal
 import signal
 import sys
 import csv
+import yaml
+
+# Experiment configuration, the one automatic_run.py passes to the plant
+CONFIG_PATH = 'c_town_config.yaml'
 
 
 class SCADAServer(BasePLC):
 
     def write_output(self):
+        if self.historian is not None:
+            self.historian.close()
+            print self.historian.report()
+            return
         with open('output/' + self.path, 'w') as f:
             writer = csv.writer(f)
             writer.writerows(self.saved_tank_levels)
 
+    def store_samples(self, samples, scada_tags, scada_values):
+        """
+        Appends the samples received in this poll to the historian, with the time each PLC sample was received, and
+        the values of the SCADA with the time of the poll
+        :param samples: list returned by ScadaPoller.poll()
+        """
+        for plc, (values, sample_time, status) in zip(self.poller.plcs, samples):
+            if status != SAMPLE_OK:
+                continue
+            for tag, value in zip(plc.tags, values):
+                self.historian.append(tag[0], sample_time, value)
+
+        now = self.clock.now()
+        for tag, value in zip(scada_tags, scada_values):
+            self.historian.append(tag[0], now, value)
+
     def sigint_handler(self, sig, frame):
         print 'DEBUG SCADA shutdown'
         self.write_output()
+        self.poller.write_summary('output/scada_poll_timing.yaml')
         sys.exit(0)
 
     def pre_loop(self, sleep=0.5):
@@ -48,6 +76,32 @@ class SCADAServer(BasePLC):
         self.plc9_tags = [T7]
 
         self.path = 'scada_values.csv'
+
+        # With the historian the samples are stored in output/scada_historian as they arrive, instead of in memory
+        with open(CONFIG_PATH, 'r') as config_file:
+            config_options = yaml.load(config_file, Loader=yaml.FullLoader)
+        if config_options.get('scada_historian') == "True":
+            self.historian = Historian('output/scada_historian')
+        else:
+            self.historian = None
+
+        # With the virtual clock the SCADA polls once per hydraulic step, otherwise every 2 seconds of real time
+        self.clock = Clock()
+        self.step_client = StepClient('scada', clock=self.clock, watch=True)
+
+        # The PLCs are polled concurrently, each sample has its own timestamp and status columns
+        self.poller = ScadaPoller(self.receive_multiple, self.clock)
+        #plc1 is in the same LAN as SCADA!
+        self.poller.add_plc('plc1', self.plc1_tags, ENIP_LISTEN_PLC_ADDR)
+        self.poller.add_plc('plc2', self.plc2_tags, CTOWN_IPS['plc2'])
+        self.poller.add_plc('plc3', self.plc3_tags, CTOWN_IPS['plc3'])
+        self.poller.add_plc('plc4', self.plc4_tags, CTOWN_IPS['plc4'])
+        self.poller.add_plc('plc5', self.plc5_tags, CTOWN_IPS['plc5'])
+        self.poller.add_plc('plc6', self.plc6_tags, CTOWN_IPS['plc6'])
+        self.poller.add_plc('plc7', self.plc7_tags, CTOWN_IPS['plc7'])
+        self.poller.add_plc('plc8', self.plc8_tags, CTOWN_IPS['plc8'])
+        self.poller.add_plc('plc9', self.plc9_tags, CTOWN_IPS['plc9'])
+        self.saved_tank_levels[0].extend(self.poller.get_columns())
         signal.signal(signal.SIGINT, self.sigint_handler)
         signal.signal(signal.SIGTERM, self.sigint_handler)
 
@@ -55,42 +109,34 @@ class SCADAServer(BasePLC):
         """scada main loop."""
         print("DEBUG: scada main loop.")
         while True:
-
+            step = self.step_client.wait_step()
+            start = time.time()
             try:
-                #plc1 is in the same LAN as SCADA!
-                plc1_values = self.receive_multiple(self.plc1_tags, ENIP_LISTEN_PLC_ADDR)
-                plc2_values = self.receive_multiple(self.plc2_tags, CTOWN_IPS['plc2'])
-                plc3_values = self.receive_multiple(self.plc3_tags, CTOWN_IPS['plc3'])
-                plc4_values = self.receive_multiple(self.plc4_tags, CTOWN_IPS['plc4'])
-                plc5_values = self.receive_multiple(self.plc5_tags, CTOWN_IPS['plc5'])
-                plc6_values = self.receive_multiple(self.plc6_tags, CTOWN_IPS['plc6'])
-                plc7_values = self.receive_multiple(self.plc7_tags, CTOWN_IPS['plc7'])
-                plc8_values = self.receive_multiple(self.plc8_tags, CTOWN_IPS['plc8'])
-                plc9_values = self.receive_multiple(self.plc9_tags, CTOWN_IPS['plc9'])
+                samples = self.poller.poll()
 
                 scada_values = [self.get(PU3), self.get(PU3F), self.get(PU9), self.get(PU9F)]
                 att_1 = self.get(ATT_1)
                 att_2 = self.get(ATT_2)
 
-                results = [datetime.now()]
-                results.extend(plc1_values)
-                results.extend(plc2_values)
-                results.extend(plc3_values)
-                results.extend(plc4_values)
-                results.extend(plc5_values)
-                results.extend(plc6_values)
-                results.extend(plc7_values)
-                results.extend(plc8_values)
-                results.extend(plc9_values)
-                results.extend(scada_values)
-                results.extend([att_1, att_2])
-                self.saved_tank_levels.append(results)
-
-                # The scada polls for information every 2 seconds
-                time.sleep(2)
+                if self.historian is not None:
+                    self.store_samples(samples, [PU3, PU3F, PU9, PU9F, ATT_1, ATT_2], scada_values + [att_1, att_2])
+                else:
+                    results = [self.clock.now()]
+                    for values, _, _ in samples:
+                        results.extend(values)
+                    results.extend(scada_values)
+                    results.extend([att_1, att_2])
+                    for _, sample_time, status in samples:
+                        results.extend([sample_time, status])
+                    self.saved_tank_levels.append(results)
+
+                # The scada polls for information every 2 seconds, counted from the start of the poll
+                self.clock.sleep(max(0.0, DEFAULT_POLL_PERIOD - (time.time() - start)))
             except Exception, msg:
                 print(msg)
                 continue
+            finally:
+                self.step_client.ack(step)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+from peer_reader import PeerReader
+import random
+import threading
+import time
+import yaml
+
+"""
+Concurrent polling of the PLCs by the SCADA. Each PLC is read by its own PeerReader, so a PLC behind a slow or lossy
+link does not delay the samples of the others. A poll starts the read of every idle PLC and waits for all of them until
+the poll deadline. Every PLC sample keeps the time it was received, and is marked ok when it was received in this poll,
+stale when the SCADA still has an older sample of the PLC, or missing when it never received one
+"""
+
+# Seconds between the start of two polls
+DEFAULT_POLL_PERIOD = 2.0
+
+# Seconds a poll waits for the PLCs, measured from its start
+DEFAULT_POLL_DEADLINE = 1.5
+
+# Number of durations kept to compute the percentiles of the timing summary
+SAMPLE_SIZE = 10000
+
+SAMPLE_OK = 'ok'
+SAMPLE_STALE = 'stale'
+SAMPLE_MISSING = 'missing'
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: sorted list of values, not empty
+    :param fraction: between 0 and 1
+    :return: the nearest rank percentile
+    """
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class TimingSample:
+
+    """
+    This class keeps the count, sum and maximum of a duration, and a random sample of its values for the percentiles,
+    as ScanScheduler does, so memory stays flat in long experiments
+    """
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+        if len(self.samples) < self.sample_size:
+            self.samples.append(value)
+        else:
+            index = random.randint(0, self.count - 1)
+            if index < self.sample_size:
+                self.samples[index] = value
+
+    def get_summary(self):
+        """
+        :return: dictionary with the mean, median, 99th percentile and maximum of the durations
+        """
+        if self.count == 0:
+            return {'count': 0}
+        sorted_values = sorted(self.samples)
+        return {'count': self.count,
+                'mean': self.sum / self.count,
+                'p50': percentile(sorted_values, 0.5),
+                'p99': percentile(sorted_values, 0.99),
+                'max': self.max}
+
+
+class PolledPLC:
+
+    """
+    This class holds the last sample received from a PLC and the statistics of its reads
+    """
+    def __init__(self, name, tags, address):
+        self.name = name
+        self.tags = tags
+        self.address = address
+
+        self.values = None
+        self.sample_time = None
+
+        # Incremented by every successful read, so a poll knows whether the sample is new
+        self.sample_count = 0
+        self.polled_count = 0
+
+        self.latency = TimingSample()
+        self.failed_reads = 0
+        self.stale_samples = 0
+        self.missing_samples = 0
+
+
+class ScadaPoller:
+
+    """
+    This class polls a list of PLCs concurrently for the SCADA
+    """
+    def __init__(self, receive_multiple, clock, deadline=DEFAULT_POLL_DEADLINE):
+        """
+        :param receive_multiple: function reading a list of tags from an address, BasePLC.receive_multiple
+        :param clock: Clock giving the timestamps of the samples
+        :param deadline: seconds a poll waits for the PLCs
+        """
+        self.receive_multiple = receive_multiple
+        self.clock = clock
+        self.deadline = float(deadline)
+
+        self.plcs = []
+        self.readers = []
+        self.lock = threading.Lock()
+
+        self.last_poll_start = None
+        self.poll_period = TimingSample()
+
+    def add_plc(self, name, tags, address):
+        plc = PolledPLC(name, tags, address)
+        self.plcs.append(plc)
+        self.readers.append(PeerReader(name, lambda: self.read(plc)))
+
+    def read(self, plc):
+        start = time.time()
+        try:
+            values = self.receive_multiple(plc.tags, plc.address)
+        except Exception:
+            with self.lock:
+                plc.failed_reads += 1
+            raise
+
+        with self.lock:
+            plc.values = values
+            plc.sample_time = self.clock.now()
+            plc.sample_count += 1
+            plc.latency.add(time.time() - start)
+
+    def get_columns(self):
+        """
+        :return: the names of the columns added by sample() to a SCADA row
+        """
+        columns = []
+        for plc in self.plcs:
+            columns.extend([plc.name + "_timestamp", plc.name + "_status"])
+        return columns
+
+    def poll(self):
+        """
+        Reads the PLCs until the deadline
+        :return: list with one (values, sample time, status) tuple per PLC, in the order they were added. The values
+        of a missing sample are None
+        """
+        start = time.time()
+        if self.last_poll_start is not None:
+            self.poll_period.add(start - self.last_poll_start)
+        self.last_poll_start = start
+
+        for reader in self.readers:
+            reader.request()
+
+        deadline = start + self.deadline
+        for reader in self.readers:
+            reader.wait(max(0.0, deadline - time.time()))
+
+        samples = []
+        with self.lock:
+            for plc in self.plcs:
+                if plc.values is None:
+                    status = SAMPLE_MISSING
+                    plc.missing_samples += 1
+                    values = [None] * len(plc.tags)
+                elif plc.sample_count > plc.polled_count:
+                    status = SAMPLE_OK
+                    values = plc.values
+                else:
+                    status = SAMPLE_STALE
+                    plc.stale_samples += 1
+                    values = plc.values
+                plc.polled_count = plc.sample_count
+                samples.append((values, plc.sample_time, status))
+        return samples
+
+    def summary(self):
+        """
+        :return: dictionary with the achieved poll period and the response latency of every PLC
+        """
+        result = {'poll_deadline': self.deadline,
+                  'poll_period': self.poll_period.get_summary(),
+                  'plcs': {}}
+        with self.lock:
+            for plc in self.plcs:
+                result['plcs'][plc.name] = {'latency': plc.latency.get_summary(),
+                                            'failed_reads': plc.failed_reads,
+                                            'stale_samples': plc.stale_samples,
+                                            'missing_samples': plc.missing_samples}
+        return result
+
+    def write_summary(self, path):
+        with open(path, 'w') as f:
+            yaml.dump(self.summary(), f, default_flow_style=False)
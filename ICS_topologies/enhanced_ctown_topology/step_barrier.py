@@ -0,0 +1,286 @@
+import os
+import select
+import socket
+import time
+from virtual_clock import Clock
+
+"""
+Synchronization between the physical process and the PLCs. The physical process runs a StepServer on a local unix
+socket; after writing the sensor values of a hydraulic step it publishes the step to every registered PLC and blocks
+until all of them acknowledge it. Each PLC runs a StepClient that blocks until the next step is published, runs its
+control logic and acknowledges the step. Mininet hosts share the file system, so the socket is reachable from every
+node. Steps carry the simulation time, which drives the virtual clock of the PLCs
+"""
+
+# Path of the unix socket, relative to the topology folder where every process runs
+SOCKET_PATH = 'step_barrier.sock'
+
+# Seconds the physical process waits for the PLCs to register before the first step
+REGISTER_TIMEOUT = 60.0
+
+# Seconds the physical process waits for the acknowledgements of a step before continuing without them
+ACK_TIMEOUT = 10.0
+
+
+class LineConnection:
+
+    """
+    Newline delimited text messages over a stream socket
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def send_line(self, line):
+        self.sock.sendall((line + '\n').encode())
+
+    def read_line(self, timeout=None):
+        """
+        :param timeout: seconds to wait for a full line, forever if None
+        :return: the line without the newline, or None if the timeout expired. Raises EOFError if the peer closed
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while b'\n' not in self.buffer:
+            remaining = None
+            if timeout is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+
+            if not select.select([self.sock], [], [], remaining)[0]:
+                return None
+
+            data = self.sock.recv(4096)
+            if not data:
+                raise EOFError('Connection closed')
+            self.buffer += data
+
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode()
+
+    def close(self):
+        self.sock.close()
+
+
+class StepServer:
+
+    """
+    This class is the barrier run by the physical process. PLCs register with "HELLO <name>" and get the clock mode as
+    "CLOCK <real|virtual>". Steps are published as "STEP <n> <simulation seconds>", acknowledged with "ACK <n>", and
+    "END" is sent when the simulation finishes. A PLC that disconnects is removed from the barrier.
+    Observers such as the SCADA register with "WATCH <name>"; they only join the barrier with the virtual clock, where
+    nothing else paces them
+    """
+    def __init__(self, plc_names, path=SOCKET_PATH, ack_timeout=None, virtual=False):
+        self.plc_names = [name.lower() for name in plc_names]
+        self.path = path
+        self.virtual = virtual
+        if ack_timeout is None:
+            ack_timeout = ACK_TIMEOUT
+        self.ack_timeout = float(ack_timeout)
+
+        # One LineConnection per registered PLC
+        self.clients = {}
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(max(len(self.plc_names), 1))
+
+    def accept_registrations(self, deadline):
+        """
+        Accepts the pending registrations, and waits for the expected PLCs that did not register yet until the deadline
+        :param deadline: time.time() value until which to wait
+        """
+        while True:
+            remaining = 0
+            if self.get_missing():
+                remaining = max(deadline - time.time(), 0)
+            if not select.select([self.server], [], [], remaining)[0]:
+                break
+
+            sock, _ = self.server.accept()
+            connection = LineConnection(sock)
+            try:
+                message = connection.read_line(max(deadline - time.time(), 0.1))
+            except EOFError:
+                message = None
+
+            if not message or message.split(' ')[0] not in ['HELLO', 'WATCH']:
+                connection.close()
+                continue
+
+            try:
+                if self.virtual:
+                    connection.send_line('CLOCK virtual')
+                else:
+                    connection.send_line('CLOCK real')
+            except socket.error:
+                connection.close()
+                continue
+
+            if message.startswith('WATCH ') and not self.virtual:
+                connection.close()
+            else:
+                self.clients[message.split(' ', 1)[1].lower()] = connection
+
+    def wait_for_plcs(self, timeout=REGISTER_TIMEOUT):
+        """
+        Waits until every expected PLC registered. A PLC that does not register is not running, and the simulation
+        would run without its control logic
+        :param timeout: seconds to wait
+        :return: sorted list with the names of the registered PLCs
+        :raise RuntimeError: if an expected PLC did not register before the timeout
+        """
+        self.accept_registrations(time.time() + timeout)
+
+        missing = self.get_missing()
+        if missing:
+            raise RuntimeError("PLCs not registered in the step barrier after " + str(timeout) + " s: " +
+                               ', '.join(missing))
+        return sorted(self.clients.keys())
+
+    def get_missing(self):
+        return [name for name in self.plc_names if name not in self.clients]
+
+    def remove(self, name):
+        print("Warning: " + name + " left the step barrier")
+        self.clients.pop(name).close()
+
+    def publish(self, step, sim_time):
+        """
+        Notifies every registered PLC that the sensor values of a step are available
+        :param step: iteration number of the physical process
+        :param sim_time: simulation time of the step in seconds
+        """
+        self.accept_registrations(time.time())
+
+        for name in list(self.clients.keys()):
+            try:
+                self.clients[name].send_line('STEP ' + str(step) + ' ' + str(sim_time))
+            except socket.error:
+                self.remove(name)
+
+    def wait_for_acks(self, step):
+        """
+        Blocks until every registered PLC acknowledged a step, or ack_timeout expires
+        :param step: iteration number of the physical process
+        :return: list with the names of the PLCs that did not acknowledge the step
+        """
+        deadline = time.time() + self.ack_timeout
+        expected = 'ACK ' + str(step)
+        late = []
+
+        for name in list(self.clients.keys()):
+            try:
+                message = self.clients[name].read_line(max(deadline - time.time(), 0))
+                # Acknowledgements of steps that timed out before are discarded
+                while message is not None and message != expected:
+                    message = self.clients[name].read_line(max(deadline - time.time(), 0))
+            except (EOFError, socket.error):
+                self.remove(name)
+                continue
+
+            if message is None:
+                late.append(name)
+
+        if late:
+            print("Warning: step " + str(step) + " not acknowledged by " + ', '.join(late))
+        return late
+
+    def close(self):
+        for name in list(self.clients.keys()):
+            try:
+                self.clients[name].send_line('END')
+            except socket.error:
+                pass
+            self.clients.pop(name).close()
+
+        self.server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StepClient:
+
+    """
+    This class is the side of the barrier run by a PLC. Until the physical process starts its StepServer, and after
+    the simulation ends, there is no barrier: wait_step() returns None and the PLC keeps its free running scan.
+    The clock follows the mode and the simulation time sent by the physical process
+    """
+    def __init__(self, name, path=SOCKET_PATH, clock=None, watch=False):
+        self.name = name
+        self.path = path
+        self.watch = watch
+        self.connection = None
+        self.finished = False
+
+        if clock is None:
+            clock = Clock()
+        self.clock = clock
+
+    def connect(self):
+        if not os.path.exists(self.path):
+            return False
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            sock.close()
+            return False
+
+        self.connection = LineConnection(sock)
+        if self.watch:
+            self.connection.send_line('WATCH ' + self.name)
+        else:
+            self.connection.send_line('HELLO ' + self.name)
+        return True
+
+    def disconnect(self):
+        self.connection.close()
+        self.connection = None
+        self.finished = True
+
+        # Without the physical process the scan goes back to real time pacing
+        self.clock.virtual = False
+
+    def wait_step(self):
+        """
+        Blocks until the physical process publishes the next step
+        :return: the step number, or None if there is no barrier to wait on
+        """
+        if self.finished or (self.connection is None and not self.connect()):
+            return None
+
+        while True:
+            try:
+                message = self.connection.read_line()
+            except (EOFError, socket.error):
+                message = None
+
+            if message is not None and message.startswith('CLOCK '):
+                self.clock.virtual = message == 'CLOCK virtual'
+                continue
+
+            if message is None or not message.startswith('STEP '):
+                self.disconnect()
+                return None
+
+            fields = message.split(' ')
+            self.clock.advance(fields[2])
+            return int(fields[1])
+
+    def ack(self, step):
+        """
+        :param step: step returned by wait_step(), nothing is sent if it is None
+        """
+        if step is None or self.connection is None:
+            return
+        try:
+            self.connection.send_line('ACK ' + str(step))
+        except socket.error:
+            self.disconnect()
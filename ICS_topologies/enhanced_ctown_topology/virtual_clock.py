@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timedelta
+
+"""
+Experiment clock. With the real clock, timestamps come from datetime.now() and scan loops sleep as usual. With the
+virtual clock, time is the simulation time of the last hydraulic step published by the physical process, sleeps
+return immediately and every component advances as fast as the step barrier allows
+"""
+
+# Supported values of the clock option of the experiment YAML
+CLOCK_MODES = ['real', 'virtual']
+
+# Virtual timestamps count the simulation time from this date, so they line up with the Timestamps of the ground truth
+EPOCH = datetime(1970, 1, 1)
+
+
+def is_virtual(config_options):
+    """
+    :param config_options: options of the experiment YAML file
+    :return: True if the experiment runs with the virtual clock, the real clock is the default
+    """
+    mode = config_options.get('clock', 'real')
+    if mode not in CLOCK_MODES:
+        raise ValueError('Invalid clock ' + str(mode) + ', supported clocks are ' + ', '.join(CLOCK_MODES))
+    return mode == 'virtual'
+
+
+class Clock:
+
+    """
+    This class is consulted by the plant, the PLCs and the SCADA instead of datetime.now() and time.sleep()
+    """
+    def __init__(self, virtual=False):
+        self.virtual = virtual
+
+        # Simulation seconds reached by the physical process
+        self.sim_time = 0.0
+        self.wall_start = time.time()
+
+    def advance(self, sim_time):
+        self.sim_time = float(sim_time)
+
+    def now(self):
+        if self.virtual:
+            return EPOCH + timedelta(seconds=self.sim_time)
+        return datetime.now()
+
+    def sleep(self, seconds):
+        if not self.virtual:
+            time.sleep(seconds)
+
+    def real_time_factor(self):
+        """
+        :return: simulated seconds per wall clock second since the clock was created
+        """
+        elapsed = time.time() - self.wall_start
+        if elapsed <= 0:
+            return 0.0
+        return self.sim_time / elapsed
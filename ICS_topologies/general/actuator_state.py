@@ -0,0 +1,62 @@
+import wntr.network.controls as controls
+
+
+class ActuatorState:
+
+    """
+    This class holds the status of the pumps and valves applied to the WNTR model. Each actuator is driven by a WNTR
+    Control with an always true condition. When the PLCs write a new status vector into the database, only the
+    actuators whose status changed get their Control rebuilt; the rest of the model is left untouched
+    """
+    def __init__(self, wn, actuator_names, condition):
+        self.wn = wn
+        self.condition = condition
+        self.actuators = {}
+        self.status = {}
+
+        # Number of actuator changes applied to the model in the last update
+        self.changes = 0
+
+        for name in actuator_names:
+            self.actuators[name] = self.wn.get_link(name)
+            self.status[name] = self.get_link_status(name)
+            self.add_control(name, self.status[name])
+
+    def get_names(self):
+        return list(self.status.keys())
+
+    def get_link_status(self, name):
+        """
+        WNTR links can store the status as an int or as a LinkStatus enum
+        :param name: name of the pump or valve
+        :return: the status of the link as an int
+        """
+        if type(self.actuators[name].status) is int:
+            return self.actuators[name].status
+        else:
+            return self.actuators[name].status.value
+
+    def add_control(self, name, value):
+        an_action = controls.ControlAction(self.actuators[name], 'status', value)
+        a_control = controls.Control(self.condition, an_action, name=name)
+        self.wn.add_control(name, a_control)
+
+    def update(self, new_status):
+        """
+        Compares the status vector written by the PLCs with the one currently applied, and rebuilds the Control of the
+        actuators that changed
+        :param new_status: dictionary with the actuator name as key and the status read from the database as value
+        :return: the number of actuators that changed their status
+        """
+        self.changes = 0
+        for name in self.status:
+            value = int(new_status[name])
+            if value == self.status[name]:
+                continue
+
+            self.wn.remove_control(name)
+            self.add_control(name, value)
+            self.status[name] = value
+            self.changes += 1
+
+        return self.changes
@@ -1,6 +1,7 @@
 import subprocess
 import signal
 import sys
+from supervisor import Supervisor
 from os.path import expanduser
 
 class SimulationControl():
@@ -16,10 +17,9 @@ class SimulationControl():
         """
         signal.signal(signal.SIGINT, self.interrupt)
         signal.signal(signal.SIGTERM, self.interrupt)
-        self.simulation = self.start_simulation()
-
-        while self.simulation.poll() is None:
-            pass
+        self.supervisor = Supervisor()
+        self.simulation = self.supervisor.add('simulation', self.start_simulation())
+        self.supervisor.wait(self.simulation)
 
     def interrupt(self, sig, frame):
         """
@@ -32,12 +32,9 @@ class SimulationControl():
         """
         All the subprocesses launched in this Digital Twin follow the same pattern to ensure that they finish before continuing with the finishing of the parent process
         """
-        self.simulation.send_signal(signal.SIGINT)
-        self.simulation.wait()
-        if self.simulation.poll() is None:
-            self.simulation.terminate()
-        if self.simulation.poll() is None:
-            self.simulation.kill()
+        self.supervisor.stop([self.simulation])
+        for line in self.supervisor.report():
+            print line
 
     def start_simulation(self):
         """
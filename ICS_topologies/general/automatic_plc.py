@@ -3,6 +3,7 @@ import time
 import sys
 import argparse
 import signal
+from supervisor import Supervisor
 
 class NodeControl():
 
@@ -24,12 +25,9 @@ class NodeControl():
         self.process_tcp_dump.kill()
 
         print "Stopping PLC..."
-        self.plc_process.send_signal(signal.SIGINT)
-        self.plc_process.wait()
-        if self.plc_process.poll() is None:
-            self.plc_process.terminate()
-        if self.plc_process.poll() is None:
-            self.plc_process.kill()
+        self.supervisor.stop([self.plc_process])
+        for line in self.supervisor.report():
+            print line
 
     def main(self):
         """
@@ -47,11 +45,11 @@ class NodeControl():
         #self.configure_routing() # In enhanced ctown topology, this is handled by automatic_run.py
         self.delete_log()
 
-        self.process_tcp_dump = self.start_tcpdump_capture()
-        self.plc_process = self.start_plc()
+        self.supervisor = Supervisor()
+        self.process_tcp_dump = self.supervisor.add('tcpdump', self.start_tcpdump_capture())
+        self.plc_process = self.supervisor.add(self.name, self.start_plc())
 
-        while self.plc_process.poll() is None:
-            pass
+        self.supervisor.wait(self.plc_process)
 
         self.terminate()
 
@@ -72,6 +70,11 @@ class NodeControl():
         else:
             self.dict_path = 'plc_dicts.yaml'
 
+        if arg_parser.config:
+            self.config_path = arg_parser.config
+        else:
+            self.config_path = 'c_town_config.yaml'
+
     def delete_log(self):
         """
         We delete the log of previous experiments
@@ -85,7 +88,8 @@ class NodeControl():
         return tcp_dump
 
     def start_plc(self):
-        plc_process = subprocess.Popen(['python', self.name + '.py'], shell=False)
+        plc_process = subprocess.Popen(['python', self.name + '.py', '-d', self.dict_path, '-c', self.config_path],
+                                       shell=False)
         return plc_process
 
     def get_arguments(self):
@@ -93,6 +97,7 @@ class NodeControl():
         parser.add_argument("--name", "-n", help="Name of the Mininet node and script to run")
         parser.add_argument("--week", "-w", help="Week index of the simulation")
         parser.add_argument("--dict", "-d", help="Dictionary of the PLCs logic")
+        parser.add_argument("--config", "-c", help="Path of the experiment config file")
         return parser.parse_args()
 
 if __name__=="__main__":
@@ -1,5 +1,9 @@
 from minicps.devices import PLC
-import csv
+import state_db
+import enip_session
+import exception_publisher
+import output_writer
+import subscription
 import signal
 import sys
 
@@ -11,27 +15,121 @@ import time
 
 class BasePLC(PLC):
 
+    # A hosted PLC runs in a thread of plc_host.py, which handles the signals and shuts the PLC down
+    hosted = False
+
+    # Experiment clock of the PLC, set by the subclasses that follow the hydraulic steps
+    clock = None
+
+    def get_session_pool(self):
+        """
+        :return: the pool of persistent ENIP sessions of this PLC. Each PLC has its own, as hosted PLCs of the same
+        process connect from different network namespaces
+        """
+        if getattr(self, 'session_pool', None) is None:
+            self.session_pool = enip_session.EnipSessionPool()
+        return self.session_pool
+
+    def get(self, what):
+        """
+        Reads a tag from the state database using the long-lived connection of this process, instead of opening a
+        new sqlite connection for every read as MiniCPS does
+        :param what: tuple identifying the tag
+        :return: the stored value
+        """
+        if type(what) is not tuple:
+            raise TypeError('Parameter must be a tuple.')
+        return state_db.get_state(self.state).get(what)
+
+    def set(self, what, value):
+        """
+        Writes a tag into the state database using the long-lived connection of this process
+        :param what: tuple identifying the tag
+        :param value: value to store
+        :return: the stored value
+        """
+        if type(what) is not tuple:
+            raise TypeError('Parameter must be a tuple.')
+        return state_db.get_state(self.state).set(what, value)
+
+    def receive(self, what, address, **kwargs):
+        """
+        Reads a tag from another PLC through the persistent ENIP session with it, instead of a new cpppo client process
+        :param what: tuple identifying the tag
+        :param address: IP address of the PLC
+        :return: the value as a string
+        """
+        if type(what) is not tuple:
+            raise TypeError('Parameter must be a tuple.')
+        return self.get_session_pool().receive_multiple([what], address)[0]
+
+    def receive_multiple(self, what, address):
+        """
+        :param what: list of tuples identifying the tags
+        :param address: IP address of the PLC
+        :return: list with the values as strings
+        """
+        return self.get_session_pool().receive_multiple(what, address)
+
+    def send_multiple(self, what, values, address):
+        self.get_session_pool().send_multiple(what, values, address)
+
+    def get_publish_time(self):
+        """
+        :return: seconds used by the report by exception heartbeat, the simulation time with the virtual clock
+        """
+        if self.clock is not None and self.clock.virtual:
+            return self.clock.sim_time
+        return time.time()
+
+    def publish_system_state(self):
+        """
+        Sends the values of the tags to the ENIP server of the PLC, read from the database with a single query. With
+        report by exception, only the tags selected by self.deadband_filter are sent. The changes are also pushed to the
+        subscribers of the PLC, if any. It is called by the sender thread every cycle, and by the PLC before it
+        acknowledges a hydraulic step, so the peers and the SCADA read the values of that step
+        """
+        names = [tag[0] for tag in self.tags]
+        with self.publish_lock:
+            with self.lock:
+                # noinspection PyBroadException
+                try:
+                    stored = state_db.get_state(self.state).get_multiple(names)
+                except Exception:
+                    print "Exception trying to get the tags"
+                    return
+            values = [stored[name] for name in names]
+
+            if self.subscription_server is not None:
+                self.subscription_server.publish(names, values, time.time())
+
+            now = self.get_publish_time()
+            if self.deadband_filter is None:
+                indexes = range(len(self.tags))
+            else:
+                indexes = self.deadband_filter.select(names, values, now)
+
+            # A failed send is retried on the next cycle, the session reconnects with backoff
+            if indexes:
+                try:
+                    self.send_multiple([self.tags[index] for index in indexes], [values[index] for index in indexes],
+                                       self.send_adddress)
+                    if self.deadband_filter is not None:
+                        self.deadband_filter.mark_sent(names, values, indexes, now)
+                except Exception as e:
+                    print "Exception sending the system state: " + str(e)
+
     def send_system_state(self):
         """
-        This method sends the values to the SCADA server or any other client requesting the values
+        This method sends the values to the SCADA server or any other client requesting the values, every 50 ms
         :return:
         """
         while self.reader:
-            values = []
-            for tag in self.tags:
-                with self.lock:
-                    # noinspection PyBroadException
-                    try:
-                        values.append(self.get(tag))
-                    except Exception:
-                        print "Exception trying to get the tag"
-                        time.sleep(0.05)
-                        continue
-                    values.append(self.get(tag))
-            self.send_multiple(self.tags, values, self.send_adddress)
+            self.publish_system_state()
             time.sleep(0.05)
 
-    def set_parameters(self, path, result_list, tags, values, reader, lock, send_address, lastPLC=False, week_index=0, isScada=False):
+    def set_parameters(self, path, result_list, tags, values, reader, lock, send_address, lastPLC=False, week_index=0, isScada=False, output_format='csv',
+                       publish_options=None, subscription_enabled=False, actuator_columns=None):
 
         self.result_list = result_list
         self.path = path
@@ -43,27 +141,69 @@ class BasePLC(PLC):
         self.lastPLC = lastPLC
         self.week_index = week_index
         self.isScada = isScada
+        self.output_format = output_format
+
+        # Serializes the publications of the sender thread and the ones made before acknowledging a step
+        self.publish_lock = threading.Lock()
+
+        # Columns of result_list holding the status of an actuator, stored as int8 in the columnar formats
+        self.actuator_columns = actuator_columns
+
+        # Report by exception, configured per PLC in the experiment YAML. Every tag is sent every cycle without it
+        if publish_options:
+            self.deadband_filter = exception_publisher.DeadbandFilter([tag[0] for tag in tags], publish_options)
+        else:
+            self.deadband_filter = None
+
+        # With SCADA subscriptions, the PLC pushes the changes of its tags to the SCADA instead of being polled
+        self.subscription_enabled = subscription_enabled
+        self.subscription_server = None
 
     def write_output(self):
-        with open('output/' + self.path, 'w') as f:
-            writer = csv.writer(f)
-            writer.writerows(self.result_list)
+        """
+        Writes the received values in the configured output format. Columnar formats store them as float32, the size of
+        the ENIP REAL tags the values travel in
+        """
+        path = output_writer.get_output_path('output/' + self.path, self.output_format)
+        output_writer.write_table(path, self.result_list[0], self.result_list[1:], self.output_format, 'float32',
+                                  self.actuator_columns)
 
     def sigint_handler(self, sig, frame):
+        self.shutdown()
+        sys.exit(0)
+
+    def shutdown(self):
+        """
+        Stops the sender thread, reports the ENIP traffic and writes the outputs
+        """
         print 'DEBUG plc shutdown'
         self.reader = False
+        for line in self.get_session_pool().report():
+            print line
+        if self.deadband_filter is not None:
+            print "Report by exception: %d tag values sent, %d skipped" % (self.deadband_filter.sent,
+                                                                         self.deadband_filter.skipped)
+        if self.subscription_server is not None:
+            for line in self.subscription_server.report():
+                print line
+            self.subscription_server.close()
+        self.get_session_pool().close()
         self.write_output()
         if self.lastPLC:
             self.move_files()
-        sys.exit(0)
 
     def move_files(self):
         cmd = shlex.split("./copy_output.sh " + str(self.week_index))
         subprocess.call(cmd)
 
     def startup(self):
-        signal.signal(signal.SIGINT, self.sigint_handler)
-        signal.signal(signal.SIGTERM, self.sigint_handler)
+        # Signal handlers can only be set by the main thread
+        if not self.hosted:
+            signal.signal(signal.SIGINT, self.sigint_handler)
+            signal.signal(signal.SIGTERM, self.sigint_handler)
 
         if not self.isScada:
+            # Created here, hosted PLCs are already in the network namespace of their node
+            if self.subscription_enabled:
+                self.subscription_server = subscription.SubscriptionServer([tag[0] for tag in self.tags])
             threading.Thread(target=self.send_system_state).start()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import threading
+import time
+
+"""
+Client side ENIP sessions kept open between requests. MiniCPS runs a cpppo client process for every request, which
+opens a TCP connection, registers an ENIP session and closes it again; with the delays of the complex topology that
+handshake dominates the scan. An EnipSession keeps one registered session per peer, and reconnects with exponential
+backoff when a request fails. cpppo is imported when the first session connects
+"""
+
+ENIP_PORT = 44818
+
+# Seconds a request waits for the reply of the peer
+REQUEST_TIMEOUT = 5.0
+
+# Seconds a failed peer is not contacted, doubled after every consecutive failure up to MAX_BACKOFF
+INITIAL_BACKOFF = 0.1
+MAX_BACKOFF = 5.0
+
+
+def tag_to_cpppo(what, value=None):
+    """
+    Builds the cpppo tag string of a request, as MiniCPS does: SENSOR1:1 to read, ACTUATOR1:1=1 to write
+    :param what: tuple identifying the tag
+    :param value: value to write, None to read
+    :return: the cpppo tag string
+    """
+    tag_string = ':'.join(str(field) for field in what)
+    if value is not None:
+        tag_string += '=' + str(value)
+    return tag_string
+
+
+class EnipSession:
+
+    """
+    This class is a registered ENIP session with one peer. Requests are serialized, as a session carries one
+    request at a time
+    """
+    def __init__(self, address, timeout=REQUEST_TIMEOUT):
+        if ':' in address:
+            self.host, port = address.split(':')
+            self.port = int(port)
+        else:
+            self.host = address
+            self.port = ENIP_PORT
+        self.address = address
+        self.timeout = timeout
+
+        self.connection = None
+        self.lock = threading.Lock()
+
+        # Reconnection state
+        self.backoff = INITIAL_BACKOFF
+        self.next_attempt = 0.0
+        self.reconnections = 0
+
+        # Round trip time of the requests, in seconds
+        self.last_rtt = 0.0
+        self.total_rtt = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def connect(self):
+        from cpppo.server.enip import client
+
+        if time.time() < self.next_attempt:
+            raise IOError('ENIP peer ' + self.address + ' is in backoff after a failure')
+
+        self.connection = client.connector(host=self.host, port=self.port, timeout=self.timeout)
+        self.reconnections += 1
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def request(self, tag_strings):
+        """
+        Sends the read or write operations in a single request
+        :param tag_strings: list of cpppo tag strings
+        :return: list with the values read, as strings like the MiniCPS client returns them, or True for the writes
+        """
+        from cpppo.server.enip import client
+
+        with self.lock:
+            try:
+                if self.connection is None:
+                    self.connect()
+
+                start = time.time()
+                operations = client.parse_operations(tag_strings)
+                values = []
+                for _, _, _, _, _, value in self.connection.pipeline(operations=operations, depth=1,
+                                                                     timeout=self.timeout):
+                    if value is None:
+                        raise IOError('ENIP request to ' + self.address + ' failed')
+                    if value is True:
+                        values.append(value)
+                    else:
+                        values.append(str(value[0]))
+                self.record_rtt(time.time() - start)
+
+            except Exception:
+                self.failures += 1
+                self.close()
+                if time.time() >= self.next_attempt:
+                    self.next_attempt = time.time() + self.backoff
+                    self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+                raise
+
+            self.backoff = INITIAL_BACKOFF
+            return values
+
+    def record_rtt(self, rtt):
+        self.last_rtt = rtt
+        self.total_rtt += rtt
+        self.requests += 1
+
+    def get_mean_rtt(self):
+        if self.requests == 0:
+            return 0.0
+        return self.total_rtt / self.requests
+
+
+class EnipSessionPool:
+
+    """
+    This class holds the EnipSession of every peer a PLC talks to, created on the first request to the peer
+    """
+    def __init__(self, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, address):
+        with self.lock:
+            if address not in self.sessions:
+                self.sessions[address] = EnipSession(address, self.timeout)
+            return self.sessions[address]
+
+    def receive_multiple(self, what_list, address):
+        return self.get_session(address).request([tag_to_cpppo(what) for what in what_list])
+
+    def send_multiple(self, what_list, values, address):
+        tag_strings = [tag_to_cpppo(what, value) for what, value in zip(what_list, values)]
+        self.get_session(address).request(tag_strings)
+
+    def report(self):
+        """
+        :return: one line per peer with the number of requests, their round trip times and the reconnections
+        """
+        lines = []
+        for address in sorted(self.sessions.keys()):
+            session = self.sessions[address]
+            lines.append("ENIP peer %s: %d requests, mean RTT %.4f s, last RTT %.4f s, %d failures, %d connections" %
+                         (address, session.requests, session.get_mean_rtt(), session.last_rtt, session.failures,
+                          session.reconnections))
+        return lines
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
@@ -0,0 +1,85 @@
+"""
+Report by exception for the values a PLC publishes. Without it, BasePLC.publish_system_state sends every tag on every
+cycle, although the physical process only changes them once per hydraulic step. With it, a tag is sent when its value
+moved further than its deadband from the last value sent, or when it was not sent for heartbeat seconds. It is
+configured per PLC in the publish_by_exception option of the experiment YAML
+"""
+
+# Seconds after which a tag is sent even if its value did not change
+DEFAULT_HEARTBEAT = 5.0
+
+
+def get_publish_options(config_options, plc_name):
+    """
+    :param config_options: options of the experiment YAML file
+    :param plc_name: name of the PLC
+    :return: the report by exception options of the PLC, None if it publishes every cycle
+    """
+    publish_options = config_options.get('publish_by_exception')
+    if not publish_options:
+        return None
+    return publish_options.get(plc_name.lower())
+
+
+class DeadbandFilter:
+
+    """
+    This class decides which tags of a PLC need to be sent. A value is sent when it differs from the last value sent
+    by more than both the absolute deadband and the relative deadband times the last value sent
+    """
+    def __init__(self, names, options):
+        default_absolute = float(options.get('absolute_deadband', 0.0))
+        default_relative = float(options.get('relative_deadband', 0.0))
+        self.heartbeat = float(options.get('heartbeat', DEFAULT_HEARTBEAT))
+
+        tag_options = options.get('tags') or {}
+        self.absolute = {}
+        self.relative = {}
+        for name in names:
+            tag = tag_options.get(name) or {}
+            self.absolute[name] = float(tag.get('absolute_deadband', default_absolute))
+            self.relative[name] = float(tag.get('relative_deadband', default_relative))
+
+        # Last value sent and the time it was sent, for each tag
+        self.last_values = {}
+        self.last_sent = {}
+
+        # Number of tags sent and skipped, to report the saved traffic
+        self.sent = 0
+        self.skipped = 0
+
+    def exceeds_deadband(self, name, value):
+        last_value = self.last_values[name]
+        deadband = max(self.absolute[name], self.relative[name] * abs(last_value))
+        return abs(value - last_value) > deadband
+
+    def select(self, names, values, now):
+        """
+        Chooses the tags to send
+        :param names: list with the name of the tags
+        :param values: list with the current value of the tags, in the same order
+        :param now: seconds of the cycle, the simulation time with the virtual clock
+        :return: list with the indexes of the tags to send
+        """
+        selected = []
+        for index, name in enumerate(names):
+            if name in self.last_values and now - self.last_sent[name] < self.heartbeat and \
+                    not self.exceeds_deadband(name, float(values[index])):
+                continue
+            selected.append(index)
+        return selected
+
+    def mark_sent(self, names, values, indexes, now):
+        """
+        Records the tags that were sent. Tags whose send failed are not recorded, so the next cycle selects them again
+        :param names: list with the name of the tags
+        :param values: list with the value of the tags, in the same order
+        :param indexes: indexes of the tags sent, as returned by select()
+        :param now: seconds of the cycle, the simulation time with the virtual clock
+        """
+        for index in indexes:
+            self.last_values[names[index]] = float(values[index])
+            self.last_sent[names[index]] = now
+
+        self.sent += len(indexes)
+        self.skipped += len(names) - len(indexes)
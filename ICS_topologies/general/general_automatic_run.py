@@ -12,6 +12,7 @@ import argparse
 import yaml
 from mininet.link import TCLink
 import subprocess
+from supervisor import Supervisor
 
 automatic = 1
 mitm_attack = 0
@@ -136,6 +137,14 @@ class DHALSIM(MiniCPS):
         self.plc_dict = self.load_plc_dict(self.plc_dict_path)
         self.plc_launch_order = self.get_plc_launch_order()
 
+        # With plc_host, the logic of every PLC runs in a single plc_host.py process instead of one process per PLC
+        self.plc_host = self.load_plc_dict(self.config_file).get('plc_host') == "True"
+        self.plc_host_process = None
+
+        # The generic SCADA polls every PLC listed in the PLC dicts
+        self.scada = self.load_plc_dict(self.config_file).get('scada') == "True"
+        self.scada_process = None
+
         self.setup_network(complex_topo)
 
         self.plc_nodes = []
@@ -147,6 +156,9 @@ class DHALSIM(MiniCPS):
         self.mitm_process = None
         self.iperf_server_process = None
         self.iperf_client_process = None
+        self.simulation = None
+
+        self.supervisor = Supervisor()
 
         if automatic:
             self.automatic_start()
@@ -165,22 +177,25 @@ class DHALSIM(MiniCPS):
         index = 0
         last_plc_flag = 0
 
-        for plc in self.plc_launch_order:
+        if self.plc_host:
+            self.launch_plc_host()
+        else:
+            for plc in self.plc_launch_order:
 
-            if self.last_plc == plc:
-                last_plc_flag = 1
+                if self.last_plc == plc:
+                    last_plc_flag = 1
 
-            self.plc_nodes.append(net.get(str(self.plc_launch_order[index])))
+                self.plc_nodes.append(net.get(str(self.plc_launch_order[index])))
 
-            self.plc_files.append(open("output/" + str(self.plc_launch_order[index]) + ".log", 'r+'))
-            self.plc_processes.append(self.plc_nodes[index].popen
-                                      (sys.executable, "generic_automatic_plc.py", "-c", self.config_file, "-n",
-                                       str(self.plc_launch_order[index]), "-d", self.plc_dict_path, "-l",
-                                       str(last_plc_flag),
-                                       stderr=sys.stdout, stdout=self.plc_files[index]))
-            print("Launched " + str(self.plc_launch_order[index]))
-            index += 1
-            time.sleep(0.2)
+                self.plc_files.append(open("output/" + str(self.plc_launch_order[index]) + ".log", 'r+'))
+                self.plc_processes.append(self.supervisor.add(plc, self.plc_nodes[index].popen
+                                          (sys.executable, "generic_automatic_plc.py", "-c", self.config_file, "-n",
+                                           str(self.plc_launch_order[index]), "-d", self.plc_dict_path, "-l",
+                                           str(last_plc_flag),
+                                           stderr=sys.stdout, stdout=self.plc_files[index])))
+                print("Launched " + str(self.plc_launch_order[index]))
+                index += 1
+                time.sleep(0.2)
 
         # Launch an iperf server in LAN1 (same LAN as PLC1) and a client in LAN3 (same LAN as PLC3)
         if iperf_test == 1:
@@ -191,11 +206,13 @@ class DHALSIM(MiniCPS):
             iperf_client_file = open("output/client.log", "r+")
 
             iperf_server_cmd = shlex.split("python iperf_server.py")
-            self.iperf_server_process = self.iperf_server_node.popen(iperf_server_cmd, stderr=sys.stdout, stdout=iperf_server_file)
+            self.iperf_server_process = self.supervisor.add('iperf server', self.iperf_server_node.popen(
+                iperf_server_cmd, stderr=sys.stdout, stdout=iperf_server_file))
             print "[*] Iperf Server launched"
 
             iperf_client_cmd = shlex.split("python iperf_client.py -c 10.0.2.1 -P 100 -t 2400")
-            self.iperf_client_process = self.iperf_client_node.popen(iperf_client_cmd, stderr=sys.stdout, stdout=iperf_client_file)
+            self.iperf_client_process = self.supervisor.add('iperf client', self.iperf_client_node.popen(
+                iperf_client_cmd, stderr=sys.stdout, stdout=iperf_client_file))
             print "[*] Iperf Client launched"
 
         # Launching automatically mitm attack
@@ -205,73 +222,91 @@ class DHALSIM(MiniCPS):
             #mitm_cmd = shlex.split("../../../attack-experiments/env/bin/python "
             #                       "../../attack_repository/mitm_plc/mitm_attack.py 192.168.1.1 192.168.1.254 exponential_offset")
             #print 'Running MiTM attack with command ' + str(mitm_cmd)
-            #self.mitm_process = attacker.popen(mitm_cmd, stderr=sys.stdout, stdout=attacker_file )
+            #self.mitm_process = self.supervisor.add('mitm', attacker.popen(mitm_cmd, stderr=sys.stdout, stdout=attacker_file))
             print "[] Attacking"
 
-        #print "[] Launching SCADA"
-        #self.scada_node = net.get('scada')
-        #self.scada_file = open("output/scada.log", "r+")
-        #self.scada_process = self.scada_node.popen(sys.executable, "automatic_plc.py", "-n", "scada", stderr=sys.stdout,stdout=self.scada_file)
-        #print "[*] SCADA Successfully launched"
+        if self.scada:
+            print "[] Launching SCADA"
+            self.scada_node = net.get('scada')
+            self.scada_file = open("output/scada.log", "r+")
+            self.scada_process = self.supervisor.add('scada', self.scada_node.popen(
+                sys.executable, "automatic_plc.py", "-n", "scada", "-d", self.plc_dict_path, "-c", self.config_file,
+                stderr=sys.stdout, stdout=self.scada_file))
+            print "[*] SCADA Successfully launched"
 
         physical_output = open("output/physical.log", 'r+')
         print "[*] Launched the PLCs and SCADA process, launching simulation..."
         plant = net.get('plant')
 
         simulation_cmd = shlex.split("python automatic_plant.py " + str(self.config_file))
-        self.simulation = plant.popen(simulation_cmd, stderr=sys.stdout, stdout=physical_output)
+        self.simulation = self.supervisor.add('simulation', plant.popen(simulation_cmd, stderr=sys.stdout,
+                                                                        stdout=physical_output))
         print "[] Simulating..."
 
         print "[] Simulating..."
-        while self.simulation.poll() is None:
-            pass
+        self.supervisor.wait(self.simulation)
         self.finish()
 
+    def launch_plc_host(self):
+        """
+        Launches plc_host.py, which runs every PLC in a thread bound to the network namespace of its Mininet node
+        """
+        plc_pids = []
+        for plc in self.plc_launch_order:
+            plc_pids.append(plc + ':' + str(net.get(plc).pid))
+
+        self.plc_host_file = open("output/plc_host.log", 'w')
+        self.plc_host_process = self.supervisor.add('plc host', subprocess.Popen(
+            [sys.executable, "plc_host.py", "-c", self.config_file, "-d", self.plc_dict_path, "-p", ','.join(plc_pids),
+             "-l", self.last_plc], stderr=sys.stdout, stdout=self.plc_host_file))
+        print "Launched " + ', '.join(self.plc_launch_order) + " in one PLC host process"
+
     def create_log_files(self):
         cmd = shlex.split("bash ./create_log_files.sh")
         subprocess.call(cmd)
 
-    def end_plc_process(self, plc_process):
-
-        plc_process.send_signal(signal.SIGINT)
-        plc_process.wait()
-
-        if plc_process:
-            if plc_process.poll() is None:
-                plc_process.terminate()
-            if plc_process.poll() is None:
-                plc_process.kill()
-
     def finish(self):
         print "[*] Simulation finished"
 
-        #if self.scada_process:
-        #    print "[] Finishing SCADA process"
-        #    self.end_plc_process(self.scada_process)
-        #    print "[*] Finished SCADA process"
+        # The SCADA writes its outputs before the last PLC copies them
+        if self.scada_process:
+            print "[] Finishing SCADA process"
+            self.supervisor.stop([self.scada_process])
+            print "[*] Finished SCADA process"
+
+        if self.plc_host_process:
+            print "[] Terminating the PLC host"
+            self.supervisor.stop([self.plc_host_process])
+            print "[*] PLC host terminated"
+
+        # The last PLC copies the outputs of the others, so the others are stopped first, all of them at once
+        last_processes = []
+        other_processes = []
+        for index, plc in enumerate(self.plc_processes):
+            if self.plc_launch_order[index] == self.last_plc:
+                last_processes.append(plc)
+            else:
+                other_processes.append(plc)
 
-        index = len(self.plc_launch_order) - 1
-        for plc in reversed(self.plc_processes):
-            print "[] Terminating " + str(self.plc_launch_order[index])
-            if plc:
-                self.end_plc_process(plc)
-                print "[*] PLC" + str(self.plc_launch_order[index]) + " terminated"
-            index -= 1
+        print "[] Terminating the PLCs"
+        self.supervisor.stop(other_processes)
+        self.supervisor.stop(last_processes)
+        print "[*] PLCs terminated"
 
         if self.mitm_process:
-            self.end_plc_process(self.mitm_process)
+            self.supervisor.stop([self.mitm_process])
         print "[*] All processes terminated"
 
-        if self.iperf_client_process:
-            self.end_plc_process(self.iperf_client_process)
-            print "Iperf Client process terminated"
-
-        if self.iperf_server_process:
-            self.end_plc_process(self.iperf_server_process)
-            print "Iperf Server process terminated"
+        iperf_processes = [process for process in [self.iperf_client_process, self.iperf_server_process] if process]
+        if iperf_processes:
+            self.supervisor.stop(iperf_processes)
+            print "Iperf processes terminated"
 
         if self.simulation:
-            self.simulation.terminate()
+            self.supervisor.stop([self.simulation], signal.SIGTERM)
+
+        for line in self.supervisor.report():
+            print line
 
         cmd = shlex.split("./kill_cppo.sh")
         subprocess.call(cmd)
@@ -3,7 +3,10 @@ import time
 import sys
 import argparse
 import signal
+from supervisor import Supervisor
 import yaml
+import output_writer
+import numeric_mode
 
 class NodeControl():
 
@@ -26,12 +29,9 @@ class NodeControl():
         self.process_tcp_dump.kill()
 
         print "Stopping PLC..."
-        self.plc_process.send_signal(signal.SIGINT)
-        self.plc_process.wait()
-        if self.plc_process.poll() is None:
-            self.plc_process.terminate()
-        if self.plc_process.poll() is None:
-            self.plc_process.kill()
+        self.supervisor.stop([self.plc_process])
+        for line in self.supervisor.report():
+            print line
 
     def get_plc_dict(self, plc_list):
         for plc in plc_list:
@@ -58,15 +58,17 @@ class NodeControl():
                     self.week_index = config_data['week_index']
                 else:
                     self.week_index = 0
+            self.output_format = output_writer.get_output_format(config_data)
+            self.numeric_mode = numeric_mode.get_numeric_mode(config_data)
 
         self.interface_name = self.name.lower() + '-eth0'
         self.delete_log()
 
-        self.process_tcp_dump = self.start_tcpdump_capture()
-        self.plc_process = self.start_plc()
+        self.supervisor = Supervisor()
+        self.process_tcp_dump = self.supervisor.add('tcpdump', self.start_tcpdump_capture())
+        self.plc_process = self.supervisor.add(self.name, self.start_plc())
 
-        while self.plc_process.poll() is None:
-            pass
+        self.supervisor.wait(self.plc_process)
 
         self.terminate()
 
@@ -83,7 +85,8 @@ class NodeControl():
         return tcp_dump
 
     def start_plc(self):
-        plc_process = subprocess.Popen(['python', 'plc.py', '-n', self.name, '-w', str(self.week_index), '-d', self.dict_path, '-l', self.last], shell=False)
+        plc_process = subprocess.Popen(['python', 'plc.py', '-n', self.name, '-w', str(self.week_index), '-d', self.dict_path, '-l', self.last,
+                                        '-o', self.output_format, '-m', self.numeric_mode, '-c', self.config_path], shell=False)
         return plc_process
 
     def process_arguments(self, arg_parser):
@@ -117,6 +120,6 @@ class NodeControl():
         return parser.parse_args()
 
 
-if __name__ == " __main__":
+if __name__ == "__main__":
     node_control = NodeControl()
     node_control.main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import yaml
+import numeric_mode
+import output_writer
+
+"""
+PLC control logic evaluated inside the physical process. Headless experiments produce the no-attack ground truth
+without Mininet, ENIP or the state database: after every hydraulic step the Controls that epanet_parser.py stored in
+plc_dicts.yaml are applied to the tank levels, with the same semantics as plc.py, and the actuator status they set is
+applied to the model on the next step
+"""
+
+
+class HeadlessPLC:
+
+    """
+    This class holds the sensors, actuators and control rules of one PLC of plc_dicts.yaml, and the values it records
+    """
+    def __init__(self, plc_dict, to_number=float):
+        self.name = plc_dict['PLC'].lower()
+        self.sensors = [sensor for sensor in plc_dict['Sensors'] if sensor != ""]
+        self.actuators = [actuator for actuator in plc_dict['Actuators'] if actuator != ""]
+        self.controls = plc_dict['Controls']
+        self.to_number = to_number
+
+        # Same columns as the received values file of a PLC in a full experiment
+        self.result_list = [["iteration", "timestamp"] + self.sensors + self.actuators]
+
+    def check_condition(self, current_value, operator, limit):
+        """
+        plc.py compares the limits strictly, for both operators
+        :param current_value: the current value of the tank tag
+        :param operator: the operator as stored in the control rules
+        :param limit: the limit that triggers the action
+        :return: True if the condition is met. False otherwise
+        """
+        if operator == '<=':
+            return current_value < self.to_number(limit)
+        elif operator == '>=':
+            return current_value > self.to_number(limit)
+        return False
+
+    def update_actuators(self, values):
+        """
+        Applies the control rules of the PLC, actuator by actuator in the order of plc.py
+        :param values: dictionary with the tag name as key and the current value as value. The actuator status set by
+        the rules is written into it
+        """
+        for actuator in self.actuators:
+            for rule in self.controls:
+                if rule['actuator_tag'].upper() != actuator.upper():
+                    continue
+                if not self.check_condition(values[rule['tank_tag']], rule['operator'], rule['value']):
+                    continue
+                if rule['actuator_value'] == 'Open':
+                    values[rule['actuator_tag']] = 1
+                elif rule['actuator_value'] == 'Closed':
+                    values[rule['actuator_tag']] = 0
+
+    def record(self, values, iteration, timestamp):
+        row = [iteration, timestamp]
+        for tag in self.sensors + self.actuators:
+            row.append(values[tag])
+        self.result_list.append(row)
+
+    def write_output(self, output_format):
+        path = output_writer.get_output_path('output/' + self.name + '_received_values.csv', output_format)
+        output_writer.write_table(path, self.result_list[0], self.result_list[1:], output_format, 'float32',
+                                  self.actuators)
+
+
+class HeadlessPLCs:
+
+    """
+    This class runs every PLC of plc_dicts.yaml in the physical process. All tags share one dictionary, so the
+    dependencies between PLCs are plain lookups
+    """
+    def __init__(self, plc_dict_path, sensor_names, output_format='csv', mode='float'):
+        """
+        :param plc_dict_path: path of plc_dicts.yaml
+        :param sensor_names: names of the tags whose values the physical process passes to scan()
+        """
+        with open(plc_dict_path) as plc_file:
+            plc_dicts = yaml.load(plc_file, Loader=yaml.FullLoader)
+        self.check_tags(plc_dicts, sensor_names)
+
+        # The PLCs of a full experiment read the levels as the strings written into the database
+        self.to_number = numeric_mode.get_converter(mode)
+        self.plcs = [HeadlessPLC(plc_dict, self.to_number) for plc_dict in plc_dicts]
+        self.output_format = output_format
+        self.values = {}
+
+    def check_tags(self, plc_dicts, sensor_names):
+        """
+        A rule can only check a sensor of a PLC, as plc.py only reads its sensors and the sensors of the other PLCs, and
+        every sensor must be passed by the physical process
+        :raise ValueError: if a rule or a sensor cannot be evaluated
+        """
+        sensors = set()
+        for plc_dict in plc_dicts:
+            for sensor in plc_dict['Sensors']:
+                if sensor == "":
+                    continue
+                if sensor not in sensor_names:
+                    raise ValueError("Sensor " + str(sensor) + " of " + plc_dict['PLC'] + " is not a value of the "
+                                     "physical process, headless PLCs can only read " + ', '.join(sensor_names))
+                sensors.add(sensor)
+
+        for plc_dict in plc_dicts:
+            for rule in plc_dict['Controls']:
+                if rule['tank_tag'] not in sensors:
+                    raise ValueError("Control rule of " + plc_dict['PLC'] + " on " + str(rule['actuator_tag']) +
+                                     " checks " + str(rule['tank_tag']) + ", which is not a sensor of any PLC")
+
+    def get_names(self):
+        return [plc.name for plc in self.plcs]
+
+    def scan(self, sensor_values, iteration, timestamp):
+        """
+        Runs one scan of every PLC on the sensor values of a hydraulic step
+        :param sensor_values: list of (name, value) tuples with the values of the sensor names the PLCs were created
+        with
+        :param iteration: iteration number of the physical process
+        :param timestamp: timestamp recorded by the PLCs
+        """
+        for name, value in sensor_values:
+            self.values[name] = self.to_number(str(value))
+
+        for plc in self.plcs:
+            plc.update_actuators(self.values)
+            plc.record(self.values, iteration, timestamp)
+
+    def get_actuator_status(self, actuator_status):
+        """
+        :param actuator_status: dictionary with the status currently applied to each actuator, used for the actuators
+        no rule has set yet
+        :return: dictionary with the actuator name as key and the status set by the PLCs as value
+        """
+        for name in actuator_status:
+            self.values.setdefault(name, actuator_status[name])
+        return dict((name, self.values[name]) for name in actuator_status)
+
+    def write_output(self):
+        for plc in self.plcs:
+            plc.write_output(self.output_format)
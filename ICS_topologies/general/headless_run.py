@@ -0,0 +1,28 @@
+from initialize_experiment import ExperimentInitializer
+import argparse
+
+"""
+Runs a DHALSIM experiment headless: only the physical process, with the PLC control rules evaluated in it. This
+script imports neither Mininet nor MiniCPS, so it needs neither of them nor root
+"""
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Script that runs the physical process of a DHALSIM experiment, with '
+                                                 'the PLC control rules evaluated in it')
+    parser.add_argument("--config", "-c", help="YAML experiment configuration file")
+    parser.add_argument("--week", "-w", help="Week index, only used batch simulation mode")
+    args = parser.parse_args()
+
+    # Global configuration file
+    if args.config:
+        config_file = args.config
+    else:
+        config_file = "c_town_config.yaml"
+
+    print "Initializing headless experiment with config file: " + str(config_file)
+    initializer = ExperimentInitializer(config_file, args.week)
+
+    # this creates plc_dicts.yaml and utils.py
+    initializer.run_parser()
+    initializer.run_headless(config_file)
@@ -0,0 +1,343 @@
+import csv
+import math
+import os
+import struct
+from datetime import datetime, timedelta
+
+"""
+Historian of the SCADA. Instead of keeping every sample in memory until the SCADA is stopped, samples are appended to
+a time series store on disk, one file per tag. A file is a sequence of chunks of up to CHUNK_SIZE samples, encoded in a
+byte aligned variant of the Gorilla encoding: timestamps as the zigzag varint of their delta of deltas, values as the
+XOR with the previous value, stored without its leading and trailing zero bytes. Constant values and a steady poll
+period take one byte per sample each. Every chunk header has the time range of the chunk, so range reads skip the
+chunks outside the range.
+The historian also keeps min/max/mean rollups of every tag over the periods of ROLLUP_PERIODS, updated with every
+sample and appended to rollup_<seconds>.csv when a period ends
+"""
+
+# Samples per tag kept in memory before they are written as a chunk
+CHUNK_SIZE = 256
+
+# Seconds of the rollup periods: 1 minute and 1 hour
+ROLLUP_PERIODS = [60, 3600]
+
+# Timestamps are stored as milliseconds since this date
+EPOCH = datetime(1970, 1, 1)
+
+# Payload length, first timestamp, last timestamp and number of samples of a chunk
+CHUNK_HEADER = struct.Struct('<IqqI')
+
+ROLLUP_HEADER = ['tag', 'period_start', 'min', 'max', 'mean', 'count']
+
+
+def to_milliseconds(timestamp):
+    """
+    :param timestamp: naive datetime, as given by the experiment Clock
+    :return: milliseconds since EPOCH
+    """
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def from_milliseconds(milliseconds):
+    return EPOCH + timedelta(milliseconds=milliseconds)
+
+
+def float_to_bits(value):
+    return struct.unpack('<Q', struct.pack('<d', value))[0]
+
+
+def bits_to_float(bits):
+    return struct.unpack('<d', struct.pack('<Q', bits))[0]
+
+
+def write_varint(out, value):
+    """
+    Appends a non negative integer to a bytearray, 7 bits per byte
+    """
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, position):
+    """
+    :return: the integer at position of data, and the position after it
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def zigzag(value):
+    if value < 0:
+        return (-value << 1) - 1
+    return value << 1
+
+
+def unzigzag(value):
+    if value & 1:
+        return -((value + 1) >> 1)
+    return value >> 1
+
+
+def encode_chunk(timestamps, values):
+    """
+    :param timestamps: list of timestamps in milliseconds, not decreasing
+    :param values: list of float values, in the same order
+    :return: bytearray with the encoded samples
+    """
+    out = bytearray()
+    previous_time = 0
+    previous_delta = 0
+    previous_bits = 0
+    for index in range(len(timestamps)):
+        delta = timestamps[index] - previous_time
+        if index == 0:
+            write_varint(out, zigzag(timestamps[0]))
+        else:
+            write_varint(out, zigzag(delta - previous_delta))
+            previous_delta = delta
+        previous_time = timestamps[index]
+
+        bits = float_to_bits(values[index])
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            out.append(0)
+            continue
+
+        # The header byte of a changed value has its high bit set, the number of leading zero bytes in the next three
+        # bits and the number of trailing zero bytes in the low nibble. An unchanged value is a zero byte
+        xor_bytes = struct.pack('>Q', xor)
+        leading = len(xor_bytes) - len(xor_bytes.lstrip(b'\x00'))
+        trailing = len(xor_bytes) - len(xor_bytes.rstrip(b'\x00'))
+        out.append(0x80 | (leading << 4) | trailing)
+        out.extend(xor_bytes[leading:len(xor_bytes) - trailing])
+    return out
+
+
+def decode_chunk(data, count):
+    """
+    :param data: bytearray written by encode_chunk()
+    :param count: number of samples in data
+    :return: list of timestamps in milliseconds and list of values
+    """
+    timestamps = []
+    values = []
+    position = 0
+    previous_time = 0
+    previous_delta = 0
+    previous_bits = 0
+    for index in range(count):
+        encoded, position = read_varint(data, position)
+        if index == 0:
+            previous_time = unzigzag(encoded)
+        else:
+            previous_delta += unzigzag(encoded)
+            previous_time += previous_delta
+        timestamps.append(previous_time)
+
+        header = data[position]
+        position += 1
+        if header != 0:
+            leading = (header >> 4) & 0x07
+            trailing = header & 0x0f
+            size = 8 - leading - trailing
+            xor_bytes = b'\x00' * leading + bytes(data[position:position + size]) + b'\x00' * trailing
+            position += size
+            previous_bits ^= struct.unpack('>Q', xor_bytes)[0]
+        values.append(bits_to_float(previous_bits))
+    return timestamps, values
+
+
+class Rollup:
+
+    """
+    This class keeps the min, max, sum and count of the samples of a tag in the current period
+    """
+    def __init__(self, start, value):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.sum = value
+        self.count = 1
+
+    def add(self, value):
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+
+    def get_row(self, tag):
+        return [tag, from_milliseconds(self.start), self.min, self.max, self.sum / self.count, self.count]
+
+
+class Historian:
+
+    """
+    This class appends the samples of the SCADA to the store in directory
+    """
+    def __init__(self, directory, chunk_size=CHUNK_SIZE, rollup_periods=ROLLUP_PERIODS):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.rollup_periods = rollup_periods
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Samples not written yet, per tag: list of timestamps and list of values
+        self.pending = {}
+
+        for name in os.listdir(directory):
+            if name.endswith('.ts'):
+                os.remove(os.path.join(directory, name))
+
+        # Current rollup of every tag, per period
+        self.rollups = {}
+        self.rollup_files = {}
+        for period in self.rollup_periods:
+            self.rollups[period] = {}
+            rollup_file = open(get_rollup_path(directory, period), 'w')
+            csv.writer(rollup_file).writerow(ROLLUP_HEADER)
+            self.rollup_files[period] = rollup_file
+
+        self.samples = 0
+        self.bytes_written = 0
+
+    def append(self, tag, timestamp, value):
+        """
+        :param tag: name of the tag
+        :param timestamp: datetime of the sample
+        :param value: value of the sample, samples that are not numbers are ignored
+        """
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        milliseconds = to_milliseconds(timestamp)
+
+        if tag not in self.pending:
+            self.pending[tag] = ([], [])
+        timestamps, values = self.pending[tag]
+        timestamps.append(milliseconds)
+        values.append(value)
+        self.samples += 1
+        if len(timestamps) >= self.chunk_size:
+            self.write_chunk(tag)
+
+        if not math.isnan(value):
+            self.update_rollups(tag, milliseconds, value)
+
+    def update_rollups(self, tag, milliseconds, value):
+        for period in self.rollup_periods:
+            start = milliseconds - milliseconds % (period * 1000)
+            rollup = self.rollups[period].get(tag)
+            if rollup is not None and rollup.start == start:
+                rollup.add(value)
+                continue
+            if rollup is not None:
+                csv.writer(self.rollup_files[period]).writerow(rollup.get_row(tag))
+            self.rollups[period][tag] = Rollup(start, value)
+
+    def write_chunk(self, tag):
+        timestamps, values = self.pending[tag]
+        if not timestamps:
+            return
+        payload = encode_chunk(timestamps, values)
+        with open(get_tag_path(self.directory, tag), 'ab') as f:
+            f.write(CHUNK_HEADER.pack(len(payload), timestamps[0], timestamps[-1], len(timestamps)))
+            f.write(payload)
+        self.bytes_written += CHUNK_HEADER.size + len(payload)
+        self.pending[tag] = ([], [])
+
+    def flush(self):
+        for tag in list(self.pending.keys()):
+            self.write_chunk(tag)
+        for rollup_file in self.rollup_files.values():
+            rollup_file.flush()
+
+    def close(self):
+        """
+        Writes the pending samples and the rollups of the periods in progress
+        """
+        self.flush()
+        for period in self.rollup_periods:
+            writer = csv.writer(self.rollup_files[period])
+            for tag in sorted(self.rollups[period].keys()):
+                writer.writerow(self.rollups[period][tag].get_row(tag))
+            self.rollup_files[period].close()
+        self.rollups = dict((period, {}) for period in self.rollup_periods)
+
+    def report(self):
+        """
+        :return: a line with the number of samples stored and their size on disk
+        """
+        if self.samples == 0:
+            return "Historian: no samples"
+        return "Historian: %d samples in %d bytes, %.2f bytes per sample" % (
+            self.samples, self.bytes_written, float(self.bytes_written) / self.samples)
+
+
+def get_tag_path(directory, tag):
+    return os.path.join(directory, tag + '.ts')
+
+
+def get_rollup_path(directory, period):
+    return os.path.join(directory, 'rollup_' + str(period) + '.csv')
+
+
+def read_range(directory, tag, start=None, end=None):
+    """
+    Reads the samples of a tag between two dates, both included
+    :param directory: directory of the store
+    :param tag: name of the tag
+    :param start: datetime, None to read from the first sample
+    :param end: datetime, None to read until the last sample
+    :return: list of (datetime, value) tuples
+    """
+    start_ms = None if start is None else to_milliseconds(start)
+    end_ms = None if end is None else to_milliseconds(end)
+
+    samples = []
+    path = get_tag_path(directory, tag)
+    if not os.path.exists(path):
+        return samples
+
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                break
+            size, first, last, count = CHUNK_HEADER.unpack(header)
+            if (start_ms is not None and last < start_ms) or (end_ms is not None and first > end_ms):
+                f.seek(size, os.SEEK_CUR)
+                continue
+
+            timestamps, values = decode_chunk(bytearray(f.read(size)), count)
+            for milliseconds, value in zip(timestamps, values):
+                if (start_ms is None or milliseconds >= start_ms) and (end_ms is None or milliseconds <= end_ms):
+                    samples.append((from_milliseconds(milliseconds), value))
+    return samples
+
+
+def read_rollups(directory, period, tag=None):
+    """
+    :param directory: directory of the store
+    :param period: one of the rollup periods, in seconds
+    :param tag: name of the tag, None for every tag
+    :return: list of dictionaries with the columns of ROLLUP_HEADER
+    """
+    rows = []
+    with open(get_rollup_path(directory, period), 'r') as f:
+        for row in csv.DictReader(f):
+            if tag is None or row['tag'] == tag:
+                rows.append(row)
+    return rows
@@ -1,6 +1,7 @@
 from minicps.states import SQLiteState
 from utils import PATH, SCHEMA, SCHEMA_INIT
 from sqlite3 import OperationalError
+from state_db import enable_wal
 
 """
 This script generates the sqlite used to store the system state while the simulation is running
@@ -13,4 +14,7 @@ if __name__ == "__main__":
         SQLiteState._init(PATH, SCHEMA_INIT)
         print "{} successfully created.".format(PATH)
     except OperationalError:
-        print "{} already exists.".format(PATH)
\ No newline at end of file
+        print "{} already exists.".format(PATH)
+
+    # WAL journaling lets the PLCs read the state while the physical process is writing it
+    print "{} journal mode: {}".format(PATH, enable_wal(PATH))
\ No newline at end of file
@@ -1,6 +1,8 @@
 import yaml
 import sys
+import shlex
 import subprocess
+import parse_cache
 from os.path import expanduser
 
 class ExperimentInitializer:
@@ -80,9 +82,36 @@ class ExperimentInitializer:
 
     def run_parser(self):
         """
-        Parse the files to build plc_dicts.yaml and utils.py
+        Parse the files to build plc_dicts.yaml and utils.py. The outputs are cached by the content of the .inp and .cpa
+        files and the parser, so experiments over the same network skip the parser
         :return:
         """
+        cache = None
+        if parse_cache.is_enabled(self.options):
+            cache = parse_cache.ParseCache(self.epanet_file_path, self.cpa_file_path, 'plc_dicts.yaml')
+            if cache.restore():
+                print "Parser outputs restored from " + cache.entry_path
+                return
+
         home_path = expanduser("~")
         wntr_environment_path = home_path + str("/wntr-experiments/bin/python")
-        parse_process = subprocess.call([wntr_environment_path, 'epanet_parser.py', '-i', self.epanet_file_path, '-a', self.cpa_file_path, '-o', 'plc_dicts.yaml'])
\ No newline at end of file
+        parse_process = subprocess.call([wntr_environment_path, 'epanet_parser.py', '-i', self.epanet_file_path, '-a', self.cpa_file_path, '-o', 'plc_dicts.yaml'])
+
+        if cache is not None and parse_process == 0:
+            cache.store()
+
+    def run_headless(self, config_file_path):
+        """
+        Runs the physical process with the PLC control rules evaluated inside it, instead of PLC processes in Mininet.
+        The outputs are written to output/ and copied to week_<week_index>, as in a full experiment
+        :param config_file_path: path of the YAML experiment configuration file
+        """
+        subprocess.call(shlex.split("bash ./create_log_files.sh"))
+
+        home_path = expanduser("~")
+        wntr_environment_path = home_path + str("/wntr-experiments/bin/python")
+        with open("output/physical.log", 'w') as physical_output:
+            subprocess.call([wntr_environment_path, 'physical_process.py', config_file_path, '--headless'],
+                            stderr=sys.stdout, stdout=physical_output)
+
+        subprocess.call(shlex.split("./copy_output.sh " + str(self.week_index)))
@@ -0,0 +1,196 @@
+import csv
+import os
+import shutil
+
+"""
+Writers and loaders for the outputs of an experiment. Outputs are written as CSV by default, or as a compressed
+columnar file with typed columns when output_format is set in the experiment YAML. pandas, and pyarrow for Parquet or
+PyTables for HDF5, are only imported when a columnar format is used
+"""
+
+# Supported values of the output_format option, and the extension of their files
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'hdf5': '.h5'}
+
+PARQUET_COMPRESSION = 'snappy'
+
+# Name of the chunk files of a Parquet output written in chunks, which is a folder
+PARQUET_PART = 'part-%05d.parquet'
+HDF5_KEY = 'values'
+HDF5_COMPLIB = 'zlib'
+HDF5_COMPLEVEL = 5
+
+# Columns holding counters or simulation seconds. timestamp columns written by the PLCs hold datetimes
+INTEGER_COLUMNS = ['iteration', 'Timestamps']
+DATETIME_COLUMNS = ['timestamp']
+
+# Columns of the SCADA with the time each PLC sample was received, and its status: ok, stale or missing
+SAMPLE_TIME_SUFFIX = '_timestamp'
+SAMPLE_STATUS_SUFFIX = '_status'
+
+
+def get_output_format(config_options):
+    """
+    :param config_options: options of the experiment YAML file
+    :return: the configured output format, csv by default
+    """
+    output_format = config_options.get('output_format', 'csv')
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Invalid output_format ' + str(output_format) + ', supported formats are ' +
+                         ', '.join(sorted(OUTPUT_FORMATS.keys())))
+    return output_format
+
+
+def get_output_path(path, output_format):
+    """
+    :param path: path of the output file, with or without extension
+    :param output_format: one of OUTPUT_FORMATS
+    :return: the path with the extension of output_format
+    """
+    return os.path.splitext(path)[0] + OUTPUT_FORMATS[output_format]
+
+
+def to_dataframe(header, rows, float_dtype='float64', actuator_columns=None):
+    """
+    Builds a DataFrame with typed columns: counters as int64, PLC and sample timestamps as datetime64, actuator status
+    as int8, sample status as category and every other column as float_dtype
+    :param header: list with the column names
+    :param rows: list of rows, or 2D array, with the values
+    :param float_dtype: dtype of the measurement columns
+    :param actuator_columns: names of the columns holding an actuator status, as the writer of the output knows them
+    :return: a pandas DataFrame
+    """
+    import pandas as pd
+
+    actuator_columns = set(actuator_columns or [])
+
+    df = pd.DataFrame(rows, columns=header)
+    for column in header:
+        if column in INTEGER_COLUMNS:
+            df[column] = df[column].astype('int64')
+        elif column in DATETIME_COLUMNS or column.endswith(SAMPLE_TIME_SUFFIX):
+            df[column] = pd.to_datetime(df[column])
+        elif column.endswith(SAMPLE_STATUS_SUFFIX):
+            df[column] = df[column].astype('category')
+        elif column in actuator_columns:
+            df[column] = df[column].astype('int8')
+        else:
+            df[column] = df[column].astype(float_dtype)
+    return df
+
+
+def write_table(path, header, rows, output_format, float_dtype='float64', actuator_columns=None):
+    """
+    Writes a whole output file at once
+    :param path: path of the output file, with the extension of output_format
+    :param header: list with the column names
+    :param rows: list of rows with the values
+    :param output_format: one of OUTPUT_FORMATS
+    :param float_dtype: dtype of the measurement columns in the columnar formats
+    :param actuator_columns: names of the columns stored as int8 in the columnar formats
+    """
+    if output_format == 'csv':
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return
+
+    if output_format == 'parquet':
+        remove_output(path)
+        write_parquet(to_dataframe(header, rows, float_dtype, actuator_columns), path)
+        return
+
+    appender = TableAppender(path, output_format, float_dtype, actuator_columns)
+    appender.append(header, rows)
+    appender.close()
+
+
+def write_parquet(df, path):
+    """
+    Writes a DataFrame as a Parquet file under a temporary name and renames it, so the file is either absent or
+    complete, with its footer
+    """
+    temporary_path = path + '.tmp'
+    df.to_parquet(temporary_path, engine='pyarrow', compression=PARQUET_COMPRESSION, index=False)
+    os.rename(temporary_path, path)
+
+
+def remove_output(path):
+    """
+    Removes the output of a previous run, a file or the folder of a Parquet output written in chunks
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class TableAppender:
+
+    """
+    This class appends chunks of rows to an output that stays readable if the run is killed. A Parquet output is a
+    folder with one complete Parquet file per chunk, as a Parquet file is unreadable until its footer is written. HDF5
+    chunks are appended to a table, which can be read after every append
+    """
+    def __init__(self, path, output_format, float_dtype='float64', actuator_columns=None):
+        self.path = path
+        self.output_format = output_format
+        self.float_dtype = float_dtype
+        self.actuator_columns = actuator_columns
+        self.parts = 0
+
+        remove_output(path)
+        if output_format == 'parquet':
+            os.makedirs(path)
+
+    def append(self, header, rows):
+        df = to_dataframe(header, rows, self.float_dtype, self.actuator_columns)
+
+        if self.output_format == 'parquet':
+            write_parquet(df, os.path.join(self.path, PARQUET_PART % self.parts))
+            self.parts += 1
+        else:
+            df.to_hdf(self.path, HDF5_KEY, mode='a', format='table', append=True, complib=HDF5_COMPLIB,
+                      complevel=HDF5_COMPLEVEL)
+
+    def close(self):
+        """
+        Every chunk is complete once appended, there is nothing left to write
+        """
+        pass
+
+
+def load_output(path):
+    """
+    Loads an output file written in any of OUTPUT_FORMATS
+    :param path: path of the output file, or folder of a Parquet output written in chunks
+    :return: a pandas DataFrame
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1]
+    if extension == OUTPUT_FORMATS['parquet'] and os.path.isdir(path):
+        # The chunks in order. A chunk being written when the run was killed only exists under its temporary name
+        parts = sorted(name for name in os.listdir(path) if name.endswith(OUTPUT_FORMATS['parquet']))
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(os.path.join(path, name)) for name in parts], ignore_index=True)
+    elif extension == OUTPUT_FORMATS['parquet']:
+        return pd.read_parquet(path)
+    elif extension == OUTPUT_FORMATS['hdf5']:
+        return pd.read_hdf(path, HDF5_KEY)
+    return pd.read_csv(path)
+
+
+def load_week(week_folder, name='physical_process'):
+    """
+    Loads one output of an experiment week, as copied by copy_output.sh, whatever format it was written in
+    :param week_folder: path of the week_<index> folder
+    :param name: name of the output without extension, for instance physical_process or plc1_received_values
+    :return: a pandas DataFrame
+    """
+    for extension in sorted(OUTPUT_FORMATS.values()):
+        path = os.path.join(week_folder, name + extension)
+        if os.path.exists(path):
+            return load_output(path)
+    raise IOError('No output named ' + name + ' found in ' + week_folder)
@@ -0,0 +1,66 @@
+import threading
+
+"""
+Dependency reads with a deadline. Each peer a PLC depends on gets a PeerReader with its own thread. A scan starts the
+read of every idle peer and waits for them until its deadline; a peer that misses the deadline keeps its read running
+in the background, the scan goes on with the last values received from it, and the peer is not asked again until the
+late read finishes. One slow peer behind a lossy link therefore delays the scan by the deadline at most
+"""
+
+
+class PeerReader:
+
+    """
+    This class runs the reads of one peer in a daemon thread
+    """
+    def __init__(self, name, read):
+        """
+        :param name: name of the peer, for the logs
+        :param read: function reading the values of the peer and storing them, raises an exception if the read fails
+        """
+        self.name = name
+        self.read = read
+
+        self.requested = threading.Event()
+        self.done = threading.Event()
+        self.done.set()
+
+        # Exception of the last read, None if it succeeded
+        self.error = None
+
+        # Number of scans that went on without the values of this peer
+        self.missed_deadlines = 0
+
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+            try:
+                self.read()
+                self.error = None
+            except Exception as e:
+                self.error = e
+            self.done.set()
+
+    def request(self):
+        """
+        Starts a read, unless the previous one is still running
+        :return: True if a new read was started
+        """
+        if not self.done.is_set():
+            return False
+        self.done.clear()
+        self.requested.set()
+        return True
+
+    def wait(self, timeout):
+        """
+        :param timeout: seconds to wait for the running read
+        :return: True if the read finished in time
+        """
+        self.done.wait(timeout)
+        return self.done.is_set()
@@ -1,10 +1,17 @@
 import wntr
 import wntr.network.controls as controls
-import sqlite3
-import csv
 import sys
 import pandas as pd
 import yaml
+from actuator_state import ActuatorState
+from state_db import StateDB
+from results_recorder import ResultsRecorder
+from stepping_simulator import SteppingSimulator
+from step_barrier import StepServer
+from virtual_clock import Clock, is_virtual
+from headless_plcs import HeadlessPLCs
+import output_writer
+import numeric_mode
 
 
 class PhysicalPlant:
@@ -14,6 +21,9 @@ class PhysicalPlant:
         config_file_path = sys.argv[1]
         config_options = self.load_config(config_file_path)
 
+        # Headless experiments evaluate the PLC control rules in this process, without Mininet or the database
+        self.headless = '--headless' in sys.argv[2:]
+
         # Week index to initialize the simulation
         if "week_index" in config_options:
             self.week_index = int(config_options['week_index'])
@@ -22,8 +32,12 @@ class PhysicalPlant:
 
         # connection to the database
         self.db_path = config_options['db_path']
-        self.conn = sqlite3.connect(self.db_path)
-        self.c = self.conn.cursor()
+        if 'db_busy_timeout' in config_options:
+            busy_timeout = float(config_options['db_busy_timeout'])
+        else:
+            busy_timeout = None
+        if not self.headless:
+            self.state_db = StateDB(self.db_path, 'plant', busy_timeout)
 
         self.output_path = config_options['output_ground_truth_path']
         self.simulation_days = int(config_options['duration_days'])
@@ -40,39 +54,23 @@ class PhysicalPlant:
         self.pump_list = self.get_link_list_by_type(self.link_list, 'Pump')
         self.valve_list = self.get_link_list_by_type(self.link_list, 'Valve')
 
-        list_header = ["Timestamps"]
-        aux = self.create_node_header(self.tank_list)
-        list_header.extend(aux)
-
-        aux = self.create_node_header(self.junction_list)
-        list_header.extend(aux)
-
-        aux = self.create_link_header(self.pump_list)
-        list_header.extend(aux)
-        list_header.extend(aux)
-
-        aux = self.create_link_header(self.valve_list)
-        list_header.extend(aux)
-
-        self.results_list = []
-        self.results_list.append(list_header)
-
         # intialize the simulation with the random demand patterns and tank levels
         self.initialize_simulation(config_options)
 
-        dummy_condition = controls.ValueCondition(self.wn.get_node(self.tank_list[0]), 'level', '>=', -1)
-
-        self.control_list = []
-        for valve in self.valve_list:
-            self.control_list.append(self.create_control_dict(valve, dummy_condition))
+        # The ground truth is appended to the output file in chunks of iterations or seconds
+        chunk_iterations = config_options.get('results_chunk_iterations')
+        chunk_seconds = config_options.get('results_chunk_seconds')
+        self.recorder = ResultsRecorder(self.wn, self.tank_list, self.junction_list, self.pump_list,
+                                        self.valve_list, 'output/' + self.output_path, chunk_iterations,
+                                        chunk_seconds, output_writer.get_output_format(config_options))
 
-        for pump in self.pump_list:
-            self.control_list.append(self.create_control_dict(pump, dummy_condition))
+        dummy_condition = controls.ValueCondition(self.wn.get_node(self.tank_list[0]), 'level', '>=', -1)
 
-        for control in self.control_list:
-            an_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-            a_control = controls.Control(control['condition'], an_action, name=control['name'])
-            self.wn.add_control(control['name'], a_control)
+        # The actuator state only touches the WNTR controls of the actuators changed by the PLCs
+        actuator_names = []
+        actuator_names.extend(self.valve_list)
+        actuator_names.extend(self.pump_list)
+        self.actuator_state = ActuatorState(self.wn, actuator_names, dummy_condition)
 
         simulator_string = config_options['simulator']
 
@@ -86,7 +84,22 @@ class PhysicalPlant:
             print('Invalid simulation mode, exiting...')
             sys.exit(1)
 
-        self.sim = wntr.sim.WNTRSimulator(self.wn)
+        self.sim = SteppingSimulator(self.wn)
+
+        if self.headless:
+            # Nothing paces a headless experiment, its PLC timestamps are simulation times
+            self.plcs = HeadlessPLCs(config_options['plc_dict_path'], self.tank_list,
+                                     output_writer.get_output_format(config_options),
+                                     numeric_mode.get_numeric_mode(config_options))
+            self.virtual_clock = True
+            print("Running headless with PLCs " + ', '.join(self.plcs.get_names()))
+        else:
+            # Every PLC acknowledges each hydraulic step before the plant simulates the next one
+            with open(config_options['plc_dict_path']) as plc_file:
+                plc_names = [plc['PLC'] for plc in yaml.load(plc_file, Loader=yaml.FullLoader)]
+            self.virtual_clock = is_virtual(config_options)
+            self.step_server = StepServer(plc_names, ack_timeout=config_options.get('barrier_timeout'),
+                                          virtual=self.virtual_clock)
 
         print("Starting simulation for " + str(config_options['inp_file']) + " topology ")
 
@@ -141,127 +154,103 @@ class PhysicalPlant:
                 result.append(str(link))
         return result
 
-    def create_node_header(self, a_list):
-        result = []
-        for node in a_list:
-            result.append(node + "_LEVEL")
-        return result
-
-    def create_link_header(self, a_list):
-        result = []
-        for link in a_list:
-            result.append(link + "_FLOW")
-            result.append(link + "_STATUS")
-        return result
-
     def get_controls(self, a_list):
         result = []
         for control in a_list:
             result.append(self.wn.get_control(control))
         return result
 
-    def create_control_dict(self, actuator, dummy_condition):
-        act_dict = dict.fromkeys(['actuator', 'parameter', 'value', 'condition', 'name'])
-        act_dict['actuator'] = self.wn.get_link(actuator)
-        act_dict['parameter'] = 'status'
-        act_dict['condition'] = dummy_condition
-        act_dict['name'] = actuator
-        if type(self.wn.get_link(actuator).status) is int:
-            act_dict['value'] = act_dict['actuator'].status
-        else:
-            act_dict['value'] = act_dict['actuator'].status.value
-        return act_dict
-
-    def register_results(self, results):
-        values_list = []
-        values_list.extend([results.timestamp])
-
-        # Results are divided into: nodes: reservoir and tanks, links: flows and status
-        # Get tanks levels
-        for tank in self.tank_list:
-            values_list.extend([self.wn.get_node(tank).level])
-
-        # Get junction  levels
-        for junction in self.junction_list:
-            values_list.extend([self.wn.get_node(junction).head - self.wn.get_node(junction).elevation])
-
-        # Get pumps flows and status
-        for pump in self.pump_list:
-
-            values_list.extend([self.wn.get_link(pump).flow])
-
-            if type(self.wn.get_link(pump).status) is int:
-                values_list.extend([self.wn.get_link(pump).status])
-            else:
-                values_list.extend([self.wn.get_link(pump).status.value])
-
-                # Get valves flows and status
-        for valve in self.valve_list:
-            values_list.extend([self.wn.get_link(valve).flow])
-
-            if type(self.wn.get_link(valve).status) is int:
-                values_list.extend([self.wn.get_link(valve).status])
-            else:
-                values_list.extend([self.wn.get_link(valve).status.value])
-
-        return values_list
-
     def update_controls(self):
-        for control in self.control_list:
-            self.update_control(control)
-
-    def update_control(self, control):
-        act_name = '\'' + control['name'] + '\''
-        rows_1 = self.c.execute('SELECT value FROM plant WHERE name = ' + act_name).fetchall()
-        self.conn.commit()
-        new_status = int(rows_1[0][0])
+        """
+        Reads the actuator status written by the PLCs and applies the ones that changed to the WNTR model
+        :return: the number of actuators that changed their status
+        """
+        if self.headless:
+            new_status = self.plcs.get_actuator_status(self.actuator_state.status)
+        else:
+            new_status = self.get_multiple_from_db(self.actuator_state.get_names())
+        return self.actuator_state.update(new_status)
 
-        control['value'] = new_status
+    def get_multiple_from_db(self, names):
+        """
+        Reads several tags from the database using a single query
+        :param names: list with the name of the tags to read
+        :return: dictionary with the tag name as key and the stored value as value
+        """
+        return self.state_db.get_multiple(names)
 
-        new_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-        new_control = controls.Control(control['condition'], new_action, name=control['name'])
+    def set_multiple_to_db(self, name_values):
+        """
+        Writes several tags into the database using a single executemany inside one transaction
+        :param name_values: list of (name, value) tuples
+        """
+        rows = []
+        for name, value in name_values:
+            rows.append((name, str(value)))
 
-        self.wn.remove_control(control['name'])
-        self.wn.add_control(control['name'], new_control)
+        self.state_db.set_multiple(rows)
 
-    def write_results(self, results):
-        with open('output/' + self.output_path, 'w') as f:
-            writer = csv.writer(f)
-            writer.writerows(results)
+    def write_results(self):
+        self.recorder.close()
+        if self.headless:
+            self.plcs.write_output()
 
     def main(self):
-        # We want to simulate only 1 hydraulic timestep each time MiniCPS processes the simulation data
-        self.wn.options.time.duration = self.wn.options.time.hydraulic_timestep
+        # The hydraulic model is built once, each iteration simulates only 1 hydraulic timestep
+        self.sim.initialize(convergence_error=True)
         master_time = 0
+        total_solver_time = 0.0
 
-        mask_full_control = 7
         iteration_limit = (self.simulation_days * 24 * 3600) / self.wn.options.time.hydraulic_timestep
 
         print("Simulation will run for " + str(self.simulation_days) + " days. Hydraulic timestep is " + str(
             self.wn.options.time.hydraulic_timestep) +
               " for a total of " + str(iteration_limit) + " iterations ")
 
+        if not self.headless:
+            try:
+                print("PLCs in the step barrier: " + str(self.step_server.wait_for_plcs()))
+            except RuntimeError as e:
+                print("Error: " + str(e) + ", aborting")
+                self.step_server.close()
+                sys.exit(1)
+
+        # The real-time factor counts from the first step, not from the PLC registration
+        self.clock = Clock(self.virtual_clock)
+
         while master_time <= iteration_limit:
 
-            self.update_controls()
+            changes = self.update_controls()
             print("ITERATION %d ------------- " % master_time)
-            results = self.sim.run_sim(convergence_error=True)
-            values_list = self.register_results(results)
+            print("Applied " + str(changes) + " actuator changes")
+            sim_time = self.sim.step()
+            total_solver_time += self.sim.solver_time
+            print("Solver time: %.4f s" % self.sim.solver_time)
+            self.recorder.record(sim_time)
 
-            self.results_list.append(values_list)
+            sensor_values = []
+            for tank in self.tank_list:
+                sensor_values.append((tank, self.wn.get_node(tank).level))
+
+            # The clock is at the solved step, which is the time of the PLC scans of the headless PLCs
+            self.clock.advance(sim_time)
+
+            # The PLCs apply their control logic to the new sensor values before the next step reads the actuators
+            if self.headless:
+                self.plcs.scan(sensor_values, master_time + 1, self.clock.now())
+            else:
+                self.set_multiple_to_db(sensor_values)
+                self.step_server.publish(master_time, sim_time)
+                self.step_server.wait_for_acks(master_time)
             master_time += 1
 
-            for tank in self.tank_list:
-                tank_name = '\'' + tank + '\''
-                a_level = self.wn.get_node(tank).level
-                query = "UPDATE plant SET value = " + str(a_level) + " WHERE name = " + tank_name
-                self.c.execute(query)  # UPDATE TANKS IN THE DATABASE
-                self.conn.commit()
-
-            query = "UPDATE plant SET value = 0 WHERE name = 'CONTROL'"
-            self.c.execute(query)  # UPDATE CONTROL value for the PLCs to apply control
-            self.conn.commit()
-        self.write_results(self.results_list)
+            print("Real-time factor: %.2f" % self.clock.real_time_factor())
+
+        if not self.headless:
+            self.step_server.close()
+        self.write_results()
+        print("Total solver time: %.2f s for %d iterations" % (total_solver_time, master_time))
+        print("Achieved real-time factor: %.2f" % self.clock.real_time_factor())
 
 
 if __name__ == "__main__":
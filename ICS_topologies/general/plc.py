@@ -1,7 +1,12 @@
 from basePLC import BasePLC
+from step_barrier import StepClient
+from virtual_clock import Clock
 from utils import *
-from datetime import datetime
-from decimal import Decimal
+import numeric_mode
+import exception_publisher
+import subscription
+from peer_reader import PeerReader
+from scan_scheduler import ScanScheduler, get_scan_period
 import time
 import threading
 import yaml
@@ -10,12 +15,55 @@ import argparse
 
 
 class PLC(BasePLC):
+    def __init__(self, name, state, protocol, memory, disk, arguments=None, host=None):
+        """
+        :param arguments: command line of the PLC, sys.argv when it runs as a script
+        :param host: PLCHost running this PLC in one of its threads, None when it runs as a script
+        """
+        if arguments is None:
+            arguments = sys.argv
+        self.arguments = arguments
+
+        # MiniCPS runs pre_loop and main_loop inside the constructor, so the host gets the PLC before
+        if host is not None:
+            self.hosted = True
+            host.register(self)
+
+        BasePLC.__init__(self, name=name, state=state, protocol=protocol, memory=memory, disk=disk)
+
     def pre_loop(self):
 
-        self.name = sys.argv[2]
-        self.week_index = sys.argv[4]
-        self.plc_dict_path = sys.argv[6]
-        lastPLC = sys.argv[8]
+        self.name = self.arguments[2]
+        self.week_index = self.arguments[4]
+        self.plc_dict_path = self.arguments[6]
+        lastPLC = self.arguments[8]
+
+        # Older launchers do not pass the output format or the numeric mode
+        if len(self.arguments) > 10:
+            output_format = self.arguments[10]
+        else:
+            output_format = 'csv'
+
+        if len(self.arguments) > 12:
+            self.numeric_mode = self.arguments[12]
+        else:
+            self.numeric_mode = 'float'
+
+        # Converts the values read by the PLC and the rule limits to float, or to Decimal in decimal mode
+        self.to_number = numeric_mode.get_converter(self.numeric_mode)
+
+        # The report by exception options of this PLC and the dependency deadline come from the experiment YAML
+        config_options = {}
+        if len(self.arguments) > 14:
+            with open(self.arguments[14], 'r') as config_file:
+                config_options = yaml.full_load(config_file)
+        publish_options = exception_publisher.get_publish_options(config_options, self.name)
+        subscription_enabled = subscription.get_push_interval(config_options) is not None
+
+        # Seconds a scan waits for the dependencies of its peers. Without it, a scan waits for every peer
+        self.dependency_deadline = config_options.get('dependency_deadline')
+        self.peer_readers = []
+        scan_period = get_scan_period(config_options, self.name)
 
         # This is a list of dictionaries with keys 'tag' and 'value'
         self.tags_to_get = []
@@ -29,6 +77,23 @@ class PLC(BasePLC):
 
         self.local_time = 0
 
+        # Cleared by shutdown() to end the main loop
+        self.running = True
+
+        # Seconds taken by the last scan: reading the inputs and applying the control logic
+        self.scan_time = 0.0
+
+        # Seconds between the start of the last two scans, and its change from the previous interval
+        self.scan_interval = 0.0
+        self.scan_jitter = 0.0
+
+        # Used to sync the control logic with the hydraulic steps of the physical process, which also set the clock
+        self.clock = Clock()
+        self.step_client = StepClient(self.name, clock=self.clock)
+
+        # Paces the free running scans with a fixed period, and accounts for the duration of every scan
+        self.scheduler = ScanScheduler(scan_period, self.clock)
+
         print "Pre-loop"
         self.plc_dict = self.get_plc_dict()
         if self.plc_dict == None:
@@ -36,22 +101,29 @@ class PLC(BasePLC):
             sys.exit(1)
 
         self.verify_list()
+
+        # Every tag name is resolved once into self.tag_registry, unknown tags abort the startup
+        self.build_tag_registry()
         self.populate_tag_list('Sensors')
 
         # These values need to be send using the thread
         self.tags_to_send.extend(self.plc_dict['Sensors'])
         self.tags_to_send.extend(self.plc_dict['Actuators'])
 
-        # this wil populate self.tags_to_receive. This is a list of dictionaries with 'tag', 'node', and 'value'
+        # this wil populate self.tags_to_receive. This is a list of dictionaries with 'tag', 'enip_tag', 'node',
+        # 'address' and 'value'
         self.populate_dependencies()
 
+        # The control rules are resolved once into self.compiled_rules
+        self.compile_rules()
+
         self.converted_tags_to_send = []
 
         # Initialize the values to send them
         for tag in self.tags_to_send:
-            converted_tag = self.convert_tag_to_enip_tag(tag)
+            converted_tag = self.tag_registry[tag]['enip_tag']
             self.converted_tags_to_send.append(converted_tag)
-            self.values_to_send.append(Decimal(self.get(converted_tag)))
+            self.values_to_send.append(self.to_number(self.get(converted_tag)))
 
         if self.name != "SCADA" or self.name != "scada":
             # If we are a SCADA we don't need a reader thread
@@ -68,39 +140,165 @@ class PLC(BasePLC):
 
         self.lock = threading.Lock()
 
-        BasePLC.set_parameters(self, path, self.received_values, self.converted_tags_to_send, self.values_to_send, self.reader,
-                               self.lock, ENIP_LISTEN_PLC_ADDR, lastPLC, self.week_index, isScada)
+        BasePLC.set_parameters(self, path, [self.received_values], self.converted_tags_to_send, self.values_to_send,
+                               self.reader, self.lock, ENIP_LISTEN_PLC_ADDR, lastPLC, self.week_index, isScada,
+                               output_format, publish_options, subscription_enabled, self.plc_dict['Actuators'])
         self.startup()
 
+    def build_tag_registry(self):
+        """
+        Resolves the names of the tags used by this PLC into self.tag_registry, a dictionary with the tag name as key
+        and a dictionary with the 'enip_tag' tuple defined in utils.py and the 'address' of the PLC serving the tag as
+        value. The address is None for the local sensors and actuators.
+        Control rules may only check local sensors or dependencies, and only change local actuators
+        :return:
+        """
+        self.tag_registry = {}
+
+        for tag in self.plc_dict['Sensors'] + self.plc_dict['Actuators']:
+            self.register_tag(tag, None)
+
+        for dependency in self.plc_dict['Dependencies']:
+            node = dependency['PLC'].lower()
+            if node not in CTOWN_IPS:
+                print "Dependency " + str(dependency['tag']) + " is served by unknown PLC " + str(node) + ", aborting"
+                sys.exit(1)
+            self.register_tag(dependency['tag'], CTOWN_IPS[node])
+
+        for rule in self.plc_dict['Controls']:
+            for tag in [rule['tank_tag'], rule['actuator_tag']]:
+                if tag not in self.tag_registry:
+                    print "Control rule uses tag " + str(tag) + ", which is not a sensor, actuator or dependency of " \
+                        + self.name + ", aborting"
+                    sys.exit(1)
+
+    def register_tag(self, tag, address):
+        """
+        Adds a tag to self.tag_registry. Tags are the ('name', 1) tuples that epanet_parser.py writes into utils.py
+        :param tag: name of the tag
+        :param address: IP address of the PLC serving the tag, None for local tags
+        """
+        enip_tag = globals().get(tag)
+        if type(enip_tag) is not tuple:
+            print "Tag " + str(tag) + " is not defined in utils.py, aborting"
+            sys.exit(1)
+
+        self.tag_registry[tag] = {'enip_tag': enip_tag, 'address': address}
+
     def populate_tag_list(self, tag_type):
 
         # Populate and initialize the tag list
         for tag in self.plc_dict[tag_type]:
             tag_dict = {}
             tag_dict['tag'] = tag
-            tag_dict['value'] = Decimal(self.get(eval(tag_dict['tag'])))
+            tag_dict['enip_tag'] = self.tag_registry[tag]['enip_tag']
+            tag_dict['value'] = self.to_number(self.get(tag_dict['enip_tag']))
             self.tags_to_get.append(tag_dict)
 
     def populate_dependencies(self):
         """
         Dependencies are tags that this PLC does not have. This means the PLC needs to request using ENIP/Modbus
-        the tag to a different PLC or node
+        the tag to a different PLC or node. The dependencies are grouped by the PLC serving them into
+        self.peer_reads, a list of (address, ENIP tags, tag dictionaries) tuples, so each peer is read with a single
+        request
         :return:
         """
+        self.peer_reads = []
+        peer_index = {}
+
         for dependency in self.plc_dict['Dependencies']:
             dependency_dict = {}
             dependency_dict['tag'] = dependency['tag']
             dependency_dict['node'] = dependency['PLC'].lower()
-            dependency_dict['value'] = self.receive(eval(dependency_dict['tag']), CTOWN_IPS[dependency_dict['node']])
+            dependency_dict['enip_tag'] = self.tag_registry[dependency['tag']]['enip_tag']
+            dependency_dict['address'] = self.tag_registry[dependency['tag']]['address']
+            dependency_dict['value'] = None
             self.tags_to_receive.append(dependency_dict)
 
-    def convert_tag_to_enip_tag(self, tag):
+            if dependency_dict['address'] not in peer_index:
+                peer_index[dependency_dict['address']] = len(self.peer_reads)
+                self.peer_reads.append((dependency_dict['address'], [], []))
+            address, enip_tags, tags = self.peer_reads[peer_index[dependency_dict['address']]]
+            enip_tags.append(dependency_dict['enip_tag'])
+            tags.append(dependency_dict)
+
+        self.receive_dependencies()
+
+        if self.dependency_deadline is not None:
+            for address, enip_tags, tags in self.peer_reads:
+                self.peer_readers.append(PeerReader(tags[0]['node'], self.get_peer_read(address, enip_tags, tags)))
+
+    def get_peer_read(self, address, enip_tags, tags):
         """
-        This method should be deprecated, and instead use eval()
-        :param tag:
+        :return: a function reading the dependencies served by one peer, for its PeerReader
+        """
+        def read():
+            self.receive_from_peer(address, enip_tags, tags)
+        return read
+
+    def receive_dependencies(self):
+        """
+        Reads the dependencies of every peer with one receive_multiple request per peer. The peers are read
+        concurrently, so a scan waits for the slowest peer instead of the sum of all of them. With a dependency
+        deadline, the scan waits until the deadline at most
         :return:
         """
-        return (tag, 1)
+        if self.peer_readers:
+            self.receive_dependencies_until_deadline()
+            return
+
+        if len(self.peer_reads) == 1:
+            address, enip_tags, tags = self.peer_reads[0]
+            self.receive_from_peer(address, enip_tags, tags)
+            return
+
+        errors = []
+        threads = []
+        for address, enip_tags, tags in self.peer_reads:
+            thread = threading.Thread(target=self.receive_from_peer, args=(address, enip_tags, tags, errors))
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        # The scan handles a failed read as it did when the peers were read one by one
+        if errors:
+            raise errors[0]
+
+    def receive_dependencies_until_deadline(self):
+        """
+        Starts the read of every peer without a late read running, and waits for them until the dependency deadline.
+        The rules use the last values received from the peers that missed the deadline or failed
+        :return:
+        """
+        deadline = time.time() + float(self.dependency_deadline)
+        for reader in self.peer_readers:
+            reader.request()
+
+        for reader in self.peer_readers:
+            if not reader.wait(max(deadline - time.time(), 0)):
+                reader.missed_deadlines += 1
+                print "Warning: " + reader.name + " missed the dependency deadline, using its last values"
+            elif reader.error is not None:
+                print "Warning: reading " + reader.name + " failed, using its last values: " + str(reader.error)
+
+    def receive_from_peer(self, address, enip_tags, tags, errors=None):
+        """
+        Reads the dependencies served by one peer and stores their values in the tag dictionaries
+        :param address: IP address of the peer
+        :param enip_tags: list with the ENIP tags to read
+        :param tags: dictionaries of self.tags_to_receive, in the order of enip_tags
+        :param errors: list where a reading thread stores its exception, None to raise it
+        """
+        try:
+            values = self.receive_multiple(enip_tags, address)
+            for tag, value in zip(tags, values):
+                tag['value'] = self.to_number(value)
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(e)
 
     def verify_list(self):
         """
@@ -128,61 +326,78 @@ class PLC(BasePLC):
 
         return None
 
+    def compile_rules(self):
+        """
+        Builds self.compiled_rules from plc_dict['Controls']: a list of (condition, actuator tag, status) tuples, in the
+        order update_actuators() used to apply the rules, actuator by actuator. Each condition is a closure over the tag
+        dictionary holding the value it checks and over the limit already converted with self.to_number, so a scan does
+        no lookups or conversions
+        """
+        self.compiled_rules = []
+        for actuator in self.plc_dict['Actuators']:
+            for rule in self.get_control_rules_by_actuator(actuator):
+                if rule['actuator_value'] == 'Open':
+                    status = int(1)
+                elif rule['actuator_value'] == 'Closed':
+                    status = int(0)
+                else:
+                    continue
+
+                tag = self.get_tag_for_rule(rule)
+                if tag is None:
+                    print "Control rule checks " + str(rule['tank_tag']) + ", which is an actuator of " + self.name + \
+                          ", aborting"
+                    sys.exit(1)
+
+                condition = self.compile_condition(tag, rule['operator'], self.to_number(rule['value']))
+                if condition is None:
+                    continue
+
+                self.compiled_rules.append((condition, self.tag_registry[rule['actuator_tag']]['enip_tag'], status))
+
+    def compile_condition(self, tag, operator, limit):
+        """
+        :param tag: dictionary of self.tags_to_get or self.tags_to_receive whose value is checked
+        :param operator: the operator as stored in the control rules
+        :param limit: the limit that triggers the action, converted with self.to_number
+        :return: a function returning True if the value is strictly below the limit for <=, or strictly above it for >=.
+        None if the operator is not supported, as such a rule never triggers
+        """
+        if operator == '<=':
+            def condition():
+                return tag['value'] < limit
+        elif operator == '>=':
+            def condition():
+                return tag['value'] > limit
+        else:
+            return None
+        return condition
+
     def update_actuators(self):
         """
         This method applies the control logic in the PLC. Control logic is defined in plc_dict['controls']
         to apply the control logic, we need to check for all the actuators, if a specific rule criteria is matched.
-        If this is the case, we apply the actuator_value on such actuator
+        If this is the case, we apply the actuator_value on such actuator. The rules were compiled by compile_rules()
         """
-        for actuator in self.plc_dict['Actuators']:
-            rules = self.get_control_rules_by_actuator(actuator)
-            for rule in rules:
-                #Need to check this
-                value = self.get_value_for_rule(rule)
-                #print("Found value " + str(value))
-                if self.check_condition(value, rule['operator'], rule['value']):
-                    #print "Condition applies because tag " + str(rule['tank_tag']) + " has value " + str(value) + " " +\
-                    #      str(rule['operator']) + " than " + str(rule['value'])
-                    if rule['actuator_value'] == 'Open':
-                        #print("Opening " + str(rule['actuator_tag']))
-                        #print("Eval value " + str(eval(rule['actuator_tag'])))
-                        self.set(eval(rule['actuator_tag']), int(1))
-                    if rule['actuator_value'] == 'Closed':
-                        #print("Closing " + str(rule['actuator_tag']))
-                        self.set(eval(rule['actuator_tag']), int(0))
-
-    def get_value_for_rule(self, a_rule):
-        """
-        This method finds the value that needs to be evaluated in this rule
+        for condition, actuator_tag, status in self.compiled_rules:
+            if condition():
+                self.set(actuator_tag, status)
+
+    def get_tag_for_rule(self, a_rule):
+        """
+        This method finds the tag whose value needs to be evaluated in this rule
         :param a_rule:
-        :return:
+        :return: the dictionary of self.tags_to_get or self.tags_to_receive holding the value, None if not found
         """
         for tag in self.tags_to_get:
             if tag['tag'] == a_rule['tank_tag']:
-                return tag['value']
+                return tag
 
         for tag in self.tags_to_receive:
             if tag['tag'] == a_rule['tank_tag']:
-                #print(tag['value'])
-                return tag['value']
+                return tag
 
-    def check_condition(self, current_value, operator, limit):
-        """
-        This method checks is a condition is True, in order to trigger an actuator action
-        :param current_value: The current value measured by the PLC
-        :param operator: The operator as stored in the control rules
-        :param limit: The limit thaea
-        t triggers the action
-        :return: True if the condition is met. False otherwise
-        """
-        if operator == '<=':
-            if current_value < Decimal(limit):
-                return True
-        elif operator == '>=':
-            if current_value > Decimal(limit):
-                return True
-        else:
-            return False
+        return None
 
     def get_control_rules_by_actuator(self, an_actuator):
         """
@@ -204,31 +419,61 @@ class PLC(BasePLC):
         Control logic is composed of a series of simple if control rules
         Actuators are always local
         Sending actuator/sensor information is already handled by pre_loop configuration and BasePLC
+        Each scan runs once per hydraulic step, after the physical process published the new sensor values
         """
         print "Main loop"
-        while True:
+        while self.running:
+            step = self.step_client.wait_step()
+            start = time.time()
+            if self.local_time > 0:
+                interval = start - self.last_scan_start
+                if self.scan_interval > 0:
+                    self.scan_jitter = abs(interval - self.scan_interval)
+                self.scan_interval = interval
+            self.last_scan_start = start
+            failed = False
             try:
-                #toDo Implement control flag
                 #toDo Implement attacks infrastructure
                 self.local_time += 1
-                result_list = [self.local_time, datetime.now()]
+                result_list = [self.local_time, self.clock.now()]
 
                 # 1) Get inputs
                 for tag in self.tags_to_get:
-                    tag['value'] = Decimal(self.get(eval(tag['tag'])))
+                    tag['value'] = self.to_number(self.get(tag['enip_tag']))
 
-                for tag in self.tags_to_receive:
-                    tag['value'] = Decimal(self.receive(eval(tag['tag']), CTOWN_IPS[tag['node']]))
+                self.receive_dependencies()
 
                 # 2) Apply control logic, using the current buffered system state
                 self.update_actuators()
 
-                time.sleep(0.05)
+                self.scan_time = time.time() - start
+                print "Scan time: %.6f s, interval: %.6f s, jitter: %.6f s" % (self.scan_time, self.scan_interval,
+                                                                              self.scan_jitter)
             except Exception as e:
                 print "Exception!"
                 print e
-                time.sleep(0.01)
-                continue
+                failed = True
+
+            # The values of this step are served before it is acknowledged, so the PLCs depending on them and the SCADA
+            # never read the values of an earlier step, however short the step is
+            if step is not None:
+                self.publish_system_state()
+
+            # The step is acknowledged even if the scan failed, so the physical process does not wait for this PLC
+            self.step_client.ack(step)
+
+            # Without a barrier the PLC keeps a free running scan with a fixed period
+            self.scheduler.end_cycle(start, failed, step is not None)
+
+    def shutdown(self):
+        """
+        Ends the main loop and writes the timing summary of the scans before the outputs are written and copied
+        """
+        self.running = False
+        summary = self.scheduler.summary(self.name)
+        print "Scan timing: " + str(summary)
+        self.scheduler.write_summary('output/' + self.name + '_scan_timing.yaml', self.name)
+        BasePLC.shutdown(self)
 
 
 if __name__ == "__main__":
@@ -239,6 +484,9 @@ if __name__ == "__main__":
     parser.add_argument("--dict", "-d", help="Path of the dictionaries configuration file")
     parser.add_argument("--last", "-l", help="Flag that indicates if this is the last PLC. The last PLC moves the"
                                              "output files into the right output folder")
+    parser.add_argument("--output", "-o", help="Format of the output file: csv, parquet or hdf5")
+    parser.add_argument("--numeric", "-m", help="Number type of the values and rule limits: float or decimal")
+    parser.add_argument("--config", "-c", help="YAML experiment configuration file")
 
     args = parser.parse_args()
 
@@ -0,0 +1,150 @@
+from plc import PLC
+from utils import *
+import ctypes
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import argparse
+import yaml
+import output_writer
+import numeric_mode
+
+# Flag of setns(2) to join a network namespace
+CLONE_NEWNET = 0x40000000
+
+
+def enter_network_namespace(pid):
+    """
+    Moves the calling thread into the network namespace of a process. Threads and processes started afterwards by the
+    thread inherit the namespace, so the ENIP server, the ENIP sessions and tcpdump of a PLC all use the addresses of
+    its Mininet node
+    :param pid: PID of the shell of the Mininet node
+    """
+    libc = ctypes.CDLL('libc.so.6', use_errno=True)
+    fd = os.open('/proc/' + str(pid) + '/ns/net', os.O_RDONLY)
+    try:
+        if libc.setns(fd, CLONE_NEWNET) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    finally:
+        os.close(fd)
+
+
+class PLCHost:
+
+    """
+    This class runs the logic of several PLCs in one process, each one in its own thread bound to the network namespace
+    of its Mininet node. It replaces one generic_automatic_plc.py and plc.py process tree per PLC, so the interpreter,
+    MiniCPS, yaml and cpppo are loaded once. Each PLC still runs its own cpppo ENIP server process. The host handles
+    SIGINT and SIGTERM, and shuts the PLCs down
+    """
+    def __init__(self, config_path, dict_path, plc_pids, last_plc):
+        self.config_path = config_path
+        self.dict_path = dict_path
+        self.plc_pids = plc_pids
+        self.last_plc = last_plc
+
+        with open(self.config_path, 'r') as config_file:
+            config_data = yaml.full_load(config_file)
+        self.week_index = config_data.get('week_index', 0)
+        self.output_format = output_writer.get_output_format(config_data)
+        self.numeric_mode = numeric_mode.get_numeric_mode(config_data)
+
+        # PLC instances, registered by their constructor before they run pre_loop
+        self.plcs = {}
+        self.lock = threading.Lock()
+
+        self.threads = []
+        self.tcp_dumps = []
+
+    def register(self, plc):
+        with self.lock:
+            self.plcs[plc.arguments[2]] = plc
+
+    def get_arguments(self, name):
+        """
+        :return: the command line generic_automatic_plc.py would pass to plc.py for this PLC
+        """
+        last = '1' if name == self.last_plc else '0'
+        return ['plc.py', '-n', name, '-w', str(self.week_index), '-d', self.dict_path, '-l', last,
+                '-o', self.output_format, '-m', self.numeric_mode, '-c', self.config_path]
+
+    def run_plc(self, name, pid):
+        enter_network_namespace(pid)
+
+        interface_name = name + '-eth0'
+        self.tcp_dumps.append(subprocess.Popen(['tcpdump', '-i', interface_name, '-w',
+                                                'output/' + interface_name + '.pcap'], shell=False))
+
+        plc_data = eval(name.upper() + "_DATA")
+        PLC(name=name, state=STATE, protocol=eval(name.upper() + "_PROTOCOL"), memory=plc_data, disk=plc_data,
+            arguments=self.get_arguments(name), host=self)
+
+    def start(self):
+        for name, pid in self.plc_pids:
+            thread = threading.Thread(target=self.run_plc, args=(name, pid))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+            print "Launched " + name
+            time.sleep(0.2)
+
+    def main(self):
+        signal.signal(signal.SIGINT, self.sigint_handler)
+        signal.signal(signal.SIGTERM, self.sigint_handler)
+        self.start()
+
+        # The PLCs run until the host is signaled, join with a timeout keeps the signals deliverable
+        while any(thread.is_alive() for thread in self.threads):
+            for thread in self.threads:
+                thread.join(1.0)
+
+    def sigint_handler(self, sig, frame):
+        self.shutdown()
+        sys.exit(0)
+
+    def shutdown(self):
+        print "Stopping Tcp dump processes..."
+        for tcp_dump in self.tcp_dumps:
+            tcp_dump.kill()
+
+        # The last PLC copies the outputs of every PLC, so it is stopped after the others
+        names = [name for name, _ in self.plc_pids if name != self.last_plc]
+        names.extend([name for name, _ in self.plc_pids if name == self.last_plc])
+        for name in names:
+            plc = self.plcs.get(name)
+            # A PLC still in pre_loop has no outputs yet
+            if plc is not None and hasattr(plc, 'deadband_filter'):
+                print "Stopping " + name
+                plc.shutdown()
+
+        # MiniCPS stops the ENIP server of a PLC whose main loop ended, the servers still running are killed here
+        for thread in self.threads:
+            thread.join(1.0)
+        for plc in self.plcs.values():
+            protocol = getattr(plc, '_protocol', None)
+            server = getattr(protocol, '_server_subprocess', None)
+            if server is not None and server.poll() is None:
+                server.kill()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Script that runs several PLCs of a DHALSIM topology in one process')
+    parser.add_argument("--config", "-c", help="YAML experiment configuration file")
+    parser.add_argument("--dict", "-d", help="Path of the dictionaries configuration file")
+    parser.add_argument("--plcs", "-p", help="Comma separated list of name:pid, with the PID of the shell of the "
+                                             "Mininet node of each PLC, in launch order")
+    parser.add_argument("--last", "-l", help="Name of the last PLC, which copies the output files")
+    args = parser.parse_args()
+
+    plc_pids = []
+    for plc in args.plcs.split(','):
+        name, pid = plc.split(':')
+        plc_pids.append((name, int(pid)))
+
+    host = PLCHost(args.config, args.dict, plc_pids, args.last)
+    host.main()
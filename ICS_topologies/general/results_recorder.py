@@ -0,0 +1,142 @@
+import os
+import time
+import numpy as np
+import yaml
+import output_writer
+
+# Default number of iterations buffered before the ground truth is appended to the output file
+CHUNK_ITERATIONS = 100
+
+
+class ResultsRecorder:
+
+    """
+    This class records the ground truth of the physical process. The WNTR node and link objects are resolved once, and
+    every iteration fills one row of a preallocated float64 chunk whose columns follow the header built at start.
+    Full chunks are appended to the output file, so memory stays flat for any simulation length and a killed run
+    keeps everything flushed so far. When the simulation finishes, a manifest file marks the output as complete.
+    With a columnar output format, each chunk is written as a complete Parquet file of the output folder, or appended
+    to an HDF5 table
+    """
+    def __init__(self, wn, tank_list, junction_list, pump_list, valve_list, path, chunk_iterations=None,
+                 chunk_seconds=None, output_format='csv'):
+        self.tanks = [wn.get_node(tank) for tank in tank_list]
+        self.junctions = [wn.get_node(junction) for junction in junction_list]
+        self.links = [wn.get_link(link) for link in pump_list + valve_list]
+
+        # Junction elevations do not change during the simulation
+        self.elevations = np.array([junction.elevation for junction in self.junctions], dtype=np.float64)
+
+        self.header = ["Timestamps"]
+        self.header.extend(self.create_node_header(tank_list))
+        self.header.extend(self.create_node_header(junction_list))
+        self.header.extend(self.create_link_header(pump_list + valve_list))
+
+        # Column index of each header entry
+        self.column_index = dict((name, index) for index, name in enumerate(self.header))
+
+        # Slices of a row holding each group of values
+        tank_start = 1
+        junction_start = tank_start + len(self.tanks)
+        link_start = junction_start + len(self.junctions)
+        self.tank_slice = slice(tank_start, junction_start)
+        self.junction_slice = slice(junction_start, link_start)
+        self.flow_slice = slice(link_start, len(self.header), 2)
+        self.status_slice = slice(link_start + 1, len(self.header), 2)
+
+        # Timestamps and status are written as integers
+        self.fmt = ['%.17g'] * len(self.header)
+        self.fmt[0] = '%d'
+        self.fmt[self.status_slice] = ['%d'] * len(self.links)
+
+        # A chunk is flushed when it is full or when chunk_seconds passed since the last flush
+        if chunk_iterations is None:
+            chunk_iterations = CHUNK_ITERATIONS
+        self.chunk_seconds = chunk_seconds
+        self.values = np.zeros((int(chunk_iterations), len(self.header)), dtype=np.float64)
+        self.row = 0
+        self.rows_written = 0
+        self.last_flush = time.time()
+
+        self.output_format = output_format
+        self.appender = None
+        self.path = output_writer.get_output_path(path, output_format)
+        self.manifest_path = self.path + '.manifest.yaml'
+        self.start()
+
+    def create_node_header(self, a_list):
+        result = []
+        for node in a_list:
+            result.append(node + "_LEVEL")
+        return result
+
+    def create_link_header(self, a_list):
+        result = []
+        for link in a_list:
+            result.append(link + "_FLOW")
+            result.append(link + "_STATUS")
+        return result
+
+    def start(self):
+        """
+        Creates the output file, with the header for CSV, and removes the manifest of a previous run
+        """
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+        if self.output_format == 'csv':
+            with open(self.path, 'w') as f:
+                f.write(','.join(self.header) + '\n')
+        else:
+            self.appender = output_writer.TableAppender(self.path, self.output_format,
+                                                        actuator_columns=self.header[self.status_slice])
+
+    def record(self, timestamp):
+        """
+        Stores the current state of the network in the next row of the chunk
+        :param timestamp: timestamp of the WNTR results
+        """
+        row = self.values[self.row]
+        row[0] = timestamp
+        row[self.tank_slice] = np.fromiter((tank.level for tank in self.tanks), np.float64, len(self.tanks))
+        row[self.junction_slice] = np.fromiter((junction.head for junction in self.junctions), np.float64,
+                                               len(self.junctions)) - self.elevations
+
+        # WNTR link status is either an int or a LinkStatus IntEnum, both convert to float
+        row[self.flow_slice] = np.fromiter((link.flow for link in self.links), np.float64, len(self.links))
+        row[self.status_slice] = np.fromiter((link.status for link in self.links), np.float64, len(self.links))
+        self.row += 1
+
+        if self.row == len(self.values) or \
+                (self.chunk_seconds is not None and time.time() - self.last_flush >= self.chunk_seconds):
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered rows to the output file and empties the chunk
+        """
+        if self.row > 0:
+            if self.appender is not None:
+                self.appender.append(self.header, self.values[:self.row])
+            else:
+                with open(self.path, 'a') as f:
+                    np.savetxt(f, self.values[:self.row], fmt=self.fmt, delimiter=',')
+            self.rows_written += self.row
+            self.row = 0
+        self.last_flush = time.time()
+
+    def close(self):
+        """
+        Flushes the last chunk and writes the manifest marking the output as complete
+        """
+        self.flush()
+        if self.appender is not None:
+            self.appender.close()
+
+        manifest = {'file': os.path.basename(self.path),
+                    'format': self.output_format,
+                    'rows': self.rows_written,
+                    'columns': self.header,
+                    'complete': True}
+        with open(self.manifest_path, 'w') as f:
+            yaml.dump(manifest, f, default_flow_style=False)
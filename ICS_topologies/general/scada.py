@@ -1,54 +1,160 @@
 from basePLC import BasePLC
+from step_barrier import StepClient
+from virtual_clock import Clock
+from scada_poller import ScadaPoller, DEFAULT_POLL_PERIOD, DEFAULT_POLL_DEADLINE, SAMPLE_OK
+from historian import Historian
+from subscription import ScadaSubscriber, get_push_interval
 from utils import *
-
+import output_writer
+import threading
 import time
-from datetime import datetime
-from decimal import Decimal
-import signal
+import yaml
 import sys
-import csv
+import argparse
+
 
 class SCADAServer(BasePLC):
 
-    def write_output(self):
-        with open('output/' + self.path, 'w') as f:
-            writer = csv.writer(f)
-            writer.writerows(self.saved_tank_levels)
+    """
+    Generic SCADA of the general topology. The tags to poll and the PLC serving them are derived from plc_dicts.yaml:
+    the SCADA reads the sensors and actuators of every PLC with one multi-tag request per PLC, and writes them with a
+    timestamp and a sample status per PLC into output/scada_values, in the output format of the experiment. With the
+    historian, the samples received are appended to output/scada_historian instead, as the SCADA runs. With
+    subscriptions, the PLCs push the changes of their tags to the SCADA, which samples the last values pushed
+    """
+    def pre_loop(self):
+        args = self.get_arguments()
+
+        config_options = {}
+        if args.config:
+            with open(args.config, 'r') as config_file:
+                config_options = yaml.full_load(config_file)
+        output_format = output_writer.get_output_format(config_options)
+        poll_period = float(config_options.get('scada_poll_period', DEFAULT_POLL_PERIOD))
+        poll_deadline = float(config_options.get('scada_poll_deadline', DEFAULT_POLL_DEADLINE))
+
+        if args.dict:
+            plc_dict_path = args.dict
+        else:
+            plc_dict_path = 'plc_dicts.yaml'
+        with open(plc_dict_path, 'r') as plc_dict_file:
+            plc_dicts = yaml.full_load(plc_dict_file)
+
+        self.poll_period = poll_period
+
+        if config_options.get('scada_historian') == "True":
+            self.historian = Historian('output/scada_historian')
+        else:
+            self.historian = None
+        # Time of the last sample of every PLC stored in the historian
+        self.stored_times = {}
+
+        # With the virtual clock the SCADA polls once per hydraulic step, otherwise every poll period of real time
+        self.clock = Clock()
+        self.step_client = StepClient('scada', clock=self.clock, watch=True)
+
+        push_interval = get_push_interval(config_options)
+        if push_interval is None:
+            self.poller = ScadaPoller(self.receive_multiple, self.clock, poll_deadline)
+        else:
+            self.poller = ScadaSubscriber(self.clock, push_interval)
+        header = ["timestamp"]
+        for index, plc in enumerate(plc_dicts):
+            tags = self.get_plc_tags(plc)
+            if not tags:
+                continue
+            self.poller.add_plc(plc['PLC'].lower(), [globals()[tag] for tag in tags], self.get_plc_address(index, plc))
+            header.extend(tags)
+        header.extend(self.poller.get_columns())
+
+        print "SCADA polling " + ', '.join(plc.name for plc in self.poller.plcs)
+
+        BasePLC.set_parameters(self, 'scada_values.csv', [header], [], [], False, threading.Lock(),
+                               ENIP_LISTEN_PLC_ADDR, isScada=True, output_format=output_format)
+        self.startup()
+
+    def get_plc_tags(self, plc):
+        """
+        :param plc: dictionary of a PLC in plc_dicts.yaml
+        :return: the names of the sensors and actuators of the PLC, the tags its ENIP server publishes
+        """
+        tags = []
+        for tag in plc['Sensors'] + plc['Actuators']:
+            if not tag:
+                continue
+            if type(globals().get(tag)) is not tuple:
+                print "Tag " + str(tag) + " is not defined in utils.py, aborting"
+                sys.exit(1)
+            tags.append(tag)
+        return tags
 
-    def sigint_handler(self, sig, frame):
-        self.write_output()
-        sys.exit(0)
+    def get_plc_address(self, index, plc):
+        """
+        The SCADA is in the LAN of the first PLC of plc_dicts.yaml, see complex_topo.py, the other PLCs are reached
+        through the public address of their router
+        :param index: position of the PLC in plc_dicts.yaml
+        :param plc: dictionary of the PLC
+        :return: the address the SCADA polls the PLC at
+        """
+        if index == 0:
+            return ENIP_LISTEN_PLC_ADDR
+        return CTOWN_IPS[plc['PLC'].lower()]
+
+    def write_output(self):
+        if self.historian is None:
+            BasePLC.write_output(self)
+            return
+        self.historian.close()
+        print self.historian.report()
 
-    def pre_loop(self, sleep=0.5):
-        """scada pre loop.
-            - sleep
+    def store_samples(self, samples):
         """
-        self.saved_tank_levels = [["timestamp", "T_2", "X_Pump_4"]]
-        self.plc1_tags = [X_Pump_4]
-        self.plc2_tags = [T_2]
+        Appends the samples received in this poll to the historian, with the time each PLC sample was received. A
+        sample already stored, a PLC that did not push since the last poll, is skipped
+        :param samples: list returned by ScadaPoller.poll()
+        """
+        for plc, (values, sample_time, status) in zip(self.poller.plcs, samples):
+            if status != SAMPLE_OK or self.stored_times.get(plc.name) == sample_time:
+                continue
+            self.stored_times[plc.name] = sample_time
+            for tag, value in zip(plc.tags, values):
+                self.historian.append(tag[0], sample_time, value)
 
-        self.path = 'scada_saved_tank_levels_received.csv'
-        signal.signal(signal.SIGINT, self.sigint_handler)
-        signal.signal(signal.SIGTERM, self.sigint_handler)
+    def shutdown(self):
+        self.poller.write_summary('output/scada_poll_timing.yaml')
+        BasePLC.shutdown(self)
 
     def main_loop(self):
         """scada main loop."""
         print("DEBUG: scada main loop.")
         while True:
-
+            step = self.step_client.wait_step()
+            start = time.time()
             try:
-                #plc1 is in the same LAN as SCADA!
-                plc1_values = self.receive_multiple(self.plc1_tags, ENIP_LISTEN_PLC_ADDR)
-                plc2_values = self.receive_multiple(self.plc2_tags, CTOWN_IPS['plc2'])
-                results = [datetime.now()]
-                results.extend(plc1_values)
-                results.extend(plc2_values)
-                self.saved_tank_levels.append(results)
-
-                time.sleep(0.3)
+                samples = self.poller.poll()
+
+                if self.historian is not None:
+                    self.store_samples(samples)
+                else:
+                    results = [self.clock.now()]
+                    for values, _, _ in samples:
+                        results.extend(values)
+                    for _, sample_time, status in samples:
+                        results.extend([sample_time, status])
+                    self.result_list.append(results)
+
+                self.clock.sleep(max(0.0, self.poll_period - (time.time() - start)))
             except Exception, msg:
                 print(msg)
                 continue
+            finally:
+                self.step_client.ack(step)
+
+    def get_arguments(self):
+        parser = argparse.ArgumentParser(description='Generic SCADA of a DHALSIM topology')
+        parser.add_argument("--config", "-c", help="YAML experiment configuration file")
+        parser.add_argument("--dict", "-d", help="Path of the dictionaries configuration file")
+        return parser.parse_args()
 
 
 if __name__ == "__main__":
@@ -57,4 +163,6 @@ if __name__ == "__main__":
         name='scada',
         state=STATE,
         protocol=SCADA_PROTOCOL,
+        memory=SCADA_DATA,
+        disk=SCADA_DATA,
         )
@@ -0,0 +1,124 @@
+import random
+import time
+import yaml
+from virtual_clock import Clock
+
+"""
+Fixed period scan cycle for the PLCs. A free running PLC starts a scan every period seconds and sleeps only the slack
+left by the scan, instead of sleeping a fixed time after it. Scans longer than the period are counted as overruns, and
+the next scan starts right away without trying to catch up. Scans paced by the step barrier do not sleep, but their
+duration and overruns are accounted for in the same way
+"""
+
+# Scan period of the PLCs, in seconds, when the experiment YAML does not configure one
+DEFAULT_SCAN_PERIOD = 0.05
+
+# Number of scan times kept to compute the percentiles of the timing summary
+SAMPLE_SIZE = 100000
+
+
+def get_scan_period(config_options, plc_name):
+    """
+    :param config_options: options of the experiment YAML file
+    :param plc_name: name of the PLC
+    :return: the scan period of the PLC. scan_period is either a number for every PLC, or a dictionary with the PLC
+    names and an optional default as keys
+    """
+    scan_period = config_options.get('scan_period')
+    if isinstance(scan_period, dict):
+        scan_period = scan_period.get(plc_name.lower(), scan_period.get('default'))
+    if scan_period is None:
+        return DEFAULT_SCAN_PERIOD
+    return float(scan_period)
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: sorted list of values, not empty
+    :param fraction: between 0 and 1
+    :return: the nearest rank percentile
+    """
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class ScanScheduler:
+
+    """
+    This class paces the scans of a PLC and accounts for their duration
+    """
+    def __init__(self, period, clock=None):
+        self.period = float(period)
+        if clock is None:
+            clock = Clock()
+        self.clock = clock
+
+        self.next_start = None
+        self.scans = 0
+        self.failed_scans = 0
+        self.overruns = 0
+        self.max_scan_time = 0.0
+
+        # Random sample of the scan times, so memory stays flat in long experiments
+        self.samples = []
+
+    def record(self, scan_time, failed):
+        self.scans += 1
+        if failed:
+            self.failed_scans += 1
+        if scan_time > self.period:
+            self.overruns += 1
+        self.max_scan_time = max(self.max_scan_time, scan_time)
+
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(scan_time)
+        else:
+            index = random.randint(0, self.scans - 1)
+            if index < SAMPLE_SIZE:
+                self.samples[index] = scan_time
+
+    def end_cycle(self, start, failed=False, paced=False):
+        """
+        Accounts for a scan and sleeps until the next one is due
+        :param start: time.time() when the scan started
+        :param failed: True if the scan raised an exception
+        :param paced: True if the scan was triggered by the step barrier, which then paces the next one
+        """
+        now = time.time()
+        self.record(now - start, failed)
+
+        if paced:
+            self.next_start = None
+            return
+
+        if self.next_start is None:
+            self.next_start = start
+        self.next_start += self.period
+
+        slack = self.next_start - now
+        if slack > 0:
+            self.clock.sleep(slack)
+        else:
+            # After an overrun the cycle restarts from now, skipped periods are not made up
+            self.next_start = now
+
+    def summary(self, name):
+        """
+        :param name: name of the PLC
+        :return: dictionary with the timing summary of the scans
+        """
+        result = {'plc': name,
+                  'period': self.period,
+                  'scans': self.scans,
+                  'failed_scans': self.failed_scans,
+                  'overruns': self.overruns,
+                  'scan_time_max': self.max_scan_time}
+        if self.samples:
+            samples = sorted(self.samples)
+            result['scan_time_p50'] = percentile(samples, 0.5)
+            result['scan_time_p99'] = percentile(samples, 0.99)
+        return result
+
+    def write_summary(self, path, name):
+        with open(path, 'w') as f:
+            yaml.dump(self.summary(name), f, default_flow_style=False)
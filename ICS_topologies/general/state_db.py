@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+import time
+
+"""
+Shared access to the sqlite database storing the system state. The physical process, the PLCs and the attacks read and
+write the same database concurrently, so every process keeps one long-lived connection per database, the database uses
+WAL journaling (readers never block the writer) and locked operations are retried with a bounded backoff instead of
+being dropped
+"""
+
+# Seconds a connection waits for a lock held by another process before raising "database is locked"
+BUSY_TIMEOUT = 5.0
+
+# Retries after the busy timeout expires, the backoff doubles on every retry up to MAX_BACKOFF seconds
+MAX_RETRIES = 5
+BACKOFF = 0.01
+MAX_BACKOFF = 0.5
+
+# One (connection, lock) pair per database path in this process
+_connections = {}
+
+# One StateDB per (database path, table) in this process
+_states = {}
+
+
+def enable_wal(path):
+    """
+    Switches the database to WAL journaling. The journal mode is persistent, so this only needs to be done once when
+    the database is created
+    :param path: path of the sqlite database
+    :return: the journal mode reported by sqlite
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_connection(path, busy_timeout=None):
+    """
+    Returns the connection of this process to a database, creating it the first time. The connection is shared by
+    all the threads of the process, so it comes with the lock that serializes its use
+    :param path: path of the sqlite database
+    :param busy_timeout: seconds to wait for a lock held by another process, BUSY_TIMEOUT by default
+    :return: a (connection, lock) tuple
+    """
+    if path not in _connections:
+        if busy_timeout is None:
+            busy_timeout = BUSY_TIMEOUT
+        conn = sqlite3.connect(path, timeout=float(busy_timeout), check_same_thread=False)
+        _connections[path] = (conn, threading.Lock())
+    return _connections[path]
+
+
+def get_state(state, busy_timeout=None):
+    """
+    Returns the StateDB of this process for a MiniCPS state dictionary
+    :param state: dictionary with the keys 'path' (database path) and 'name' (table name)
+    :param busy_timeout: seconds to wait for a lock held by another process, BUSY_TIMEOUT by default
+    :return: a StateDB object
+    """
+    key = (state['path'], state['name'])
+    if key not in _states:
+        _states[key] = StateDB(state['path'], state['name'], busy_timeout)
+    return _states[key]
+
+
+class StateDB(object):
+
+    """
+    This class reads and writes the tags of a MiniCPS state table. Tags are identified as in MiniCPS, by a tuple with
+    the primary key values, for instance ('T1', 1)
+    """
+
+    def __init__(self, path, name, busy_timeout=None):
+        self._path = path
+        self._name = name
+        self._value = 'value'
+        self._conn, self._lock = get_connection(path, busy_timeout)
+
+        self._what = self._init_what()
+        if not self._what:
+            raise ValueError('Primary key not found.')
+
+        where = ' AND '.join(['%s = ?' % pk for pk in self._what])
+        self._get_query = 'SELECT %s FROM %s WHERE %s' % (self._value, self._name, where)
+        self._set_query = 'UPDATE %s SET %s = ? WHERE %s' % (self._name, self._value, where)
+
+    def _init_what(self):
+        """
+        :return: ordered tuple with the primary key field names of the table
+        """
+        table_info = self._execute(lambda cursor: cursor.execute('PRAGMA table_info(%s)' % self._name).fetchall())
+
+        # The last element of table_info is the position of the field in the primary key
+        pks = [field for field in table_info if field[-1] > 0]
+        pks.sort(key=lambda field: field[-1])
+        return tuple([pk[1] for pk in pks])
+
+    def _execute(self, operation):
+        """
+        Runs an operation inside a transaction of the shared connection. If the database stays locked after the busy
+        timeout, the operation is retried with a bounded exponential backoff. Any other error is raised
+        :param operation: function receiving a cursor
+        :return: the value returned by operation
+        """
+        backoff = BACKOFF
+        attempt = 0
+        while True:
+            try:
+                with self._lock:
+                    with self._conn:
+                        return operation(self._conn.cursor())
+            except sqlite3.OperationalError as e:
+                if attempt >= MAX_RETRIES or 'locked' not in str(e):
+                    raise
+            attempt += 1
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def to_what(self, name):
+        """
+        Tags of the plant are stored with pid 1
+        :param name: tag name
+        :return: the primary key tuple of the tag
+        """
+        return (name, 1)[:len(self._what)]
+
+    def get(self, what):
+        """
+        :param what: primary key tuple of the tag
+        :return: the stored value
+        """
+        return self._execute(lambda cursor: cursor.execute(self._get_query, what).fetchone()[0])
+
+    def set(self, what, value):
+        """
+        :param what: primary key tuple of the tag
+        :param value: value to store
+        :return: the stored value
+        """
+        self._execute(lambda cursor: cursor.execute(self._set_query, (value,) + tuple(what)))
+        return value
+
+    def get_multiple(self, names):
+        """
+        Reads several tags with a single query
+        :param names: list with the name of the tags to read
+        :return: dictionary with the tag name as key and the stored value as value
+        """
+        query = 'SELECT %s, %s FROM %s WHERE %s IN (%s)' % (
+            self._what[0], self._value, self._name, self._what[0], ', '.join(['?'] * len(names)))
+
+        # for composite pk
+        for pk in self._what[1:]:
+            query += ' AND %s = 1' % pk
+
+        return dict(self._execute(lambda cursor: cursor.execute(query, list(names)).fetchall()))
+
+    def set_multiple(self, name_values):
+        """
+        Writes several tags with a single executemany inside one transaction
+        :param name_values: list of (name, value) tuples
+        """
+        rows = []
+        for name, value in name_values:
+            rows.append((value,) + self.to_what(name))
+        self._execute(lambda cursor: cursor.executemany(self._set_query, rows))
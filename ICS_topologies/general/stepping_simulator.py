@@ -0,0 +1,109 @@
+import time
+import warnings
+import wntr
+import wntr.sim.hydraulics as hydraulics
+from wntr.sim.core import WNTRSimulator, _solver_helper
+from wntr.sim.solvers import NewtonSolver
+
+
+class SteppingSimulator(WNTRSimulator):
+
+    """
+    WNTR simulator that advances the network one hydraulic timestep per call to step(). WNTRSimulator.run_sim builds
+    the hydraulic model, the internal graph and the result dictionaries every time it is called; here the model and
+    the graph are built once in initialize(), and each step starts the solver from the solution of the previous step.
+    The results are stored in the network objects, as run_sim does. As in WNTRSimulator, the demand model is the one
+    of wn.options.hydraulic.demand_model
+    """
+    def __init__(self, wn):
+        WNTRSimulator.__init__(self, wn)
+        self.first_step = True
+
+        # Seconds spent in the solver during the last step
+        self.solver_time = 0.0
+
+    def initialize(self, solver=NewtonSolver, solver_options=None, convergence_error=True, HW_approx='default'):
+        """
+        Builds the hydraulic model of the network. Arguments are the same as in WNTRSimulator.run_sim
+        """
+        self.mode = self._wn.options.hydraulic.demand_model
+        self._model, self._model_updater = hydraulics.create_hydraulic_model(wn=self._wn, HW_approx=HW_approx)
+        self._setup_sim_options(solver=solver, backup_solver=None, solver_options=solver_options,
+                                backup_solver_options=None, convergence_error=convergence_error)
+        self._initialize_internal_graph()
+        self._rule_iter = 0
+
+        self.first_step = self._wn.sim_time == 0
+        if self.first_step:
+            hydraulics.update_network_previous_values(self._wn)
+            self._wn._prev_sim_time = -1
+
+    def step(self):
+        """
+        Solves the current hydraulic timestep with the controls present in the network, and moves the simulation time
+        to the next timestep
+        :return: the simulation time, in seconds, of the solved timestep
+        """
+        # The physical process replaces the actuator controls between steps
+        self._get_control_managers()
+
+        self.solver_time = 0.0
+        max_trials = self._wn.options.hydraulic.trials
+        trial = 0
+        resolve = False
+
+        while True:
+            if not resolve:
+                # The tank levels must be updated before checking the controls, because the tank controls depend on them
+                if not self.first_step:
+                    hydraulics.update_tank_heads(self._wn)
+                self._compute_next_timestep_and_run_presolve_controls_and_rules(self.first_step)
+
+            self._run_feasibility_controls()
+
+            self._update_internal_graph()
+            self._get_isolated_junctions_and_links()
+            if not self.first_step and not resolve:
+                hydraulics.update_tank_heads(self._wn)
+            hydraulics.update_model_for_controls(self._model, self._wn, self._model_updater, self._presolve_controls)
+            hydraulics.update_model_for_controls(self._model, self._wn, self._model_updater, self._rules)
+            hydraulics.update_model_for_controls(self._model, self._wn, self._model_updater,
+                                                 self._feasibility_controls)
+            wntr.sim.models.param.source_head_param(self._model, self._wn)
+            wntr.sim.models.param.expected_demand_param(self._model, self._wn)
+
+            start = time.time()
+            solver_status, mesg, iter_count = _solver_helper(self._model, self._solver, self._solver_options)
+            self.solver_time += time.time() - start
+
+            if solver_status == 0:
+                if self._convergence_error:
+                    raise RuntimeError('Simulation did not converge. ' + mesg)
+                warnings.warn('Simulation did not converge at time ' + str(self._get_time()) + '. ' + mesg)
+                break
+
+            hydraulics.store_results_in_network(self._wn, self._model)
+
+            self._run_postsolve_controls()
+            if not self._postsolve_controls.changes_made():
+                break
+
+            resolve = True
+            self._update_internal_graph()
+            hydraulics.update_model_for_controls(self._model, self._wn, self._model_updater,
+                                                 self._postsolve_controls)
+            trial += 1
+            if trial > max_trials:
+                if self._convergence_error:
+                    raise RuntimeError('Exceeded maximum number of trials.')
+                warnings.warn('Exceeded maximum number of trials at time ' + str(self._get_time()))
+                break
+
+        solved_time = self._wn.sim_time
+        hydraulics.update_network_previous_values(self._wn)
+        self.first_step = False
+
+        self._wn.sim_time += self._hydraulic_timestep
+        overstep = float(self._wn.sim_time) % self._hydraulic_timestep
+        self._wn.sim_time -= overstep
+        return solved_time
@@ -0,0 +1,356 @@
+import socket
+import threading
+import time
+import yaml
+from step_barrier import LineConnection
+from exception_publisher import DeadbandFilter, DEFAULT_HEARTBEAT
+from scada_poller import SAMPLE_OK, SAMPLE_STALE, SAMPLE_MISSING
+
+"""
+Subscription delivery of the PLC values to the SCADA. Instead of polling, the SCADA connects to every PLC and subscribes
+to its tags with "SUBSCRIBE <interval> <tag> ...". The PLC answers "SUBSCRIBED <interval> <heartbeat> <tag> ..." with
+the negotiated minimum interval between pushes and the tags it serves, and then pushes
+"VALUES <publish time> <tag>=<value> ..." with the tags that changed since the last push, and the tags not pushed for
+heartbeat seconds, so the SCADA can tell a silent PLC from a steady value. Only the router port forwards of the PLC
+ENIP server exist in the topology, so the subscriptions use their own forwarded port
+"""
+
+SUBSCRIPTION_PORT = 44819
+
+# Pushes are checked every cycle of BasePLC.send_system_state, the negotiated interval is never shorter
+MIN_PUSH_INTERVAL = 0.05
+
+# Seconds between pushes requested by the SCADA when the experiment YAML does not configure it
+DEFAULT_PUSH_INTERVAL = 0.5
+
+# Seconds the PLC waits for the subscription request, and the SCADA for the connection and the answer
+CONNECT_TIMEOUT = 5.0
+
+# Seconds a push may block on a subscriber that does not read, before the subscriber is dropped
+SEND_TIMEOUT = 1.0
+
+# Seconds between reconnections of the SCADA, doubling up to the maximum
+RECONNECT_DELAY = 0.1
+MAX_RECONNECT_DELAY = 5.0
+
+
+def get_push_interval(config_options):
+    """
+    :param config_options: options of the experiment YAML file
+    :return: the push interval the SCADA requests, None if the SCADA polls the PLCs
+    """
+    if config_options.get('scada_subscription') != "True":
+        return None
+    return float(config_options.get('scada_push_interval', DEFAULT_PUSH_INTERVAL))
+
+
+class Subscriber:
+
+    """
+    This class is a subscription accepted by a PLC, with the tags not pushed yet kept by a DeadbandFilter without
+    deadband
+    """
+    def __init__(self, connection, tags, interval):
+        self.connection = connection
+        self.tags = tags
+        self.interval = interval
+        self.filter = DeadbandFilter(tags, {'heartbeat': DEFAULT_HEARTBEAT})
+        self.last_push = None
+        self.pushes = 0
+
+
+class SubscriptionServer:
+
+    """
+    This class accepts the subscriptions to the tags of a PLC and pushes their changes. It must be created in the
+    network namespace of the PLC
+    """
+    def __init__(self, names, port=SUBSCRIPTION_PORT):
+        """
+        :param names: names of the tags the PLC publishes
+        """
+        self.names = names
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('', port))
+        self.server.listen(5)
+
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.register, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def register(self, sock):
+        connection = LineConnection(sock)
+        try:
+            message = connection.read_line(CONNECT_TIMEOUT)
+            if message is None or not message.startswith('SUBSCRIBE '):
+                connection.close()
+                return
+
+            fields = message.split(' ')
+            interval = max(float(fields[1]), MIN_PUSH_INTERVAL)
+            tags = [tag for tag in fields[2:] if tag in self.names]
+            connection.send_line(' '.join(['SUBSCRIBED', repr(interval), repr(DEFAULT_HEARTBEAT)] + tags))
+        except (EOFError, ValueError, IndexError, socket.error):
+            connection.close()
+            return
+
+        sock.settimeout(SEND_TIMEOUT)
+        with self.lock:
+            self.subscribers.append(Subscriber(connection, tags, interval))
+
+    def publish(self, names, values, now):
+        """
+        Pushes the changed tags to the subscribers whose interval expired
+        :param names: list with the name of the tags of the PLC
+        :param values: list with their current value, in the same order
+        :param now: time.time() of the cycle
+        """
+        values_by_name = dict(zip(names, values))
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            if subscriber.last_push is not None and now - subscriber.last_push < subscriber.interval:
+                continue
+
+            subscribed_values = [values_by_name[tag] for tag in subscriber.tags]
+            indexes = subscriber.filter.select(subscriber.tags, subscribed_values, now)
+            if not indexes:
+                continue
+
+            fields = ['VALUES', repr(now)]
+            fields.extend(subscriber.tags[index] + '=' + str(subscribed_values[index]) for index in indexes)
+            try:
+                subscriber.connection.send_line(' '.join(fields))
+            except socket.error:
+                self.remove(subscriber)
+                continue
+            subscriber.filter.mark_sent(subscriber.tags, subscribed_values, indexes, now)
+            subscriber.last_push = now
+            subscriber.pushes += 1
+
+    def remove(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.connection.close()
+
+    def report(self):
+        """
+        :return: one line per subscriber with the pushes and the tag values sent and skipped
+        """
+        lines = []
+        with self.lock:
+            for subscriber in self.subscribers:
+                lines.append("Subscription to %d tags every %.2f s: %d pushes, %d tag values pushed, %d skipped" %
+                             (len(subscriber.tags), subscriber.interval, subscriber.pushes, subscriber.filter.sent,
+                              subscriber.filter.skipped))
+        return lines
+
+    def close(self):
+        self.server.close()
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.connection.close()
+            self.subscribers = []
+
+
+class RunningTiming:
+
+    """
+    Count, mean and maximum of a duration, without keeping the values
+    """
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def get_summary(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.sum / self.count, 'max': self.max}
+
+
+class SubscribedPLC:
+
+    """
+    This class holds the last values pushed by a PLC, and the freshness of every tag
+    """
+    def __init__(self, name, tags, address):
+        self.name = name
+        self.tags = tags
+        self.address = address
+
+        self.values = {}
+        self.update_times = {}
+        self.sample_time = None
+        self.last_receive = None
+        self.connected = False
+        self.push_interval = None
+        self.heartbeat = DEFAULT_HEARTBEAT
+
+        self.pushes = 0
+        self.connections = 0
+        self.stale_samples = 0
+        self.missing_samples = 0
+
+        # Seconds from the push of the PLC to its reception, and age of every tag when the SCADA samples it
+        self.latency = RunningTiming()
+        self.ages = dict((tag[0], RunningTiming()) for tag in tags)
+
+
+class ScadaSubscriber:
+
+    """
+    This class subscribes the SCADA to a list of PLCs. It has the interface of ScadaPoller: poll() returns the last
+    values pushed by every PLC, without any request to the PLCs
+    """
+    def __init__(self, clock, push_interval=DEFAULT_PUSH_INTERVAL, port=SUBSCRIPTION_PORT):
+        self.clock = clock
+        self.push_interval = float(push_interval)
+        self.port = port
+
+        self.plcs = []
+        self.lock = threading.Lock()
+
+    def add_plc(self, name, tags, address):
+        plc = SubscribedPLC(name, tags, address)
+        self.plcs.append(plc)
+        thread = threading.Thread(target=self.run, args=(plc,))
+        thread.daemon = True
+        thread.start()
+
+    def run(self, plc):
+        """
+        Keeps the subscription to a PLC, reconnecting with backoff when the connection fails
+        """
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                self.subscribe(plc)
+                delay = RECONNECT_DELAY
+                self.receive(plc)
+            except (EOFError, ValueError, IndexError, socket.error) as e:
+                print "Subscription to " + plc.name + " failed: " + str(e)
+            with self.lock:
+                plc.connected = False
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def subscribe(self, plc):
+        sock = socket.create_connection((plc.address, self.port), CONNECT_TIMEOUT)
+        plc.connection = LineConnection(sock)
+        plc.connection.send_line(' '.join(['SUBSCRIBE', repr(self.push_interval)] + [tag[0] for tag in plc.tags]))
+        message = plc.connection.read_line(CONNECT_TIMEOUT)
+        if message is None or not message.startswith('SUBSCRIBED '):
+            plc.connection.close()
+            raise socket.error('no answer to the subscription')
+
+        fields = message.split(' ')
+        with self.lock:
+            plc.push_interval = float(fields[1])
+            plc.heartbeat = float(fields[2])
+            plc.connected = True
+            plc.connections += 1
+
+    def receive(self, plc):
+        """
+        Stores the pushes of a PLC until the connection fails, or the PLC is silent for twice its heartbeat
+        """
+        try:
+            while True:
+                message = plc.connection.read_line(2 * plc.heartbeat)
+                if message is None:
+                    raise socket.error('no push in ' + str(2 * plc.heartbeat) + ' s')
+                if not message.startswith('VALUES '):
+                    continue
+
+                receive_time = time.time()
+                fields = message.split(' ')
+                with self.lock:
+                    plc.latency.add(max(0.0, receive_time - float(fields[1])))
+                    for field in fields[2:]:
+                        tag, value = field.split('=', 1)
+                        plc.values[tag] = value
+                        plc.update_times[tag] = receive_time
+                    plc.sample_time = self.clock.now()
+                    plc.last_receive = receive_time
+                    plc.pushes += 1
+        finally:
+            plc.connection.close()
+
+    def get_columns(self):
+        """
+        :return: the names of the columns added to a SCADA row, as ScadaPoller.get_columns()
+        """
+        columns = []
+        for plc in self.plcs:
+            columns.extend([plc.name + "_timestamp", plc.name + "_status"])
+        return columns
+
+    def poll(self):
+        """
+        :return: list with one (values, sample time, status) tuple per PLC, in the order they were added. The sample
+        time is the time of the last push. A sample is stale when the subscription is down, and missing until the
+        first push. Tags not pushed yet are None
+        """
+        now = time.time()
+        samples = []
+        with self.lock:
+            for plc in self.plcs:
+                values = [plc.values.get(tag[0]) for tag in plc.tags]
+                for tag in plc.tags:
+                    if tag[0] in plc.update_times:
+                        plc.ages[tag[0]].add(now - plc.update_times[tag[0]])
+
+                if plc.last_receive is None:
+                    status = SAMPLE_MISSING
+                    plc.missing_samples += 1
+                elif plc.connected:
+                    status = SAMPLE_OK
+                else:
+                    status = SAMPLE_STALE
+                    plc.stale_samples += 1
+                samples.append((values, plc.sample_time, status))
+        return samples
+
+    def summary(self):
+        """
+        :return: dictionary with the pushes, delivery latency and reconnections of every PLC, and the age of every tag
+        when it was sampled
+        """
+        result = {'push_interval': self.push_interval, 'plcs': {}}
+        with self.lock:
+            for plc in self.plcs:
+                result['plcs'][plc.name] = {'negotiated_interval': plc.push_interval,
+                                            'pushes': plc.pushes,
+                                            'connections': plc.connections,
+                                            'latency': plc.latency.get_summary(),
+                                            'stale_samples': plc.stale_samples,
+                                            'missing_samples': plc.missing_samples,
+                                            'tag_age': dict((tag, age.get_summary())
+                                                            for tag, age in plc.ages.items())}
+        return result
+
+    def write_summary(self, path):
+        with open(path, 'w') as f:
+            yaml.dump(self.summary(), f, default_flow_style=False)
@@ -0,0 +1,135 @@
+import resource
+import signal
+import time
+
+"""
+Supervision of the child processes of an experiment. The launchers used to wait for their children spinning on
+poll(), which keeps a core busy per launcher. A Supervisor blocks in wait() instead, stops groups of children in
+parallel, sending them a signal and escalating to SIGTERM and SIGKILL after a grace timeout, and reports the exit
+status and CPU time of every child
+"""
+
+# Seconds a child has to exit after the shutdown signal before it is terminated, and then killed
+GRACE_TIMEOUT = 30.0
+
+# Seconds between checks while children are given their grace timeout
+STOP_INTERVAL = 0.05
+
+
+def get_children_cpu_time():
+    """
+    :return: user plus system CPU seconds of the children reaped so far by this process, and their descendants
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Child:
+
+    """
+    A process started by a launcher, with its exit status and CPU time once it is reaped
+    """
+    def __init__(self, name, process):
+        self.name = name
+        self.process = process
+        self.returncode = None
+        self.cpu_time = None
+
+
+class Supervisor:
+
+    """
+    This class holds the children of a launcher. The CPU time of a child is the increase of the CPU time of the reaped
+    children while reaping it, so children must be reaped through the supervisor
+    """
+    def __init__(self, grace_timeout=GRACE_TIMEOUT):
+        self.grace_timeout = grace_timeout
+        self.children = []
+
+    def add(self, name, process):
+        """
+        :param name: name of the child in the report
+        :param process: subprocess.Popen object of the child
+        :return: the process
+        """
+        self.children.append(Child(name, process))
+        return process
+
+    def get_child(self, process):
+        for child in self.children:
+            if child.process is process:
+                return child
+        return None
+
+    def reap(self, child, block):
+        """
+        :param child: Child to reap
+        :param block: True to wait until the child exits
+        :return: True if the child exited
+        """
+        if child.returncode is not None:
+            return True
+
+        cpu_time = get_children_cpu_time()
+        if block:
+            returncode = child.process.wait()
+        else:
+            returncode = child.process.poll()
+        if returncode is None:
+            return False
+
+        child.returncode = returncode
+        child.cpu_time = get_children_cpu_time() - cpu_time
+        return True
+
+    def wait(self, process):
+        """
+        Blocks, without using CPU, until a child exits. Signal handlers still run while waiting
+        :param process: subprocess.Popen object of the child
+        :return: the exit status of the child
+        """
+        child = self.get_child(process)
+        self.reap(child, True)
+        return child.returncode
+
+    def stop(self, processes, sig=signal.SIGINT):
+        """
+        Sends sig to the children at once and gives them the grace timeout to exit together. The ones still running are
+        terminated, and then killed
+        :param processes: list of subprocess.Popen objects of the children to stop
+        :param sig: signal asking the children to finish
+        """
+        children = [self.get_child(process) for process in processes]
+        running = [child for child in children if not self.reap(child, False)]
+
+        for escalation in [sig, signal.SIGTERM, signal.SIGKILL]:
+            for child in running:
+                try:
+                    child.process.send_signal(escalation)
+                except OSError:
+                    pass
+
+            deadline = time.time() + self.grace_timeout
+            while running and time.time() < deadline:
+                running = [child for child in running if not self.reap(child, False)]
+                if running:
+                    time.sleep(STOP_INTERVAL)
+
+            if not running:
+                return
+
+            print "Children still running after signal " + str(escalation) + ": " + \
+                ', '.join(child.name for child in running)
+
+    def report(self):
+        """
+        :return: one line per child with its exit status and CPU time
+        """
+        lines = []
+        for child in self.children:
+            if child.returncode is None:
+                lines.append("%s (pid %d): still running" % (child.name, child.process.pid))
+            else:
+                lines.append("%s (pid %d): exit status %d, CPU time %.2f s" % (child.name, child.process.pid,
+                                                                               child.returncode, child.cpu_time))
+        return lines
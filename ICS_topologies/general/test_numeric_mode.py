@@ -0,0 +1,108 @@
+import os
+import pytest
+import yaml
+
+"""
+Regression test of the numeric modes: the PLC logic of the shipped topologies must take the same actuator decisions
+with float values as with the Decimal values of older experiments. The PLC dictionaries are built by epanet_parser.py,
+and the headless PLCs are driven with tank levels sweeping across every rule limit, as the strings the PLCs read
+"""
+
+wntr = pytest.importorskip('wntr')
+numpy = pytest.importorskip('numpy')
+
+from epanet_parser import EpanetParser
+from headless_plcs import HeadlessPLCs
+
+TOPOLOGY_PATH = os.path.dirname(os.path.abspath(__file__))
+DEMAND_PATTERNS_PATH = os.path.join(TOPOLOGY_PATH, '..', '..', 'Demand_patterns')
+
+TOPOLOGIES = {'ky3': (os.path.join(TOPOLOGY_PATH, 'ky3.inp'), os.path.join(TOPOLOGY_PATH, 'ky3.cpa')),
+              'ctown': (os.path.join(DEMAND_PATTERNS_PATH, 'ctown_map_with_controls.inp'),
+                        os.path.join(DEMAND_PATTERNS_PATH, 'ctown.cpa'))}
+
+# Step of the level sweep, in meters. Its multiples have long float representations, as simulated levels do
+SWEEP_STEP = 0.01
+
+
+def get_plc_dicts(topology):
+    inp_file_path, cpa_file_path = TOPOLOGIES[topology]
+    parser = EpanetParser(inp_file_path, cpa_file_path, None)
+    parser.configure_plc_list()
+    return parser.plc_list
+
+
+def get_tank_levels(plc_dicts):
+    """
+    :return: dictionary with every tank checked by a rule as key, and the levels it takes as value: a sweep from below
+    its lowest limit to above its highest one and back, through the limits and the floats next to them
+    """
+    limits = {}
+    for plc in plc_dicts:
+        for rule in plc['Controls']:
+            limits.setdefault(rule['tank_tag'], set()).add(float(rule['value']))
+
+    tank_levels = {}
+    for tank, tank_limits in limits.items():
+        levels = set(numpy.arange(min(tank_limits) - 1, max(tank_limits) + 1, SWEEP_STEP).tolist())
+        for limit in tank_limits:
+            levels.update([limit, numpy.nextafter(limit, -numpy.inf), numpy.nextafter(limit, numpy.inf)])
+        levels = sorted(float(level) for level in levels)
+        tank_levels[tank] = levels + levels[::-1]
+    return tank_levels
+
+
+def get_actuator_trace(plc_dicts, mode, tmp_path):
+    """
+    Runs the PLCs over the level sweeps of every tank, each one shifted so the tanks cross their limits at different
+    iterations
+    :return: list with the status of every actuator after each scan
+    """
+    plc_dict_path = str(tmp_path / (mode + '_plc_dicts.yaml'))
+    with open(plc_dict_path, 'w') as plc_file:
+        yaml.dump(plc_dicts, plc_file)
+    sensor_names = [sensor for plc in plc_dicts for sensor in plc['Sensors'] if sensor]
+    plcs = HeadlessPLCs(plc_dict_path, sensor_names, 'csv', mode)
+
+    actuator_status = {}
+    for plc in plc_dicts:
+        for actuator in plc['Actuators']:
+            if actuator:
+                actuator_status[actuator] = 1
+
+    tank_levels = get_tank_levels(plc_dicts)
+
+    # The sensors no rule checks keep a constant level
+    for plc in plc_dicts:
+        for sensor in plc['Sensors']:
+            if sensor and sensor not in tank_levels:
+                tank_levels[sensor] = [1.0]
+
+    # As in the physical process, the actuator status is read before the first scan
+    actuator_status = plcs.get_actuator_status(actuator_status)
+
+    iterations = max(len(levels) for levels in tank_levels.values())
+    trace = []
+    for iteration in range(iterations):
+        sensor_values = []
+        for index, tank in enumerate(sorted(tank_levels)):
+            levels = tank_levels[tank]
+            sensor_values.append((tank, levels[(iteration + index * 37) % len(levels)]))
+        plcs.scan(sensor_values, iteration, iteration)
+        actuator_status = plcs.get_actuator_status(actuator_status)
+        trace.append(sorted(actuator_status.items()))
+    return trace
+
+
+@pytest.mark.parametrize('topology', sorted(TOPOLOGIES))
+def test_float_and_decimal_take_the_same_decisions(topology, tmp_path):
+    plc_dicts = get_plc_dicts(topology)
+    float_trace = get_actuator_trace(plc_dicts, 'float', tmp_path)
+    decimal_trace = get_actuator_trace(plc_dicts, 'decimal', tmp_path)
+
+    assert float_trace == decimal_trace
+
+    # Every actuator with rules is switched both ways by the sweep, so the traces do compare decisions
+    for plc in plc_dicts:
+        for rule in plc['Controls']:
+            assert set(dict(row)[rule['actuator_tag']] for row in float_trace) == {0, 1}
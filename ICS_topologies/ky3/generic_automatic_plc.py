@@ -117,6 +117,6 @@ class NodeControl():
         return parser.parse_args()
 
 
-if __name__ == " __main__":
+if __name__ == "__main__":
     node_control = NodeControl()
     node_control.main()
\ No newline at end of file
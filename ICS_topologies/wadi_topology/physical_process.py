@@ -5,6 +5,7 @@ import csv
 import sys
 import pandas as pd
 import yaml
+from actuator_state import ActuatorState
 import time
 
 
@@ -78,17 +79,11 @@ class PhysicalPlant:
 
         dummy_condition = controls.ValueCondition(self.wn.get_node(self.tank_list[0]), 'level', '>=', -1)
 
-        self.control_list = []
-        for valve in self.valve_list:
-            self.control_list.append(self.create_control_dict(valve, dummy_condition))
-
-        for pump in self.pump_list:
-            self.control_list.append(self.create_control_dict(pump, dummy_condition))
-
-        for control in self.control_list:
-            an_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-            a_control = controls.Control(control['condition'], an_action, name=control['name'])
-            self.wn.add_control(control['name'], a_control)
+        # The actuator state only touches the WNTR controls of the actuators changed by the PLCs
+        actuator_names = []
+        actuator_names.extend(self.valve_list)
+        actuator_names.extend(self.pump_list)
+        self.actuator_state = ActuatorState(self.wn, actuator_names, dummy_condition)
 
         simulator_string = config_options['simulator']
 
@@ -177,18 +172,6 @@ class PhysicalPlant:
             result.append(self.wn.get_control(control))
         return result
 
-    def create_control_dict(self, actuator, dummy_condition):
-        act_dict = dict.fromkeys(['actuator', 'parameter', 'value', 'condition', 'name'])
-        act_dict['actuator'] = self.wn.get_link(actuator)
-        act_dict['parameter'] = 'status'
-        act_dict['condition'] = dummy_condition
-        act_dict['name'] = actuator
-        if type(self.wn.get_link(actuator).status) is int:
-            act_dict['value'] = act_dict['actuator'].status
-        else:
-            act_dict['value'] = act_dict['actuator'].status.value
-        return act_dict
-
     def register_results(self, results):
         values_list = []
         values_list.extend([results.timestamp])
@@ -221,36 +204,43 @@ class PhysicalPlant:
             else:
                 values_list.extend([self.wn.get_link(valve).status.value])
 
-        rows = self.c.execute("SELECT value FROM wadi WHERE name = 'ATT_1'").fetchall()
-        self.conn.commit()
-        attack1 = int(rows[0][0])
-        rows = self.c.execute("SELECT value FROM wadi WHERE name = 'ATT_2'").fetchall()
-        self.conn.commit()
-        attack2 = int(rows[0][0])
+        attack_values = self.get_multiple_from_db(['ATT_1', 'ATT_2'])
+        attack1 = int(attack_values['ATT_1'])
+        attack2 = int(attack_values['ATT_2'])
 
         values_list.extend([attack1, attack2])
         return values_list
 
     def update_controls(self):
-        for control in self.control_list:
-            self.update_control(control)
+        """
+        Reads the actuator status written by the PLCs and applies the ones that changed to the WNTR model
+        :return: the number of actuators that changed their status
+        """
+        new_status = self.get_multiple_from_db(self.actuator_state.get_names())
+        return self.actuator_state.update(new_status)
 
-    def update_control(self, control):
-        act_name = '\'' + control['name'] + '\''
-        rows_1 = self.c.execute('SELECT value FROM wadi WHERE name = ' + act_name).fetchall()
+    def get_multiple_from_db(self, names):
+        """
+        Reads several tags from the database using a single query
+        :param names: list with the name of the tags to read
+        :return: dictionary with the tag name as key and the stored value as value
+        """
+        query = 'SELECT name, value FROM wadi WHERE name IN (' + ', '.join(['?'] * len(names)) + ')'
+        rows = self.c.execute(query, names).fetchall()
         self.conn.commit()
-        new_status = int(rows_1[0][0])
-
-        control['value'] = new_status
+        return dict(rows)
 
-        # act1 = controls.ControlAction(pump1, 'status', int(pump1_status))
-        new_action = controls.ControlAction(control['actuator'], control['parameter'], control['value'])
-
-        # pump1_control = controls.Control(condition, act1, name='pump1control')
-        new_control = controls.Control(control['condition'], new_action, name=control['name'])
+    def set_multiple_to_db(self, name_values):
+        """
+        Writes several tags into the database using a single executemany inside one transaction
+        :param name_values: list of (name, value) tuples
+        """
+        rows = []
+        for name, value in name_values:
+            rows.append((str(value), name))
 
-        self.wn.remove_control(control['name'])
-        self.wn.add_control(control['name'], new_control)
+        with self.conn:
+            self.c.executemany('UPDATE wadi SET value = ? WHERE name = ?', rows)
 
     def write_results(self, results):
         with open('output/' + self.output_path, 'w') as f:
@@ -288,9 +278,10 @@ class PhysicalPlant:
 
         while master_time <= iteration_limit:
 
-            self.update_controls()
+            changes = self.update_controls()
             #toc
             print("ITERATION %d ------------- " % master_time)
+            print("Applied " + str(changes) + " actuator changes")
             results = self.sim.run_sim(convergence_error=True)
             #toc
             values_list = self.register_results(results)
@@ -298,23 +289,21 @@ class PhysicalPlant:
             self.results_list.append(values_list)
             master_time += 1
 
+            # Tank levels and the attack flag are written in one transaction
+            sensor_values = []
             for tank in self.tank_list:
-                tank_name = '\'' + tank + '\''
-                a_level = self.wn.get_node(tank).level
-                query = "UPDATE wadi SET value = " + str(a_level) + " WHERE name = " + tank_name
-                self.c.execute(query)  # UPDATE TANKS IN THE DATABASE
-                self.conn.commit()
+                sensor_values.append((tank, self.wn.get_node(tank).level))
 
             # For concealment attacks, we need more stages in the attack
             if self.attack_flag and (self.attack_type == "device_attack" or self.attack_type == "network_attack"):
                 if self.attack_start <= master_time < self.attack_end:
-                    query = "UPDATE wadi SET value = " + str(1) + " WHERE name = 'ATT_2'"
-                    self.c.execute(query)  # UPDATE ATT_2 value for the plc1 to launch attack
-                    self.conn.commit()
+                    # ATT_2 value for the plc1 to launch attack
+                    sensor_values.append(('ATT_2', 1))
                 else:
-                    query = "UPDATE wadi SET value = " + str(0) + " WHERE name = 'ATT_2'"
-                    self.c.execute(query)  # UPDATE ATT_2 value for the plc1 to stop attack
-                    self.conn.commit()
+                    # ATT_2 value for the plc1 to stop attack
+                    sensor_values.append(('ATT_2', 0))
+
+            self.set_multiple_to_db(sensor_values)
 
             time.sleep(0.03)
         self.write_results(self.results_list)
@@ -12,11 +12,10 @@ import numpy as np
 
 from ips import PLC_IPS
 
-import sqlite3
+from state_db import StateDB
 
 # connection to the database
-conn = sqlite3.connect('../../ICS_topologies/enhanced_ctown_topology/ctown_db.sqlite')
-c = conn.cursor()
+state = StateDB('../../ICS_topologies/enhanced_ctown_topology/ctown_db.sqlite', 'ctown')
 iteration = 0
 enip_port = 44818
 sniffed_packet = []
@@ -40,8 +39,7 @@ def network_empty_tank_1(raw, value):
     print ("empty tank 1-----------")
     float_value = translate_load_to_float(raw)
     fake_value = float_value + float(value.strip())
-    c.execute("UPDATE ctown SET value = 1 WHERE name = 'ATT_1'")
-    conn.commit()
+    state.set(('ATT_1', 1), 1)
     pay = translate_float_to_load(fake_value, raw[0], raw[1])
     return pay
 
@@ -52,8 +50,7 @@ def spoof_value(raw):
     print("Spoofing-----------")
     float_value = translate_load_to_float(raw)
     fake_value = float_value + spoof_offset
-    c.execute("UPDATE ctown SET value = 3 WHERE name = 'ATT_1'")
-    conn.commit()
+    state.set(('ATT_1', 1), 3)
     pay = translate_float_to_load(fake_value, raw[0], raw[1])
     return pay
 
@@ -64,8 +61,7 @@ def exponential_spoof(raw):
     fake_value = 5.5
     print ("Spoofing with value" + str(fake_value))
 
-    c.execute("UPDATE ctown SET value = 3 WHERE name = 'ATT_1'")
-    conn.commit()
+    state.set(('ATT_1', 1), 3)
     pay = translate_float_to_load(fake_value, raw[0], raw[1])
     return pay
 
@@ -84,16 +80,13 @@ def capture(packet):
                 packet.set_payload(str(pkt))
 
                 # This value is written by physical_process.py
-                rows = c.execute("SELECT value FROM ctown WHERE name = 'ATT_2'").fetchall()
-                conn.commit()
-                attack_on = int(rows[0][0])
+                attack_on = int(state.get(('ATT_2', 1)))
 
                 # We add this delay to simulate the attacker running another process
                 time.sleep(0.01)
                 if attack_on == 0:
                     print("Attack finished")
-                    c.execute("UPDATE ctown SET value = 0 WHERE name = 'ATT_1'")
-                    conn.commit()
+                    state.set(('ATT_1', 1), 0)
                     __setdown(enip_port)
                     return 0
 
@@ -210,9 +203,7 @@ if __name__ == '__main__':
     print('[] Preparing attack')
     while True:
 
-        rows = c.execute("SELECT value FROM ctown WHERE name = 'ATT_2'").fetchall()
-        conn.commit()
-        attack_on = int(rows[0][0])
+        attack_on = int(state.get(('ATT_2', 1)))
 
         if attack_on == 1:
             break